@@ -3,8 +3,14 @@ import os
 import time
 import random
 import shutil
+import queue
 import sqlite3
 import hashlib
+import threading
+import itertools
+import functools
+import contextlib
+import collections
 from typing import *
 from .datatype import DynamicObject
 
@@ -14,7 +20,7 @@ except ImportError:
     import sqlite3 as sqlcipher
 
 __all__ = ['SQLiteDatabase', 'SQLCipherDatabase', 'SQLiteUserPasswordDatabase', 'SQLiteDatabaseError',
-           'SQLiteDatabaseCreator', 'SQLiteGeneralSettingsItem']
+           'SQLiteConnectionPool', 'SQLiteDatabaseCreator', 'SQLiteGeneralSettingsItem']
 
 
 class SQLiteDatabaseError(Exception):
@@ -25,12 +31,34 @@ class SQLiteDatabase(object):
     TYPE_INTEGER, TYPE_REAL, TYPE_TEXT, TYPE_BLOB = list(range(4))
     TBL_CID, TBL_NAME, TBL_TYPE, TBL_REQUIRED, TBL_DEF, TBL_PK = list(range(6))
 
-    def __init__(self, db_path: str, timeout: int = 20, check_same_thread: bool = True):
+    JOURNAL_MODES = ("DELETE", "TRUNCATE", "PERSIST", "MEMORY", "WAL", "OFF")
+    SYNCHRONOUS_LEVELS = ("OFF", "NORMAL", "FULL", "EXTRA")
+
+    def __init__(self, db_path: str, timeout: int = 20, check_same_thread: bool = True,
+                 journal_mode: str or None = None, synchronous: str or None = None, cache_size: int or None = None):
+        """SQLite database
+
+        :param db_path: database path
+        :param timeout: database lock timeout
+        :param check_same_thread: only allow creating thread use this connection
+        :param journal_mode: PRAGMA journal_mode, "WAL" is recommended for heavy writing, None keep database default
+        :param synchronous: PRAGMA synchronous, "NORMAL" is safe in WAL mode and faster than "FULL"
+        :param cache_size: PRAGMA cache_size, positive means pages, negative means KiB
+        """
         if not os.path.isfile(db_path):
             raise IOError("{} do not exist".format(db_path))
 
+        self._pragmas = self._checkPragmas(journal_mode, synchronous, cache_size)
         self._conn = sqlite3.connect(db_path, timeout=timeout, check_same_thread=check_same_thread)
         self._cursor = self._conn.cursor()
+        self._applyPragmas()
+
+        # Nested transaction() depth, commit is deferred until the outermost transaction exit
+        self._transaction_depth = 0
+
+        # Table schema(PRAGMA table_info) and prepared statement cache, key is table name
+        self._schema_cache = dict()
+        self._statement_cache = dict()
 
     @property
     def raw_cursor(self) -> sqlite3.Cursor:
@@ -93,14 +121,120 @@ class SQLiteDatabase(object):
         else:
             return "UNKNOWN"
 
+    @classmethod
+    def _checkPragmas(cls, journal_mode: str or None, synchronous: str or None, cache_size: int or None):
+        if journal_mode is not None and str(journal_mode).upper() not in cls.JOURNAL_MODES:
+            raise ValueError("journal_mode must be one of {}".format(cls.JOURNAL_MODES))
+
+        if synchronous is not None and str(synchronous).upper() not in cls.SYNCHRONOUS_LEVELS:
+            raise ValueError("synchronous must be one of {}".format(cls.SYNCHRONOUS_LEVELS))
+
+        if cache_size is not None and not isinstance(cache_size, int):
+            raise TypeError("cache_size require int type")
+
+        return ("journal_mode", journal_mode), ("synchronous", synchronous), ("cache_size", cache_size)
+
+    def _applyPragmas(self):
+        for pragma, value in self._pragmas:
+            if value is not None:
+                self._cursor.execute("PRAGMA {} = {}".format(pragma, value))
+                self._cursor.fetchall()
+
+    def _commit(self):
+        if not self._transaction_depth:
+            self._conn.commit()
+
+    @contextlib.contextmanager
+    def transaction(self):
+        """Group several operations in one transaction, commit when exit or rollback when exception raised
+
+        with db.transaction():
+            db.insertRecord(...)
+            db.updateRecord(...)
+
+        :return:
+        """
+        self._transaction_depth += 1
+        try:
+            yield self
+        except BaseException:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                self._conn.rollback()
+            raise
+        else:
+            self._transaction_depth -= 1
+            if not self._transaction_depth:
+                try:
+                    self._conn.commit()
+                except sqlite3.DatabaseError as error:
+                    raise SQLiteDatabaseError("Commit error:{}".format(error))
+
+    @staticmethod
+    def isDDLStatement(sql: str) -> bool:
+        # Statement keyword may be followed by any whitespace, e.g. "ALTER\nTABLE"
+        words = sql.split(None, 1)
+        return bool(words) and words[0].upper() in ("CREATE", "ALTER", "DROP")
+
+    def clearSchemaCache(self, name: str or None = None):
+        """Clear cached table schema and prepared statements
+
+        :param name: table name, None means clear all tables
+        :return:
+        """
+        if name is None:
+            self._schema_cache.clear()
+            self._statement_cache.clear()
+        else:
+            self._schema_cache.pop(name, None)
+            self._statement_cache.pop(name, None)
+
     def rawExecute(self, sql: str):
         try:
+            if self.isDDLStatement(sql):
+                self.clearSchemaCache()
+
             self._cursor.execute(sql)
-            self._conn.commit()
+            self._commit()
             return self._cursor.fetchall()
         except sqlite3.DatabaseError as error:
             raise SQLiteDatabaseError(error)
 
+    def _getSchema(self, name: str) -> list:
+        """Get table schema(PRAGMA table_info) from cache, query database when missed
+
+        :param name: table name
+        :return: PRAGMA table_info result, empty list means table do not exist(and will not be cached)
+        """
+        try:
+            return self._schema_cache[name]
+        except KeyError:
+            self._cursor.execute("PRAGMA table_info({})".format(name))
+            table_info = self._cursor.fetchall()
+            if table_info:
+                self._schema_cache[name] = table_info
+            return table_info
+
+    def _getStatement(self, name: str, kind: str, columns: Tuple[str, ...] = ()) -> str:
+        """Get a cached parameterized statement, sqlite3 will reuse the compiled statement with the same sql
+
+        :param name: table name
+        :param kind: statement kind INSERT or UPDATE
+        :param columns: UPDATE columns
+        :return: sql with ? placeholders (UPDATE without WHERE clause)
+        """
+        statements = self._statement_cache.setdefault(name, dict())
+        try:
+            return statements[(kind, columns)]
+        except KeyError:
+            if kind == "INSERT":
+                sql = "INSERT INTO {} VALUES({})".format(name, ", ".join(["?"] * len(self.getColumnList(name))))
+            else:
+                sql = "UPDATE {} SET {}".format(name, ", ".join(["{} = ?".format(column) for column in columns]))
+
+            statements[(kind, columns)] = sql
+            return sql
+
     def getTableList(self) -> List[str]:
         """Get database table name list
 
@@ -116,8 +250,7 @@ class SQLiteDatabase(object):
         :param name:  table name
         :return: table column name, table column type list
         """
-        self._cursor.execute("PRAGMA table_info({})".format(name))
-        table_info = self._cursor.fetchall()
+        table_info = self._getSchema(name)
         column_list = [x[self.TBL_NAME] for x in table_info]
         return dict(list(zip(column_list, table_info)))
 
@@ -127,9 +260,7 @@ class SQLiteDatabase(object):
         :param name: table name
         :return: table column name list
         """
-        self._cursor.execute("PRAGMA table_info({})".format(name))
-        table_info = self._cursor.fetchall()
-        return [x[self.TBL_NAME] for x in table_info]
+        return [x[self.TBL_NAME] for x in self._getSchema(name)]
 
     def getColumnType(self, name: str) -> List[int]:
         """Get table column data type
@@ -138,9 +269,7 @@ class SQLiteDatabase(object):
         :return: column data type
         """
         try:
-            self._cursor.execute("PRAGMA table_info({})".format(name))
-            table_info = self._cursor.fetchall()
-            return [self.str2type(x[self.TBL_TYPE]) for x in table_info]
+            return [self.str2type(x[self.TBL_TYPE]) for x in self._getSchema(name)]
         except (TypeError, AttributeError, IndexError):
             return []
 
@@ -171,8 +300,7 @@ class SQLiteDatabase(object):
         :param name: table name
         :return: (primary key column, primary key name, primary key data type)
         """
-        self._cursor.execute("PRAGMA table_info({})".format(name))
-        table_info = self._cursor.fetchall()
+        table_info = self._getSchema(name)
         for i, schema in enumerate(table_info):
             if schema[self.TBL_PK] == 1:
                 return i, schema[self.TBL_NAME], schema[self.TBL_TYPE]
@@ -186,6 +314,19 @@ class SQLiteDatabase(object):
         except sqlite3.DatabaseError:
             return list()
 
+    def iterTableData(self, name: str, arraysize: int = 256, row_factory: Callable or None = None) -> Iterator:
+        """Iterate table data without loading all rows into memory
+
+        :param name: table name
+        :param arraysize: rows fetched from sqlite per batch
+        :param row_factory: sqlite3 row factory, e.g. namedTupleRowFactory or sqlite3.Row
+        :return: rows generator
+        """
+        try:
+            return self.iterRecords(name, arraysize=arraysize, row_factory=row_factory)
+        except SQLiteDatabaseError:
+            return iter(())
+
     def createTable(self, name: str, columns: int):
         try:
 
@@ -209,8 +350,9 @@ class SQLiteDatabase(object):
                 data.append(data_format)
 
             # print("CREATE TABLE {} ({});".format(name, ",".join(data)))
+            self.clearSchemaCache(name)
             self._cursor.execute("CREATE TABLE {} ({});".format(name, ",".join(data)))
-            self._conn.commit()
+            self._commit()
         except (TypeError, ValueError, sqlite3.DatabaseError) as error:
             raise SQLiteDatabaseError("Create table error:{}".format(error))
 
@@ -225,33 +367,97 @@ class SQLiteDatabase(object):
             if not isinstance(record, (list, tuple)):
                 raise TypeError("recode require list or tuple type")
 
-            # Get column names and types
-            column_names = self.getColumnList(name)
-            column_types = self.getColumnType(name)
-            if len(column_names) != len(record):
+            if len(self.getColumnList(name)) != len(record):
                 raise ValueError("recode length dis-matched")
 
-            # Pre-process record
-            recode_data = list()
-            blob_records = list()
-            for column, data, type_ in zip(column_names, record, column_types):
-                if type_ == self.TYPE_TEXT:
-                    recode_data.append('"{}"'.format(data))
-                elif type_ == self.TYPE_BLOB:
-                    recode_data.append("?")
-                    blob_records.append(data)
-                else:
-                    recode_data.append("{}".format(data))
-
-            recode_data = ", ".join(recode_data)
-
             # Insert to sqlite and save
-            # print("INSERT INTO {} VALUES({})".format(name, recode_data))
-            self._cursor.execute("INSERT INTO {} VALUES({})".format(name, recode_data), blob_records)
-            self._conn.commit()
+            self._cursor.execute(self._getStatement(name, "INSERT"), record)
+            self._commit()
         except sqlite3.DatabaseError as error:
             raise SQLiteDatabaseError(error)
 
+    def insertRecords(self, name: str, records: Iterable[list or tuple]) -> int:
+        """Insert multiple records to table in one transaction
+
+        :param name: table name
+        :param records: records iterable, each record is a list or tuple
+        :return: inserted records count
+        """
+        column_count = len(self.getColumnList(name))
+
+        def check_records():
+            for record in records:
+                if not isinstance(record, (list, tuple)):
+                    raise TypeError("recode require list or tuple type")
+
+                if len(record) != column_count:
+                    raise ValueError("recode length dis-matched")
+
+                yield record
+
+        try:
+            with self.transaction():
+                self._cursor.executemany(self._getStatement(name, "INSERT"), check_records())
+                return self._cursor.rowcount
+        except (ValueError, TypeError, sqlite3.DatabaseError) as error:
+            raise SQLiteDatabaseError("Insert error:{}".format(error))
+
+    def updateRecords(self, name: str, records: Iterable[list or tuple or dict], key: str or None = None) -> int:
+        """Update multiple records in one transaction, records are matched by key column
+
+        :param name: table name
+        :param records: records iterable, list or tuple record update all columns,
+        dict record update particular columns(all dict records should have the same columns)
+        :param key: match column name, default is primary key, records must contain key column data
+        :return: updated records count
+        """
+        records = iter(records)
+        column_names = self.getColumnList(name)
+
+        try:
+            first = next(records)
+        except StopIteration:
+            return 0
+
+        try:
+            key = key or self.getTablePrimaryKey(name)[1]
+            if key not in column_names:
+                raise ValueError("column {!r} do not exist".format(key))
+
+            if isinstance(first, (list, tuple)):
+                columns = tuple(column_names)
+            elif isinstance(first, dict):
+                columns = tuple(column for column in first.keys() if column != key)
+                for column in columns:
+                    if column not in column_names:
+                        raise ValueError("column {!r} do not exist".format(column))
+            else:
+                raise TypeError("recode require list or tuple or dict type")
+
+            def values():
+                key_index = column_names.index(key)
+                for record in itertools.chain((first,), records):
+                    if isinstance(record, dict) != isinstance(first, dict):
+                        raise TypeError("records should have the same type")
+
+                    if isinstance(record, dict):
+                        if record.keys() - {key} != set(columns):
+                            raise ValueError("dict records should have the same columns")
+
+                        yield tuple(record[column] for column in columns) + (record[key],)
+                    else:
+                        if len(record) != len(column_names):
+                            raise ValueError("recode length dis-matched")
+
+                        yield tuple(record) + (record[key_index],)
+
+            with self.transaction():
+                sql = "{} WHERE {} = ?;".format(self._getStatement(name, "UPDATE", columns), key)
+                self._cursor.executemany(sql, values())
+                return self._cursor.rowcount
+        except (ValueError, TypeError, KeyError, IndexError, sqlite3.DatabaseError) as error:
+            raise SQLiteDatabaseError("Update error:{}".format(error))
+
     def updateRecord(self, name: str, record: list or tuple or dict, condition: str or None = None):
         """Update an exist recode
 
@@ -269,48 +475,30 @@ class SQLiteDatabase(object):
             if not isinstance(condition, str):
                 raise TypeError("condition require string object")
 
-            # Get column name list and types
+            # Get column name list
             column_names = self.getColumnList(name)
-            column_types = self.getColumnType(name)
 
             # Check data length
             if isinstance(record, (list, tuple)) and len(column_names) != len(record):
                 raise ValueError("recode length dis-matched")
 
-            # Pre process record
-            recode_data = list()
-            blob_records = list()
-
-            # Update all data by sequence
+            # Update all data by sequence or update particular data by column name
             if isinstance(record, (list, tuple)):
-                for column, data, type_ in zip(column_names, record, column_types):
-                    if type_ == self.TYPE_TEXT:
-                        recode_data.append('{} = "{}"'.format(column, data))
-                    elif type_ == self.TYPE_BLOB:
-                        blob_records.append(data)
-                        recode_data.append("{} = ?".format(column, data))
-                    else:
-                        recode_data.append("{} = {}".format(column, data))
-            # Update particular data by column name
+                columns, values = tuple(column_names), record
             else:
-                for column_name, data in list(record.items()):
-                    type_ = column_types[column_names.index(column_name)]
-                    if type_ == self.TYPE_TEXT:
-                        recode_data.append('{} = "{}"'.format(column_name, data))
-                    elif type_ == self.TYPE_BLOB:
-                        blob_records.append(data)
-                        recode_data.append("{} = ?".format(column_name, data))
-                    else:
-                        recode_data.append("{} = {}".format(column_name, data))
+                for column_name in record.keys():
+                    if column_name not in column_names:
+                        raise ValueError("column {!r} do not exist".format(column_name))
 
-            recode_data = ", ".join(recode_data)
+                columns, values = tuple(record.keys()), tuple(record.values())
 
             # Update and save
+            sql = self._getStatement(name, "UPDATE", columns)
             if not condition:
-                self._cursor.execute('UPDATE {} SET {};'.format(name, recode_data), blob_records)
+                self._cursor.execute('{};'.format(sql), values)
             else:
-                self._cursor.execute('UPDATE {} SET {} WHERE {};'.format(name, recode_data, condition), blob_records)
-            self._conn.commit()
+                self._cursor.execute('{} WHERE {};'.format(sql, condition), values)
+            self._commit()
         except (ValueError, TypeError, IndexError, sqlite3.DatabaseError) as error:
             raise SQLiteDatabaseError("Update error:{}".format(error))
 
@@ -323,10 +511,62 @@ class SQLiteDatabase(object):
         """
         try:
             self._cursor.execute("DELETE FROM {} WHERE {};".format(name, condition))
-            self._conn.commit()
+            self._commit()
         except sqlite3.DatabaseError as error:
             raise SQLiteDatabaseError("Delete error:{}".format(error))
 
+    @staticmethod
+    def _selectStatement(name: str, columns: list or tuple or None = None, condition: str or None = None,
+                         order_by: str or None = None, limit: bool = False, offset: bool = False) -> str:
+        """Format a SELECT statement
+
+        :param name: table name
+        :param columns: columns name
+        :param condition: conditions
+        :param order_by: ORDER BY clause
+        :param limit: append LIMIT ? placeholder
+        :param offset: append OFFSET ? placeholder(requires limit)
+        :return: sql
+        """
+        columns = columns or list()
+        condition = condition or ""
+
+        if not isinstance(columns, (list, tuple)):
+            raise TypeError("columns require list or tuple")
+
+        if not isinstance(condition, str):
+            raise TypeError("conditions require string object")
+
+        sql = "SELECT {} FROM {}".format(", ".join(columns) or "*", name)
+        if condition:
+            sql += " WHERE {}".format(condition)
+
+        if order_by:
+            sql += " ORDER BY {}".format(order_by)
+
+        if limit:
+            sql += " LIMIT ?"
+
+            if offset:
+                sql += " OFFSET ?"
+
+        return sql + ";"
+
+    @staticmethod
+    @functools.lru_cache(maxsize=64)
+    def _namedTupleType(fields: Tuple[str, ...]):
+        return collections.namedtuple("Row", fields, rename=True)
+
+    @staticmethod
+    def namedTupleRowFactory(cursor: sqlite3.Cursor, row: tuple):
+        """sqlite3 row factory, return row as a named tuple with column names as fields
+
+        :param cursor: sqlite3 cursor
+        :param row: raw row tuple
+        :return: named tuple row
+        """
+        return SQLiteDatabase._namedTupleType(tuple(column[0] for column in cursor.description))._make(row)
+
     def selectRecord(self, name: str, columns: list or None = None, condition: str or None = None):
         """Select record from table and matches conditions
 
@@ -336,37 +576,310 @@ class SQLiteDatabase(object):
         :return: return a list of records
         """
         try:
+            self._cursor.execute(self._selectStatement(name, columns, condition))
+            return self._cursor.fetchall()
+        except (TypeError, ValueError, sqlite3.DatabaseError) as error:
+            raise SQLiteDatabaseError("Select error:{}".format(error))
 
-            columns = columns or list()
-            condition = condition or ""
+    def iterRecords(self, name: str, columns: list or None = None, condition: str or None = None,
+                    arraysize: int = 256, row_factory: Callable or None = None) -> Iterator:
+        """Select record from table and matches conditions, rows are fetched lazily in batches
 
-            if not isinstance(columns, (list, tuple)):
-                raise TypeError("columns require list or tuple")
+        Iteration uses its own cursor, so other database operations can be performed between iterations
 
-            if not isinstance(condition, str):
-                raise TypeError("conditions require string object")
+        :param name: table name
+        :param columns: columns name
+        :param condition: conditions
+        :param arraysize: rows fetched from sqlite per batch
+        :param row_factory: sqlite3 row factory, e.g. namedTupleRowFactory or sqlite3.Row
+        :return: rows generator
+        """
+        try:
+            cursor = self._conn.cursor()
+            cursor.arraysize = max(1, arraysize)
+            cursor.row_factory = row_factory
+            cursor.execute(self._selectStatement(name, columns, condition))
+        except (TypeError, ValueError, sqlite3.DatabaseError) as error:
+            raise SQLiteDatabaseError("Select error:{}".format(error))
 
-            # Pre process
-            columns = ", ".join(columns) or "*"
+        def iterator():
+            try:
+                rows = cursor.fetchmany()
+                while rows:
+                    yield from rows
+                    rows = cursor.fetchmany()
+            except sqlite3.DatabaseError as error:
+                raise SQLiteDatabaseError("Select error:{}".format(error))
+            finally:
+                # Connection may already be closed when a partially consumed iterator is collected
+                with contextlib.suppress(sqlite3.ProgrammingError):
+                    cursor.close()
 
-            # SQL
-            if not condition:
-                self._cursor.execute("SELECT {} FROM {};".format(columns, name))
-            else:
-                self._cursor.execute("SELECT {} FROM {} WHERE {};".format(columns, name, condition))
+        return iterator()
 
-            return self._cursor.fetchall()
+    def selectPage(self, name: str, page: int, page_size: int,
+                   columns: list or None = None, condition: str or None = None, order_by: str or None = None,
+                   row_factory: Callable or None = None) -> list:
+        """Select one page records with LIMIT/OFFSET
+
+        OFFSET still scans skipped rows, use iterPages for sequential paging of large tables
+
+        :param name: table name
+        :param page: page index start from 0
+        :param page_size: records per page
+        :param columns: columns name
+        :param condition: conditions
+        :param order_by: ORDER BY clause, default is rowid order
+        :param row_factory: sqlite3 row factory, e.g. namedTupleRowFactory or sqlite3.Row
+        :return: return a list of records
+        """
+        try:
+            cursor = self._conn.cursor()
+            cursor.row_factory = row_factory
+            cursor.execute(self._selectStatement(name, columns, condition, order_by, limit=True, offset=True),
+                           (page_size, page * page_size))
+            return cursor.fetchall()
         except (TypeError, ValueError, sqlite3.DatabaseError) as error:
             raise SQLiteDatabaseError("Select error:{}".format(error))
 
+    def iterPages(self, name: str, page_size: int, key: str or None = None,
+                  columns: list or None = None, condition: str or None = None,
+                  row_factory: Callable or None = None) -> Iterator[list]:
+        """Iterate table page by page with keyset pagination(WHERE key > last ORDER BY key LIMIT page_size)
+
+        Each page costs an index seek instead of scanning all skipped rows like OFFSET
+
+        :param name: table name
+        :param page_size: records per page
+        :param key: unique and ordered column, default is primary key, must be contained in columns
+        :param columns: columns name
+        :param condition: conditions
+        :param row_factory: sqlite3 row factory, rows should support index access(e.g. named tuple, sqlite3.Row)
+        :return: pages generator, each page is a list of records
+        """
+        try:
+            key = key or self.getTablePrimaryKey(name)[1]
+            key_index = (columns or self.getColumnList(name)).index(key)
+            next_condition = "({}) AND {} > ?".format(condition, key) if condition else "{} > ?".format(key)
+            first_sql = self._selectStatement(name, columns, condition, key, limit=True)
+            next_sql = self._selectStatement(name, columns, next_condition, key, limit=True)
+        except (TypeError, IndexError) as error:
+            raise SQLiteDatabaseError("Select error:{}".format(error))
+        except ValueError:
+            raise SQLiteDatabaseError("Select error:columns must contain key column {!r}".format(key))
+
+        def iterator():
+            cursor = self._conn.cursor()
+            cursor.row_factory = row_factory
+            try:
+                page = cursor.execute(first_sql, (page_size,)).fetchall()
+                while page:
+                    yield page
+                    if len(page) < page_size:
+                        break
+
+                    page = cursor.execute(next_sql, (page[-1][key_index], page_size)).fetchall()
+            except sqlite3.DatabaseError as error:
+                raise SQLiteDatabaseError("Select error:{}".format(error))
+            finally:
+                # Connection may already be closed when a partially consumed iterator is collected
+                with contextlib.suppress(sqlite3.ProgrammingError):
+                    cursor.close()
+
+        return iterator()
+
 
 class SQLCipherDatabase(SQLiteDatabase):
-    def __init__(self, db_path: str, key: str, timeout: int = 20, check_same_thread: bool = True):
+    def __init__(self, db_path: str, key: str, timeout: int = 20, check_same_thread: bool = True,
+                 journal_mode: str or None = None, synchronous: str or None = None, cache_size: int or None = None):
         super(SQLCipherDatabase, self).__init__(db_path, timeout, check_same_thread)
         self._conn.close()
         self._conn = sqlcipher.connect(db_path, timeout=timeout, check_same_thread=check_same_thread)
         self._cursor = self._conn.cursor()
         self._cursor.execute("PRAGMA key='{}'".format(key))
+        self._pragmas = self._checkPragmas(journal_mode, synchronous, cache_size)
+        self._applyPragmas()
+
+
+class SQLiteConnectionPool(object):
+    def __init__(self, db_path: str, size: int = 4, key: str or None = None, timeout: int = 20,
+                 journal_mode: str or None = "WAL", synchronous: str or None = "NORMAL",
+                 cache_size: int or None = None):
+        """SQLite connection pool, single writer and multiple readers(suitable for WAL mode)
+
+        with pool.reader() as db:
+            db.selectRecord(...)
+
+        with pool.writer() as db:
+            db.insertRecord(...)
+
+        A thread keeps using the same connection while it holds it(nested reader/writer is allowed),
+        reader inside writer uses writer connection so it can see uncommitted data
+
+        :param db_path: database path
+        :param size: maximum reader connections
+        :param key: SQLCipher key, None means a plain SQLite database
+        :param timeout: database lock and wait for reader connection timeout
+        :param journal_mode: writer PRAGMA journal_mode, readers will not block writer in WAL mode
+        :param synchronous: PRAGMA synchronous
+        :param cache_size: PRAGMA cache_size
+        """
+        if not isinstance(size, int) or size <= 0:
+            raise ValueError("size must be a positive integer")
+
+        self._key = key
+        self._size = size
+        self._path = db_path
+        self._timeout = timeout
+        self._pragmas = dict(synchronous=synchronous, cache_size=cache_size)
+
+        self._local = threading.local()
+        self._lock = threading.Lock()
+        self._writer_lock = threading.RLock()
+        self._readers = queue.LifoQueue(maxsize=size)
+        self._reader_count = 0
+        self._connections = list()
+        self._queries = list()
+        self._statistics = dict(reader_acquire=0, reader_wait=0.0, reader_wait_max=0.0,
+                                writer_acquire=0, writer_wait=0.0, writer_wait_max=0.0)
+
+        self._writer = self._createDatabase(journal_mode=journal_mode)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    @property
+    def size(self) -> int:
+        return self._size
+
+    def _createDatabase(self, journal_mode: str or None = None, query_only: bool = False) -> SQLiteDatabase:
+        if self._key is None:
+            db = SQLiteDatabase(self._path, self._timeout, False, journal_mode=journal_mode, **self._pragmas)
+        else:
+            db = SQLCipherDatabase(self._path, self._key, self._timeout, False,
+                                   journal_mode=journal_mode, **self._pragmas)
+
+        if query_only:
+            db.raw_cursor.execute("PRAGMA query_only = 1")
+
+        with self._lock:
+            index = len(self._connections)
+            self._queries.append(0)
+            self._connections.append(db)
+
+        def count_query(_):
+            self._queries[index] += 1
+
+        db.raw_connect.set_trace_callback(count_query)
+        return db
+
+    def _updateWaitStatistics(self, role: str, wait: float):
+        with self._lock:
+            self._statistics["{}_acquire".format(role)] += 1
+            self._statistics["{}_wait".format(role)] += wait
+            self._statistics["{}_wait_max".format(role)] = max(self._statistics["{}_wait_max".format(role)], wait)
+
+    def _acquireReader(self) -> SQLiteDatabase:
+        try:
+            return self._readers.get_nowait()
+        except queue.Empty:
+            with self._lock:
+                create = self._reader_count < self._size
+                if create:
+                    self._reader_count += 1
+
+            if create:
+                try:
+                    return self._createDatabase(query_only=True)
+                except Exception:
+                    # Give back the slot, otherwise failed creations exhaust the pool
+                    with self._lock:
+                        self._reader_count -= 1
+                    raise
+
+        try:
+            return self._readers.get(timeout=self._timeout)
+        except queue.Empty:
+            raise SQLiteDatabaseError("Wait for reader connection timeout")
+
+    @contextlib.contextmanager
+    def reader(self):
+        """Get a read only connection
+
+        :return: SQLiteDatabase or SQLCipherDatabase
+        """
+        local = self._local
+        if getattr(local, "writer_depth", 0):
+            yield self._writer
+            return
+
+        if getattr(local, "reader_depth", 0):
+            local.reader_depth += 1
+            try:
+                yield local.reader
+            finally:
+                local.reader_depth -= 1
+            return
+
+        start = time.perf_counter()
+        db = self._acquireReader()
+        self._updateWaitStatistics("reader", time.perf_counter() - start)
+
+        local.reader, local.reader_depth = db, 1
+        try:
+            yield db
+        finally:
+            local.reader, local.reader_depth = None, 0
+
+            # A failed DML may leave an implicit transaction open, which keeps an old WAL snapshot
+            if db.raw_connect.in_transaction:
+                db.raw_connect.rollback()
+
+            self._readers.put(db)
+
+    @contextlib.contextmanager
+    def writer(self):
+        """Get the writer connection, all operations in writer block are in one transaction
+
+        :return: SQLiteDatabase or SQLCipherDatabase
+        """
+        start = time.perf_counter()
+        if not self._writer_lock.acquire(timeout=self._timeout):
+            raise SQLiteDatabaseError("Wait for writer connection timeout")
+
+        self._updateWaitStatistics("writer", time.perf_counter() - start)
+
+        local = self._local
+        local.writer_depth = getattr(local, "writer_depth", 0) + 1
+        try:
+            with self._writer.transaction():
+                yield self._writer
+        finally:
+            local.writer_depth -= 1
+            self._writer_lock.release()
+
+    def statistics(self) -> dict:
+        """Get pool statistics
+
+        :return: acquire count, total and maximum wait time(seconds) of reader and writer,
+        connections count and executed statements of each connection(writer is the first one)
+        """
+        with self._lock:
+            statistics = self._statistics.copy()
+            statistics["connections"] = len(self._connections)
+            statistics["queries"] = self._queries[:]
+
+        return statistics
+
+    def close(self):
+        with self._lock:
+            for db in self._connections:
+                db.raw_connect.close()
+
+            self._connections.clear()
 
 
 class SQLiteUserPasswordDatabase(object):
@@ -396,6 +909,10 @@ class SQLiteUserPasswordDatabase(object):
         try:
             self.magic = magic
             self.db = SQLiteDatabase(path)
+
+            # In-memory user index: username -> (uid, desc, {level: cipher}), lazy loaded
+            self._user_index = None
+
             if self_check:
                 self.selfTest()
         except OSError:
@@ -415,52 +932,79 @@ class SQLiteUserPasswordDatabase(object):
     def _c3_encrypt_func(cls, x: bytes) -> str:
         return hashlib.shake_256(x).hexdigest(32)
 
+    def invalidateCache(self):
+        self._user_index = None
+
+    def _getUserIndex(self) -> Dict[str, Tuple[int, str, Dict[int, str]]]:
+        """Load all users and their ciphers with one JOIN query
+
+        :return: username -> (uid, desc, {level: cipher})
+        """
+        if self._user_index is not None:
+            return self._user_index
+
+        _, user_pk, _ = self.db.getTablePrimaryKey(self.USER_TBL)
+        _, cipher_pk, _ = self.db.getTablePrimaryKey(self.CIPHER_TBL)
+        records = self.db.rawExecute(
+            "SELECT u.{name}, u.{uid}, u.{desc}, c.{level}, c.{cipher} FROM {user} AS u "
+            "LEFT JOIN {cipher_tbl} AS c ON c.{level} BETWEEN u.{uid} * 3 - 2 AND u.{uid} * 3 "
+            "ORDER BY u.{uid}, c.{level};".format(name=self.USER_NAME_KEY, uid=user_pk, desc=self.USER_DESC_KEY,
+                                                  level=cipher_pk, cipher=self.CIPHER_KEY,
+                                                  user=self.USER_TBL, cipher_tbl=self.CIPHER_TBL))
+
+        index = dict()
+        for name, uid, desc, level, cipher in records:
+            _, _, ciphers = index.setdefault(name, (uid, desc, dict()))
+            if level is not None:
+                ciphers[level] = cipher
+
+        self._user_index = index
+        return index
+
+    def _getUserCiphers(self, username: str) -> Tuple[str, str, str]:
+        level1, level2, level3 = self.getCipherLevel(username)
+        _, _, ciphers = self._getUserIndex()[username]
+        return ciphers[level1], ciphers[level2], ciphers[level3]
+
     def selfTest(self) -> bool:
         try:
-            _, pk, _ = self.db.getTablePrimaryKey(self.CIPHER_TBL)
             for user in self.getUserList():
-                level1, level2, level3 = self.getCipherLevel(user)
-
-                c1 = self.db.selectRecord(self.CIPHER_TBL, [self.CIPHER_KEY], self.db.conditionFormat(pk, level1))[0][0]
-                c2 = self.db.selectRecord(self.CIPHER_TBL, [self.CIPHER_KEY], self.db.conditionFormat(pk, level2))[0][0]
-                c3 = self.db.selectRecord(self.CIPHER_TBL, [self.CIPHER_KEY], self.db.conditionFormat(pk, level3))[0][0]
+                c1, c2, c3 = self._getUserCiphers(user)
                 r2 = c1 + self.magic
                 r3 = c1 + c2
                 if self._c2_encrypt_func(r2.encode()) != c2 or self._c3_encrypt_func(r3.encode()) != c3:
                     raise RuntimeError("密码数据库自检错误，密码可能被他人非法篡改，请联系维护人员进行修复！！！")
 
-                return True
-        except IndexError:
+            return True
+        except (IndexError, KeyError):
             raise RuntimeError("读取密码数据库错误，数据库可能被损坏，请联系维护人员进行修复！！！")
         except SQLiteDatabaseError as error:
             raise RuntimeError("数据库读取错误：{}".format(error))
 
     def getUserList(self) -> List[str]:
-        return [user[0] for user in self.db.selectRecord(self.USER_TBL, [self.USER_NAME_KEY])]
+        return list(self._getUserIndex().keys())
 
     def getCipherLevel(self, username: str):
         try:
-            _, pk, _ = self.db.getTablePrimaryKey(self.USER_TBL)
-            uid = self.db.selectRecord(self.USER_TBL, [pk], self.db.conditionFormat(self.USER_NAME_KEY, username))[0][0]
+            uid, _, _ = self._getUserIndex()[username]
             return uid * 3 - 2, uid * 3 - 1, uid * 3
-        except IndexError:
+        except KeyError:
             raise RuntimeError("数据库读取错误：无此用户「{}」！！！".format(username))
 
     def getUserPassword(self, username: str):
         try:
-            level, _, _ = self.getCipherLevel(username)
-            _, pk, _ = self.db.getTablePrimaryKey(self.CIPHER_TBL)
-            return self.db.selectRecord(self.CIPHER_TBL, [self.CIPHER_KEY], self.db.conditionFormat(pk, level))[0][0]
-        except IndexError:
+            c1, _, _ = self._getUserCiphers(username)
+            return c1
+        except KeyError:
             raise RuntimeError("数据库读取错误：无此用户「{}」！！！".format(username))
         except SQLiteDatabaseError as error:
             raise RuntimeError("数据库读取错误：{}".format(error))
 
     def getUserDescriptor(self, username: str):
         try:
-            condition = self.db.conditionFormat(self.USER_NAME_KEY, username)
-            return self.db.selectRecord(self.USER_TBL, [self.USER_DESC_KEY], condition)[0][0]
-        except IndexError:
+            _, desc, _ = self._getUserIndex()[username]
+            return desc
+        except KeyError:
             raise RuntimeError("数据库读取错误：无此用户「{}」！！！".format(username))
 
     def generateC1(self, password: bytes) -> str:
@@ -478,9 +1022,12 @@ class SQLiteUserPasswordDatabase(object):
             level1, level2, level3 = self.getCipherLevel(username)
             _, pk, _ = self.db.getTablePrimaryKey(self.CIPHER_TBL)
 
-            self.db.updateRecord(self.CIPHER_TBL, {self.CIPHER_KEY: c1}, self.db.conditionFormat(pk, level1))
-            self.db.updateRecord(self.CIPHER_TBL, {self.CIPHER_KEY: c2}, self.db.conditionFormat(pk, level2))
-            self.db.updateRecord(self.CIPHER_TBL, {self.CIPHER_KEY: c3}, self.db.conditionFormat(pk, level3))
+            with self.db.transaction():
+                self.db.updateRecord(self.CIPHER_TBL, {self.CIPHER_KEY: c1}, self.db.conditionFormat(pk, level1))
+                self.db.updateRecord(self.CIPHER_TBL, {self.CIPHER_KEY: c2}, self.db.conditionFormat(pk, level2))
+                self.db.updateRecord(self.CIPHER_TBL, {self.CIPHER_KEY: c3}, self.db.conditionFormat(pk, level3))
+
+            self.invalidateCache()
             self.selfTest()
         except IndexError:
             raise RuntimeError("数据库读取错误：无此用户「{}」！！！".format(username))
@@ -495,34 +1042,38 @@ class SQLiteUserPasswordDatabase(object):
 
             # First add user
             self.db.insertRecord(self.USER_TBL, [uid, user, desc])
+            self.invalidateCache()
 
             # Second get user level
             level1, level2, level3 = self.getCipherLevel(user)
 
             # Create user cipher
-            self.db.insertRecord(self.CIPHER_TBL, [level1, ""])
-            self.db.insertRecord(self.CIPHER_TBL, [level2, ""])
-            self.db.insertRecord(self.CIPHER_TBL, [level3, ""])
+            self.db.insertRecords(self.CIPHER_TBL, [[level1, ""], [level2, ""], [level3, ""]])
 
             # Finally update user password
             self.updatePassword(user, password)
         except SQLiteDatabaseError as error:
             raise RuntimeError("添加用户「{}」,失败：{}！！！".format(user, error))
+        finally:
+            self.invalidateCache()
 
     def deleteUser(self, user: str):
         try:
             # First get user level
             level1, level2, level3 = self.getCipherLevel(user)
 
-            # Delete cipher with specified level
-            self.db.deleteRecord(self.CIPHER_TBL, self.db.conditionFormat(self.CIPHER_LEVEL_KEY, level1))
-            self.db.deleteRecord(self.CIPHER_TBL, self.db.conditionFormat(self.CIPHER_LEVEL_KEY, level2))
-            self.db.deleteRecord(self.CIPHER_TBL, self.db.conditionFormat(self.CIPHER_LEVEL_KEY, level3))
+            with self.db.transaction():
+                # Delete cipher with specified level
+                self.db.deleteRecord(self.CIPHER_TBL, self.db.conditionFormat(self.CIPHER_LEVEL_KEY, level1))
+                self.db.deleteRecord(self.CIPHER_TBL, self.db.conditionFormat(self.CIPHER_LEVEL_KEY, level2))
+                self.db.deleteRecord(self.CIPHER_TBL, self.db.conditionFormat(self.CIPHER_LEVEL_KEY, level3))
 
-            # Finally delete user
-            self.db.deleteRecord(self.USER_TBL, self.db.conditionFormat(self.USER_NAME_KEY, user))
+                # Finally delete user
+                self.db.deleteRecord(self.USER_TBL, self.db.conditionFormat(self.USER_NAME_KEY, user))
         except SQLiteDatabaseError as error:
             raise RuntimeError("删除用户「{}」失败：{}！！！".format(user, error))
+        finally:
+            self.invalidateCache()
 
     @classmethod
     def create_database(cls, name: str):
@@ -7,7 +7,7 @@ from .msgbox import *
 from .button import RectButton
 from ..network.utility import *
 from ..misc.settings import UiLayout
-from ..protocol.serialport import SerialPort
+from .misc import SerialPortSelector
 from ..misc.windpi import get_program_scale_factor
 from .widget import SerialPortSettingWidget, BasicJsonSettingWidget, \
     JsonSettingWidget, MultiJsonSettingsWidget, MultiTabJsonSettingsWidget, MultiGroupJsonSettingsWidget
@@ -236,8 +236,7 @@ class SerialPortSelectDialog(QDialog):
     def __init__(self, timeout=0.04, parent=None):
         super(SerialPortSelectDialog, self).__init__(parent)
         layout = QVBoxLayout()
-        self._ports = QComboBox(self)
-        self._ports.addItems(SerialPort.get_serial_list(timeout))
+        self._ports = SerialPortSelector(text=None, parent=self, timeout=timeout)
         button = QDialogButtonBox(QDialogButtonBox.Ok | QDialogButtonBox.Cancel)
         button.accepted.connect(self.accept)
         button.rejected.connect(self.reject)
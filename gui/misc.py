@@ -1,13 +1,9 @@
 # -*- coding: utf-8 -*-
-import glob
-import platform
 from typing import *
 from PySide.QtGui import *
 from PySide.QtCore import *
-import serial.tools.list_ports
-from raspi_io.utility import scan_server
-from raspi_io import Query, RaspiSocketError
 from ..network.utility import get_system_nic
+from ..protocol.serialport import SerialPortDiscovery
 __all__ = ['SerialPortSelector', 'NetworkInterfaceSelector',
            'TabBar', 'ExpandWidget',
            'NavigationItem', 'NavigationBar',
@@ -19,28 +15,39 @@ __all__ = ['SerialPortSelector', 'NetworkInterfaceSelector',
 class SerialPortSelector(QComboBox):
     """List current system exist serial port and LAN raspberry serial port
 
+    Ports are listed from SerialPortDiscovery cache instantly and updated when background discovery finished
     """
     # When port selected this signal will emit
     portSelected = Signal(object)
+    # Discovery ports changed(added, removed), emit from discovery thread
+    portsChanged = Signal(object, object)
     TIPS = QApplication.translate("SerialPortSelector", "Please select serial port", None, QApplication.UnicodeUTF8)
 
-    def __init__(self, text: str or None = TIPS, one_shot: bool = False, parent=None):
+    def __init__(self, text: str or None = TIPS, one_shot: bool = False, parent=None, timeout: float = 0.04):
         """Select serial port
 
         :param text: selector text
         :param one_shot: only could select once
         :param parent:
+        :param timeout: LAN raspberry scan timeout
         """
         super(SerialPortSelector, self).__init__(parent)
 
         self.clear()
         self.__text = text
         self.__one_shot = one_shot
-        self.__system = platform.system().lower()
         self.setToolTip(self.tr("Right click reset and refresh serial port"))
 
+        # Receive discovery ports changes in gui thread
+        discovery = SerialPortDiscovery.default()
+        listener = self.portsChanged.emit
+        self.portsChanged.connect(self.slotPortsChanged)
+        discovery.add_listener(listener)
+        self.destroyed.connect(lambda: discovery.remove_listener(listener))
+        self.__discovery = discovery
+
         # Flush current serial port list
-        self.flushSerialPort()
+        self.flushSerialPort(timeout, force=False)
         self.currentIndexChanged.connect(self.slotPortSelected)
 
     def currentPort(self) -> str:
@@ -64,33 +71,42 @@ class SerialPortSelector(QComboBox):
         except ValueError:
             return False
 
-    def flushSerialPort(self, timeout: float = 0.04):
+    def flushSerialPort(self, timeout: float = 0.04, force: bool = True):
+        """Reset selector with cached ports and refresh ports in background
+
+        :param timeout: LAN raspberry scan timeout
+        :param force: force rescan LAN raspberry serial port even if cache is not expired
+        :return:
+        """
         self.clear()
         self.setEnabled(True)
 
         if self.__text:
             self.addItem(self.tr(self.__text))
 
-        # Scan local system serial port
-        if self.__system == "linux":
-            for index, port in enumerate(glob.glob("/dev/tty[A-Za-z]*")):
-                self.addItem("{}".format(port))
-                self.setItemData(self.count() - 1, port)
-        else:
-            for index, port in enumerate(list(serial.tools.list_ports.comports())):
-                # Windows serial port is a object linux is a tuple
-                device = port.device
-                desc = "{0:s}".format(device).split(" - ")[-1]
-                self.addItem("{0:s}".format(desc))
-                self.setItemData(self.count() - 1, device)
-
-        # Scan LAN raspberry serial port
-        try:
-            for raspberry in scan_server(timeout):
-                for port in Query(raspberry).get_serial_list():
-                    self.addItem("{}/{}".format(raspberry, port.split("/")[-1]), (raspberry, port))
-        except (RaspiSocketError, IndexError, ValueError, OSError):
-            pass
+        # Local ports is cheap to scan, scan it if discovery do not finished yet
+        for name, port in (self.__discovery.ports() or SerialPortDiscovery.scan_local()).items():
+            self.addItem(name, port)
+
+        # Changes will be notified by portsChanged signal
+        self.__discovery.refresh_async(timeout, force)
+
+    def slotPortsChanged(self, added: dict, removed: dict):
+        if not self.isEnabled():
+            return
+
+        self.blockSignals(True)
+
+        for name in removed:
+            idx = self.findText(name)
+            if idx >= 0 and self.itemData(idx):
+                self.removeItem(idx)
+
+        for name, port in added.items():
+            if self.findText(name) < 0:
+                self.addItem(name, port)
+
+        self.blockSignals(False)
 
     def slotPortSelected(self, idx):
         if not isinstance(idx, int) or not self.count() or not 0 <= idx < self.count() or not self.itemData(idx):
@@ -38,18 +38,18 @@ class ProcessManager(object):
         """
         retry = 3
         lst = list()
-        cwd = os.getcwd()
 
         try:
 
-            # Absolute path, enter path
+            # Absolute path, run in path(do not change process work directory)
             if os.path.isdir(self.path):
-                os.chdir(self.path)
+                cwd = self.path
                 if self.is_windows():
                     cmd = "{} {}".format(self.name, self.args)
                 else:
                     cmd = "./{} {}".format(self.name, self.args)
             else:
+                cwd = None
                 cmd = self.cmdline
 
             # Make program running in background
@@ -62,7 +62,7 @@ class ProcessManager(object):
             while not lst and retry > 0:
                 lst = self.get_pid(self.name)
                 if not lst:
-                    os.system(cmd)
+                    subprocess.call(cmd, shell=True, cwd=cwd)
                     retry -= 1
                     continue
 
@@ -71,8 +71,6 @@ class ProcessManager(object):
                         os.kill(pid, signal.SIGCONT if run else signal.SIGSTOP)
         except Exception:
             pass
-        finally:
-            os.chdir(cwd)
 
     @property
     def args(self):
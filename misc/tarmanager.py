@@ -2,13 +2,22 @@
 """
 Tar package file manager, support package file/directory to tar, gz, bz2  or unpackage file
 """
+import io
 import os
+import bz2
+import json
+import lzma
+import stat
+import zlib
 import shutil
 import tarfile
+import threading
 import zipfile
+import collections
+import concurrent.futures
 from typing import *
 
-__all__ = ['TarManager', 'TarManagerError']
+__all__ = ['TarManager', 'TarManagerError', 'TarPackEngine', 'TarMemberIndex', 'ParallelCompressWriter']
 
 
 class Compress(object):
@@ -44,30 +53,37 @@ class Compress(object):
         if hasattr(self._callback, "__call__"):
             self._callback(name)
 
-    def _pack(self, obj, filename: str):
+    def _pack(self, obj, filename: str, arcname: str or None = None):
         pass
 
-    def pack(self, obj, filename: str):
+    def pack(self, obj, filename: str, arcname: str or None = None):
+        """Pack a file
+
+        :param obj: package object
+        :param filename: file path
+        :param arcname: name in package, None means same as filename
+        :return:
+        """
         if not self.type_check(obj) or not os.path.isfile(filename):
             return
 
         if self._simulate:
-            self.callback(filename)
+            self.callback(arcname or filename)
         else:
-            self.callback(filename)
-            self._pack(obj, filename)
+            self.callback(arcname or filename)
+            self._pack(obj, filename, arcname)
 
     def _extract(self, obj, filename: str, extract_path: str):
         pass
 
-    def extract(self, obj, filename: str, extract_path: str):
+    def extract(self, obj, filename: str or tarfile.TarInfo, extract_path: str):
         if not self.type_check(obj) or not os.path.isdir(extract_path):
             return
 
         if self._simulate:
-            self.callback(filename)
+            self.callback(getattr(filename, "name", filename))
         else:
-            self.callback(filename)
+            self.callback(getattr(filename, "name", filename))
             self._extract(obj, filename, extract_path)
 
     def _extractall(self, obj, extract_path: str):
@@ -92,6 +108,8 @@ class TarCompress(Compress):
         "tgz": ":gz",
         "bz2": ":bz2",
         "tbz2": ":bz2",
+        "xz": ":xz",
+        "txz": ":xz",
     }
 
     def open(self, name: str, mode: str, fmt: str):
@@ -109,8 +127,8 @@ class TarCompress(Compress):
     def get_members(self, obj) -> List[str]:
         return obj.getnames()
 
-    def _pack(self, obj, filename: str):
-        obj.add(filename)
+    def _pack(self, obj, filename: str, arcname: str or None = None):
+        obj.add(filename, arcname)
 
     def _extractall(self, obj, extract_path: str):
         obj.extractall(extract_path)
@@ -145,8 +163,8 @@ class ZipCompress(Compress):
     def get_members(self, obj) -> List[str]:
         return obj.namelist()
 
-    def _pack(self, obj, filename):
-        obj.write(filename)
+    def _pack(self, obj, filename, arcname=None):
+        obj.write(filename, arcname)
 
     def _extractall(self, obj, extract_path):
         obj.extractall(extract_path)
@@ -159,6 +177,394 @@ class TarManagerError(Exception):
     pass
 
 
+class ParallelCompressWriter(object):
+    # Compress a block to a complete gz/bz2/xz member(stream), concatenated members is a valid compressed file
+    compressor = {
+        "gz": lambda data, level: ParallelCompressWriter.gzip_compress(data, level),
+        "bz2": lambda data, level: bz2.compress(data, level),
+        "xz": lambda data, level: lzma.compress(data, preset=level),
+    }
+
+    default_level = {
+        "gz": 6,
+        "bz2": 9,
+        "xz": 6,
+    }
+
+    def __init__(self, fileobj: BinaryIO, fmt: str, level: int or None = None, threads: int = os.cpu_count(),
+                 block_size: int = 1024 * 1024):
+        """Split data into blocks and compress blocks with a thread pool, write compressed block to fileobj in order
+
+        :param fileobj: output file object(file, socket.makefile, BytesIO...), only require write method
+        :param fmt: compress format gz, bz2 or xz
+        :param level: compress level, None means use default level
+        :param threads: compress threads
+        :param block_size: uncompressed block size
+        """
+        if fmt not in self.compressor:
+            raise ValueError("Unknown compress format: {}".format(fmt))
+
+        self.__fmt = fmt
+        self.__fileobj = fileobj
+        self.__threads = max(threads or 1, 1)
+        self.__block_size = block_size
+        self.__level = self.default_level.get(fmt) if level is None else level
+
+        self.__closed = False
+        self.__buffer = bytearray()
+        self.__pending = collections.deque()
+        self.__pool = concurrent.futures.ThreadPoolExecutor(max_workers=self.__threads)
+
+        self.bytes_in = 0
+        self.bytes_out = 0
+
+    @staticmethod
+    def gzip_compress(data: bytes, level: int) -> bytes:
+        # gzip container with zero mtime header, output is reproducible
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)
+        return compressor.compress(data) + compressor.flush()
+
+    def write(self, data: bytes) -> int:
+        self.__buffer += data
+        self.bytes_in += len(data)
+
+        while len(self.__buffer) >= self.__block_size:
+            self.__submit(bytes(self.__buffer[:self.__block_size]))
+            del self.__buffer[:self.__block_size]
+
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def close(self):
+        if self.__closed:
+            return
+
+        self.__closed = True
+
+        try:
+            if self.__buffer or not self.bytes_out and not self.__pending:
+                self.__submit(bytes(self.__buffer))
+                self.__buffer.clear()
+
+            while self.__pending:
+                self.__write_block(self.__pending.popleft())
+        finally:
+            self.__pool.shutdown()
+
+    def __submit(self, block: bytes):
+        self.__pending.append(self.__pool.submit(self.compressor.get(self.__fmt), block, self.__level))
+
+        # Limit memory usage, wait oldest block finished
+        while len(self.__pending) > self.__threads * 2:
+            self.__write_block(self.__pending.popleft())
+
+    def __write_block(self, future: concurrent.futures.Future):
+        data = future.result()
+        self.__fileobj.write(data)
+        self.bytes_out += len(data)
+
+
+class TarPackEngine(object):
+    # Package format => compress format
+    support_format = {
+        "tar": "",
+        "gz": "gz",
+        "tgz": "gz",
+        "bz2": "bz2",
+        "tbz2": "bz2",
+        "xz": "xz",
+        "txz": "xz",
+    }
+
+    # File size less than it will be read in parallel, large file is streamed from disk
+    PREFETCH_SIZE = 4 * 1024 * 1024
+
+    def __init__(self, fmt: str = "gz", level: int or None = None, threads: int = os.cpu_count(),
+                 block_size: int = 1024 * 1024, callback: Callable[[str], None] or None = None):
+        """Streaming tar pack engine, read files in parallel and compress with a multi-threaded block compressor
+
+        :param fmt: package format, see support_format
+        :param level: compress level, None means use default level
+        :param threads: read and compress threads
+        :param block_size: compress block size
+        :param callback: before pack every file will call this callback function
+        """
+        if fmt not in self.support_format:
+            raise TarManagerError("Unknown package format: {}".format(fmt))
+
+        self.__fmt = fmt
+        self.__level = level
+        self.__callback = callback
+        self.__block_size = block_size
+        self.__threads = max(threads or 1, 1)
+
+    def pack(self, files: Iterable[Tuple[str, str]], fileobj: BinaryIO) -> dict:
+        """Pack files to fileobj as a stream
+
+        :param files: (file path, name in archive) list
+        :param fileobj: output file object(file, socket.makefile, BytesIO...), only require write method
+        :return: statistics: files, bytes_in(uncompressed tar size), bytes_out(write to fileobj)
+        """
+        fmt = self.support_format.get(self.__fmt)
+        writer = ParallelCompressWriter(fileobj, fmt, self.__level, self.__threads, self.__block_size) if fmt \
+            else None
+        count = 0
+
+        try:
+            with concurrent.futures.ThreadPoolExecutor(max_workers=self.__threads) as pool:
+                with tarfile.open(fileobj=writer or fileobj, mode="w|") as tar:
+                    for path, arcname, future in self.__prefetch(pool, files):
+                        if hasattr(self.__callback, "__call__"):
+                            self.__callback(arcname)
+
+                        tarinfo = tar.gettarinfo(path, arcname)
+                        if not tarinfo.isreg():
+                            tar.addfile(tarinfo)
+                        elif future is not None:
+                            data = future.result()
+                            tarinfo.size = len(data)
+                            tar.addfile(tarinfo, io.BytesIO(data))
+                        else:
+                            with open(path, "rb") as fp:
+                                tar.addfile(tarinfo, fp)
+
+                        count += 1
+        finally:
+            if writer is not None:
+                writer.close()
+
+        bytes_in = writer.bytes_in if writer else None
+        bytes_out = writer.bytes_out if writer else None
+        return dict(files=count, bytes_in=bytes_in, bytes_out=bytes_out)
+
+    def __prefetch(self, pool, files):
+        def read(path):
+            with open(path, "rb") as fp:
+                return fp.read()
+
+        window = collections.deque()
+        for path, arcname in files:
+            st = os.lstat(path)
+            future = pool.submit(read, path) if stat.S_ISREG(st.st_mode) and st.st_size <= self.PREFETCH_SIZE \
+                else None
+            window.append((path, arcname, future))
+
+            # Read ahead bounded files
+            if len(window) > self.__threads * 4:
+                yield window.popleft()
+
+        while window:
+            yield window.popleft()
+
+
+class TarMemberIndex(object):
+    # Sidecar index file suffix
+    SIDECAR_SUFFIX = ".idx"
+    VERSION = 1
+
+    TARINFO_ATTRS = ("name", "mode", "uid", "gid", "size", "mtime", "linkname", "uname", "gname",
+                     "devmajor", "devminor", "offset", "offset_data", "pax_headers")
+
+    def __init__(self, file_path: str, fmt: str or None = None, sidecar: bool = False):
+        """Package member index, member names, sizes and data offsets are captured once,
+        extract a member seek to it's data directly without scan the whole package
+
+        Zip use it's central directory, tar index is build with one pass and could cached in a sidecar file
+        (file_path + SIDECAR_SUFFIX), sidecar is invalid if package size or modify time is changed
+
+        :param file_path: package file path
+        :param fmt: package format, None means detect by file name
+        :param sidecar: load index from sidecar file and save index to sidecar file if it's invalid
+        """
+        if not os.path.isfile(file_path):
+            raise TarManagerError("Tarfile: {0:s} is not exist".format(file_path))
+
+        self.__path = file_path
+        self.__fmt = fmt if fmt in TarManager.get_support_format() else TarManager.get_file_format(file_path)
+        self.__is_zip = self.__fmt in ZipCompress.support_format
+        if not self.__is_zip and self.__fmt not in TarCompress.support_format:
+            raise TarManagerError("Unknown package format:{0:s}".format(file_path))
+
+        self.__members = collections.OrderedDict()
+        if self.__is_zip:
+            with zipfile.ZipFile(file_path) as zip_file:
+                for info in zip_file.infolist():
+                    self.__members[info.filename] = dict(name=info.filename, size=info.file_size,
+                                                         offset=info.header_offset, is_dir=info.is_dir())
+        elif not sidecar or not self.__load_sidecar():
+            with tarfile.open(file_path, "r" + TarCompress.support_format.get(self.__fmt)) as tar:
+                for info in tar:
+                    self.__members[info.name] = self.__encode(info)
+
+            if sidecar:
+                self.__save_sidecar()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    @property
+    def seekable(self) -> bool:
+        """Package could random access member data without decompress data before it"""
+        return self.__is_zip or TarCompress.support_format.get(self.__fmt) == ":"
+
+    @property
+    def members(self) -> List[str]:
+        return list(self.__members.keys())
+
+    @property
+    def sidecar(self) -> str:
+        return self.__path + self.SIDECAR_SUFFIX
+
+    def __contains__(self, name: str) -> bool:
+        return name in self.__members
+
+    def get(self, name: str) -> dict or None:
+        """Get member info
+
+        :param name: member name
+        :return: name, size, offset(header) and offset_data(tar only)...
+        """
+        return self.__members.get(name)
+
+    def get_tarinfo(self, name: str) -> tarfile.TarInfo:
+        data = self.__members[name]
+        info = tarfile.TarInfo(data["name"])
+        for attr in self.TARINFO_ATTRS:
+            setattr(info, attr, data[attr])
+
+        info.type = data["type"].encode("latin-1")
+        return info
+
+    def read(self, name: str) -> bytes:
+        """Read member data
+
+        :param name: member name
+        :return: member data
+        """
+        if name not in self.__members:
+            raise TarManagerError("Member: {} is not exist".format(name))
+
+        try:
+            if self.__is_zip:
+                with zipfile.ZipFile(self.__path) as zip_file:
+                    return zip_file.read(name)
+
+            with self.__open_tar() as tar:
+                fp = tar.extractfile(self.get_tarinfo(name))
+                return fp.read() if fp else b""
+        except (OSError, KeyError, zipfile.error, tarfile.TarError) as e:
+            raise TarManagerError("Read member: {} error, {}".format(name, e))
+
+    def extract(self, name: str, extract_path: str):
+        """Random access extract a member, compressed tar decompress data before member only(without parse)
+
+        :param name: member name
+        :param extract_path: extract path
+        :return:
+        """
+        self.extractall(extract_path, [name])
+
+    def extractall(self, extract_path: str, members: Sequence[str] or None = None, workers: int = 1,
+                   callback: Callable[[str], None] or None = None):
+        """Extract members, zip and uncompressed tar extract files in parallel
+
+        :param extract_path: extract path
+        :param members: members to extract, None means all members
+        :param workers: parallel extract workers(only for seekable package)
+        :param callback: before extract every member will call this callback function(called from workers)
+        :return:
+        """
+        members = self.members if members is None else list(members)
+        for name in members:
+            if name not in self.__members:
+                raise TarManagerError("Member: {} is not exist".format(name))
+
+        try:
+            os.makedirs(extract_path, exist_ok=True)
+
+            # Regular files could extract in parallel, other members(directory, link...) extract in order
+            files = [x for x in members if self.__is_file(x)]
+            others = [x for x in members if not self.__is_file(x)]
+
+            # Create parent directories first, avoid workers create directory at same time
+            for name in files:
+                os.makedirs(os.path.join(extract_path, os.path.dirname(name)), exist_ok=True)
+
+            workers = max(min(workers, len(files)), 1) if self.seekable else 1
+            groups = [files[i::workers] for i in range(workers)]
+            if workers == 1:
+                self.__extract_group(groups[0], extract_path, callback)
+            else:
+                with concurrent.futures.ThreadPoolExecutor(max_workers=workers) as pool:
+                    for future in [pool.submit(self.__extract_group, x, extract_path, callback) for x in groups]:
+                        future.result()
+
+            # Directories attributes(modify time) after files extracted
+            self.__extract_group(others, extract_path, callback)
+        except (OSError, KeyError, zipfile.error, tarfile.TarError) as e:
+            raise TarManagerError("Extract failed: {}".format(e))
+
+    def __is_file(self, name: str) -> bool:
+        data = self.__members[name]
+        return not data["is_dir"] if self.__is_zip else data["type"] in ("0", "\0", "7")
+
+    def __open_tar(self) -> tarfile.TarFile:
+        return tarfile.open(self.__path, "r" + TarCompress.support_format.get(self.__fmt))
+
+    def __extract_group(self, members: List[str], extract_path: str, callback: Callable[[str], None] or None):
+        if not members:
+            return
+
+        if self.__is_zip:
+            with zipfile.ZipFile(self.__path) as zip_file:
+                for name in members:
+                    if hasattr(callback, "__call__"):
+                        callback(name)
+                    zip_file.extract(name, extract_path)
+        else:
+            with self.__open_tar() as tar:
+                # Members in data order, compressed tar only decompress forward
+                for name in sorted(members, key=lambda x: self.__members[x]["offset"]):
+                    if hasattr(callback, "__call__"):
+                        callback(name)
+                    tar.extract(self.get_tarinfo(name), extract_path)
+
+    def __encode(self, info: tarfile.TarInfo) -> dict:
+        data = {attr: getattr(info, attr) for attr in self.TARINFO_ATTRS}
+        data["type"] = info.type.decode("latin-1")
+        return data
+
+    def __archive_stat(self) -> dict:
+        st = os.stat(self.__path)
+        return dict(size=st.st_size, mtime_ns=st.st_mtime_ns)
+
+    def __load_sidecar(self) -> bool:
+        try:
+            with open(self.sidecar, "r") as fp:
+                data = json.load(fp)
+
+            if data.get("version") != self.VERSION or data.get("archive") != self.__archive_stat():
+                return False
+
+            self.__members = collections.OrderedDict((x["name"], x) for x in data["members"])
+            return True
+        except (OSError, ValueError, KeyError, TypeError):
+            return False
+
+    def __save_sidecar(self):
+        try:
+            with open(self.sidecar + ".tmp", "w") as fp:
+                json.dump(dict(version=self.VERSION, archive=self.__archive_stat(),
+                               members=list(self.__members.values())), fp)
+            os.replace(self.sidecar + ".tmp", self.sidecar)
+        except (OSError, TypeError, ValueError):
+            # Sidecar is only a cache
+            pass
+
+
 class TarManager(object):
     support_formats = set(list(TarCompress.support_format.keys()) + list(ZipCompress.support_format.keys()))
 
@@ -212,10 +618,49 @@ class TarManager(object):
 
         return compress, compress.open(file_path, TarManager.operateDict.get("read"), fmt)
 
+    @staticmethod
+    def get_pack_files(path: str, extensions: list or tuple or None = None,
+                       filters: Callable[[str], bool] or None = None) -> Iterator[str]:
+        """Get files will be packed
+
+        :param path: directory path
+        :param extensions: if set only pack those extension names
+        :param filters: if set when filter is true will packed
+        :return: file path relative to path, e.g. ./dir/file
+        """
+        filters = filters if hasattr(filters, "__call__") else None
+        extensions = extensions if isinstance(extensions, (list, tuple)) else list()
+
+        for root, dirs, files in os.walk(path):
+            relative = os.path.relpath(root, path)
+            relative = os.curdir if relative == os.curdir else os.path.join(os.curdir, relative)
+
+            for file_name in files:
+                extension_name = file_name.split(".")[-1]
+                full_path = os.path.join(relative, file_name)
+
+                # File extension name is in extension
+                if len(extensions) and extension_name in extensions:
+                    yield full_path
+                    continue
+
+                # File name is pass the filter
+                if filters and filters(extension_name):
+                    yield full_path
+                    continue
+
+                # No in extensions and not in filters
+                if len(extensions) or filters:
+                    continue
+
+                # Do not has extension and filters pack all
+                yield full_path
+
     @staticmethod
     def pack(path: str, name: str, fmt: str or None = None,
              extensions: list or tuple or None = None, filters: Callable[[str], bool] or None = None,
-             verbose: bool = False, simulate: bool = False, callback: Callable[[str], None] or None = None):
+             verbose: bool = False, simulate: bool = False, callback: Callable[[str], None] or None = None,
+             threads: int = 1, level: int or None = None):
         """Package directory to a tarfile
 
         :param path: directory path
@@ -226,12 +671,10 @@ class TarManager(object):
         :param verbose: show verbose message
         :param simulate: set simulate means not real pack only run process to get how many files it;s need to pack
         :param callback: before pack every file will call this callback function
+        :param threads: if greater than 1 tar formats will pack with TarPackEngine use threads read and compress
+        :param level: TarPackEngine compress level, None means use default level
         """
 
-        current_path = os.getcwd()
-        filters = filters if hasattr(filters, "__call__") else None
-        extensions = extensions if isinstance(extensions, (list, tuple)) else list()
-
         try:
 
             # Make sure path is a dir
@@ -240,18 +683,24 @@ class TarManager(object):
 
             # Check name
             if not os.path.isdir(os.path.dirname(name)):
-                name = os.path.join(current_path, os.path.basename(name))
+                name = os.path.join(os.getcwd(), os.path.basename(name))
 
             # Get file format
             fmt = fmt if fmt in TarManager.get_support_format() else TarManager.get_file_format(name)
 
+            # Multi-threaded streaming pack
+            if threads > 1 and not simulate and fmt in TarPackEngine.support_format:
+                if verbose:
+                    print("{0:s} -> {1:s}".format(os.path.abspath(path), name))
+
+                with open(name, "wb") as fp:
+                    TarManager.pack_stream(path, fp, fmt, extensions, filters, callback, threads, level)
+                return
+
             compress = TarManager.create_compress_object(fmt, simulate, callback)
             if not isinstance(compress, Compress):
                 raise TarManagerError("Unknown package format: {}".format(os.path.basename(name)))
 
-            # Entry package directory
-            os.chdir(path)
-
             # Create package file
             tar_file = compress.open(name, TarManager.operateDict.get("write"), fmt)
             if not compress.type_check(tar_file):
@@ -261,44 +710,97 @@ class TarManager(object):
             if verbose:
                 print("{0:s} -> {1:s}".format(os.path.abspath(path), name))
 
-            # Traversal all files in path add to tarFile
-            for root, dirs, files in os.walk('.'):
-                for file_name in files:
-                    extension_name = file_name.split(".")[-1]
-                    full_path = os.path.join(root, file_name)
+            # Traversal all files in path add to tarFile, name in package is relative to path
+            for arcname in TarManager.get_pack_files(path, extensions, filters):
+                compress.pack(tar_file, os.path.join(path, arcname), arcname)
 
-                    # File extension name is in extension
-                    if len(extensions) and extension_name in extensions:
-                        compress.pack(tar_file, full_path)
-                        continue
+            # Close tarFile
+            compress.close(tar_file)
 
-                    # File name is pass the filter
-                    if filters and filters(extension_name):
-                        compress.pack(tar_file, full_path)
-                        continue
+        except (OSError, ZipCompress.exception, TarCompress.exception) as e:
+            raise TarManagerError("Create tar file error:{}".format(e))
 
-                    # No in extensions and not in filters
-                    if len(extensions) or filters:
-                        continue
+    @staticmethod
+    def pack_batch(jobs: Sequence[Tuple[str, str]], fmt: str or None = None,
+                   extensions: list or tuple or None = None, filters: Callable[[str], bool] or None = None,
+                   workers: int = os.cpu_count(), progress: Callable[[str, int, int], None] or None = None,
+                   threads: int = 1, level: int or None = None) -> List[str]:
+        """Pack directories to packages in parallel
+
+        :param jobs: (directory path, package name) list
+        :param fmt: package formats, None means get format from each package name
+        :param extensions: if set only pack those extension names
+        :param filters: if set when filter is true will packed
+        :param workers: parallel pack jobs
+        :param progress: progress(package name, packed files, total files of all jobs), called from workers
+        :param threads: each job read and compress threads, see pack
+        :param level: compress level, see pack
+        :return: package names
+        """
+        lock = threading.Lock()
+        counter = dict(packed=0, total=0)
+
+        for path, _ in jobs:
+            if not os.path.isdir(path):
+                raise TarManagerError("Path: {0:s} is not a directory".format(path))
 
-                    # Do not has extension and filters pack all
-                    compress.pack(tar_file, full_path)
+            counter["total"] += sum(1 for _ in TarManager.get_pack_files(path, extensions, filters))
 
-            # Close tarFile
-            compress.close(tar_file)
+        def pack(path, name):
+            def callback(_):
+                with lock:
+                    counter["packed"] += 1
+                    packed, total = counter["packed"], counter["total"]
+
+                if hasattr(progress, "__call__"):
+                    progress(name, packed, total)
+
+            TarManager.pack(path, name, fmt, extensions, filters, callback=callback, threads=threads, level=level)
+            return name
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(min(workers or 1, len(jobs)), 1)) as pool:
+            futures = [pool.submit(pack, path, name) for path, name in jobs]
+            concurrent.futures.wait(futures)
+
+        errors = [x.exception() for x in futures if x.exception() is not None]
+        if errors:
+            raise TarManagerError("Pack batch error({}/{} failed): {}".format(len(errors), len(jobs), errors[0]))
+
+        return [x.result() for x in futures]
+
+    @staticmethod
+    def pack_stream(path: str, fileobj: BinaryIO, fmt: str = "gz",
+                    extensions: list or tuple or None = None, filters: Callable[[str], bool] or None = None,
+                    callback: Callable[[str], None] or None = None,
+                    threads: int = os.cpu_count(), level: int or None = None) -> dict:
+        """Package directory as a stream to fileobj(file, socket.makefile...) without temporary file
+
+        :param path: directory path
+        :param fileobj: output file object, only require write method
+        :param fmt: package format, see TarPackEngine.support_format
+        :param extensions: if set only pack those extension names
+        :param filters: if set when filter is true will packed
+        :param callback: before pack every file will call this callback function
+        :param threads: read and compress threads
+        :param level: compress level, None means use default level
+        :return: statistics, see TarPackEngine.pack
+        """
+        if not os.path.isdir(path):
+            raise TarManagerError("Path: {0:s} is not a directory".format(path))
 
-        except OSError as e:
-            raise TarManagerError("Change work dir error:{}".format(e))
-        except (ZipCompress.exception, TarCompress.exception) as e:
+        try:
+            engine = TarPackEngine(fmt, level, threads, callback=callback)
+            files = ((os.path.join(path, x), x) for x in TarManager.get_pack_files(path, extensions, filters))
+            return engine.pack(files, fileobj)
+        except (OSError, ValueError, zlib.error, lzma.LZMAError, TarCompress.exception) as e:
             raise TarManagerError("Create tar file error:{}".format(e))
-        finally:
-            os.chdir(current_path)
 
     @staticmethod
     def unpack(file_path: str,
                unpack_path: str = "",
                fmt: str or None = None,
-               simulate: bool = False, callback: Callable[[str], int] or None = None):
+               simulate: bool = False, callback: Callable[[str], int] or None = None,
+               workers: int = 1, index: bool = False):
         """Unpack file_path specified file to unpack_path
 
         :return:
@@ -307,6 +809,8 @@ class TarManager(object):
         :param fmt: package format
         :param simulate: set simulate means not real unpack only run process to get how many files it;s need to unpack
         :param callback: before unpack every file will call this callback function
+        :param workers: if greater than 1 zip and uncompressed tar will extract files in parallel
+        :param index: use TarMemberIndex sidecar file cache member index
         """
         try:
             # Check unpack directory
@@ -316,18 +820,55 @@ class TarManager(object):
             if not os.path.isdir(unpack_path):
                 os.makedirs(unpack_path)
 
-            # Open as tarfile and extractall and close finally
+            if not simulate and (workers > 1 or index):
+                TarManager.get_member_index(file_path, fmt, index).extractall(unpack_path, workers=workers,
+                                                                              callback=callback)
+                return
+
+            # Open as tarfile and extract in one pass(iterate TarInfo, do not lookup member by name) and close finally
             compress, tar_file = TarManager.check_and_open_compress_object(file_path, fmt, simulate, callback)
-            for member in compress.get_members(tar_file):
+            members = tar_file if isinstance(tar_file, tarfile.TarFile) else compress.get_members(tar_file)
+            for member in members:
                 compress.extract(tar_file, member, unpack_path)
             compress.close(tar_file)
         except (IOError, OSError, ZipCompress.exception, TarCompress.exception, shutil.Error) as e:
             raise TarManagerError('Extract failed：IOError, {}'.format(e))
 
     @staticmethod
-    def get_members(file_path: str, fmt: str or None = None):
+    def get_members(file_path: str, fmt: str or None = None, index: bool = False):
+        """Get package members
+
+        :param file_path: package file path
+        :param fmt: package format
+        :param index: use TarMemberIndex sidecar file, do not decompress package if sidecar is valid
+        :return: member names
+        """
+        if index:
+            return TarManager.get_member_index(file_path, fmt, True).members
+
         try:
             compress, tar_file = TarManager.check_and_open_compress_object(file_path, fmt)
             return compress.get_members(tar_file)
         except (IOError, OSError, ZipCompress.exception, TarCompress.exception, shutil.Error) as e:
             raise TarManagerError("Get file members error, {}".format(e))
+
+    @staticmethod
+    def get_member_index(file_path: str, fmt: str or None = None, sidecar: bool = True) -> TarMemberIndex:
+        try:
+            return TarMemberIndex(file_path, fmt, sidecar)
+        except (IOError, OSError, ZipCompress.exception, TarCompress.exception, EOFError, zlib.error,
+                lzma.LZMAError) as e:
+            raise TarManagerError("Get file members error, {}".format(e))
+
+    @staticmethod
+    def extract_member(file_path: str, member: str, extract_path: str, fmt: str or None = None, index: bool = True):
+        """Extract a member without scan whole package(member index)
+
+        :param file_path: package file path
+        :param member: member name
+        :param extract_path: extract path
+        :param fmt: package format
+        :param index: use TarMemberIndex sidecar file
+        :return:
+        """
+        TarManager.get_member_index(file_path, fmt, index).extract(member, extract_path)
@@ -1,6 +1,12 @@
 # -*- coding: utf-8 -*-
 import os
+import json
+import time
+import shutil
+import hashlib
 import requests
+import threading
+import contextlib
 from typing import *
 import concurrent.futures
 from pyquery import PyQuery
@@ -34,11 +40,56 @@ class RepoRelease(DynamicObject):
         return self.attachment.get(name, "")
 
 
+class _RangeNotSupported(Exception):
+    pass
+
+
+class _SizeMismatch(Exception):
+    pass
+
+
+class _DownloadBudget(object):
+    def __init__(self, limit: int):
+        """Resizable concurrent downloads limit, resize takes effect on downloads hold a slot already"""
+        self.__active = 0
+        self.__limit = limit
+        self.__condition = threading.Condition()
+
+    @property
+    def limit(self) -> int:
+        return self.__limit
+
+    def resize(self, limit: int):
+        with self.__condition:
+            self.__limit = max(limit, 1)
+            self.__condition.notify_all()
+
+    def __enter__(self):
+        with self.__condition:
+            self.__condition.wait_for(lambda: self.__active < self.__limit)
+            self.__active += 1
+
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        with self.__condition:
+            self.__active -= 1
+            self.__condition.notify()
+
+
 class GogsRequest(HttpRequest):
     TOKEN_NAME = "_csrf"
+    PART_SUFFIX = ".part"
+    MIN_SEGMENT_SIZE = 1024 * 1024
+    DOWNLOAD_CHUNK_SIZE = 1024 * 64
 
-    def __init__(self, host: str, username: str, password: str, source_address: str = "", timeout: int = 5):
-        super(GogsRequest, self).__init__(token_name=self.TOKEN_NAME, source_address=source_address, timeout=timeout)
+    # Global concurrent downloads limit, see set_download_budget
+    _download_budget = _DownloadBudget(4)
+
+    def __init__(self, host: str, username: str, password: str, source_address: str = "", timeout: int = 5,
+                 pool_size: int = HttpRequest.POOL_SIZE, retries: int = 0, backoff_factor: float = 0.0):
+        super(GogsRequest, self).__init__(token_name=self.TOKEN_NAME, source_address=source_address, timeout=timeout,
+                                          pool_size=pool_size, retries=retries, backoff_factor=backoff_factor)
         self.__host = host
         self.__username = username
 
@@ -56,20 +107,43 @@ class GogsRequest(HttpRequest):
     def get_repo_url(self, repo: str) -> str:
         return "{}/{}".format(self.__host, repo)
 
+    @classmethod
+    def set_download_budget(cls, max_concurrent: int):
+        """
+        Limit concurrent downloads(download and download_package) of all instances,
+        peak download memory is about max_concurrent * chunk_size, could be resized while downloading,
+        running downloads are finished and new downloads wait until concurrent downloads below new limit
+        :param max_concurrent: maximum concurrent downloads
+        :return:
+        """
+        cls._download_budget.resize(max_concurrent)
+
+    @staticmethod
+    def get_cache_key(url: str, etag: str) -> str:
+        return hashlib.sha256("{}\n{}".format(url, etag).encode()).hexdigest()
+
     def download(self, name: str, url: str, timeout: int = 60,
-                 callback: Callable[[str], None] or None = None) -> bool:
+                 callback: Callable[[str], None] or None = None,
+                 chunk_size: int = DOWNLOAD_CHUNK_SIZE, cache_dir: str or None = None) -> bool:
         """
-        Download file or attachment
+        Download file or attachment, data is streamed to file chunk by chunk
         :param name: download file save path
         :param url: download url
         :param timeout: download timeout
         :param callback: callback(name: str) -> None
+        :param chunk_size: download chunk size in bytes
+        :param cache_dir: if set, download is cached in cache_dir keyed by url and ETag, if cached content is not
+        modified(If-None-Match) copy it from cache instead of download, cache_dir could shared by multi-machines
         :return: success return ture
         """
         try:
-            with closing(self.section_get(url, timeout=timeout)) as response:
-                with open(name, "wb") as file:
-                    file.write(response.content)
+            with self._download_budget:
+                if cache_dir:
+                    self.__cached_download(name, url, timeout, chunk_size, cache_dir)
+                else:
+                    with closing(self.section_get(url, timeout=timeout, stream=True)) as response:
+                        response.raise_for_status()
+                        self.__write_response(response, name, chunk_size)
         except (OSError, requests.RequestException) as e:
             print("Download {} failed: {}".format(url, e))
             return False
@@ -79,46 +153,236 @@ class GogsRequest(HttpRequest):
 
         return True
 
+    def __write_response(self, response: requests.Response, name: str, chunk_size: int):
+        # Write to a temporary file, other processes(shared cache) never see a partial file
+        part = "{}.{}.{}{}".format(name, os.getpid(), threading.get_ident(), self.PART_SUFFIX)
+
+        try:
+            with open(part, "wb") as file:
+                for data in response.iter_content(chunk_size=chunk_size):
+                    file.write(data)
+
+            os.replace(part, name)
+        finally:
+            with contextlib.suppress(OSError):
+                os.remove(part)
+
+    def __cached_download(self, name: str, url: str, timeout: int, chunk_size: int, cache_dir: str):
+        os.makedirs(cache_dir, exist_ok=True)
+        etag_file = os.path.join(cache_dir, "{}.etag".format(hashlib.sha256(url.encode()).hexdigest()))
+
+        try:
+            with open(etag_file) as file:
+                etag = file.read().strip()
+        except OSError:
+            etag = ""
+
+        cached = os.path.join(cache_dir, self.get_cache_key(url, etag))
+        headers = {"If-None-Match": etag} if etag and os.path.isfile(cached) else None
+
+        with closing(self.section_get(url, timeout=timeout, stream=True, headers=headers)) as response:
+            if headers and response.status_code == self.HTTP_NotModified:
+                shutil.copyfile(cached, name)
+                return
+
+            response.raise_for_status()
+            etag = response.headers.get("ETag", "")
+
+            # Server do not support ETag, can't cache it
+            if not etag:
+                self.__write_response(response, name, chunk_size)
+                return
+
+            # Cached by other machine
+            cached = os.path.join(cache_dir, self.get_cache_key(url, etag))
+            if not os.path.isfile(cached):
+                self.__write_response(response, cached, chunk_size)
+
+        with open(etag_file + ".{}.{}".format(os.getpid(), threading.get_ident()), "w") as file:
+            file.write(etag)
+        os.replace(file.name, etag_file)
+        shutil.copyfile(cached, name)
+
     def stream_download(self, name: str, url: str, size: int, chunk_size: int = 1024 * 32,
-                        timeout: int = 60, callback: Callable[[float, str], bool] or None = None) -> bool:
+                        timeout: int = 60, callback: Callable[[float, str], bool] or None = None,
+                        segments: int = 1, retry: int = 3, md5: str = "") -> bool:
         """
-        Stream download a file from gogs server
+        Stream download a file from gogs server, data is written to name + PART_SUFFIX and renamed when finished,
+        an interrupted download will resume from partial file with http range request, download state(url, size
+        and downloaded ranges) is saved in name + PART_SUFFIX + ".json", partial file of other url is discarded
         :param name: download path
         :param url: download url
         :param size: download file size in bytes
         :param chunk_size: download chunk size in bytes
         :param timeout: download timeout
-        :param callback: download progress callback
+        :param callback: download progress callback, callback(percent, info: downloaded/size and speed) -> bool
+        :param segments: split file into segments download concurrently(file size at least MIN_SEGMENT_SIZE each)
+        :param retry: each segment retry(resume) times when network error occurred
+        :param md5: if set verify downloaded file md5
         :return: success return true, failed return false
         """
+        if not isinstance(size, int) or not size:
+            print("{!r} stream download must specific download file size".format(self.__class__.__name__))
+            return False
+
+        part = name + self.PART_SUFFIX
+        chunk_size = chunk_size if size > chunk_size else 1024
+        chunk_size = chunk_size if size > chunk_size else 1
+        segments = max(min(segments, size // self.MIN_SEGMENT_SIZE), 1)
+
         try:
-            if not isinstance(size, int) or not size:
-                print("{!r} stream download must specific download file size".format(self.__class__.__name__))
+            ranges = self.__load_download_state(part, url, size, segments)
+            if not os.path.isfile(part):
+                with open(part, "wb") as file:
+                    file.truncate(size if len(ranges) > 1 else 0)
+
+                self.__save_download_state(part, url, size, ranges)
+
+            try:
+                result = self.__download_ranges(part, url, size, ranges, chunk_size, timeout, callback, retry)
+            except _RangeNotSupported:
+                # Server do not support range request, download from scratch with single connection
+                ranges = [[0, size - 1, 0]]
+                result = self.__download_ranges(part, url, size, ranges, chunk_size, timeout, callback, retry, False)
+
+            if not result:
+                print("Download canceled")
+                return False
+
+            # Verify and rename to download path
+            with open(part, "r+b") as file:
+                file.truncate(size)
+
+            if md5 and self.get_file_md5(part) != md5.lower():
+                print("Download {} failed: md5 check failed".format(url))
+                self.__remove_download_state(part, True)
                 return False
 
-            download_size = 0
-            chunk_size = chunk_size if size > chunk_size else 1024
-            chunk_size = chunk_size if size > chunk_size else 1
-            with closing(self.section_get(url, timeout=timeout, stream=True)) as response:
-                with open(name, "wb") as file:
-                    for data in response.iter_content(chunk_size=chunk_size):
-                        file.write(data)
-                        download_size += len(data)
-
-                        if hasattr(callback, "__call__"):
-                            info = "{}K/{}K".format(download_size // 1024, size // 1024)
-                            if not callback(round(download_size / size * 100, 2), info):
-                                print("Download canceled")
-                                return False
+            os.replace(part, name)
+            self.__remove_download_state(part, False)
+        except _SizeMismatch as e:
+            print("Download {} failed: {}".format(url, e))
+            self.__remove_download_state(part, True)
+            return False
         except (OSError, requests.RequestException) as e:
             print("Download {} failed: {}".format(url, e))
             return False
 
         return True
 
+    @staticmethod
+    def get_file_md5(path: str, block_size: int = 1024 * 1024) -> str:
+        md5 = hashlib.md5()
+        with open(path, "rb") as file:
+            for data in iter(lambda: file.read(block_size), b""):
+                md5.update(data)
+
+        return md5.hexdigest()
+
+    def __download_ranges(self, part: str, url: str, size: int, ranges: List[List[int]], chunk_size: int,
+                          timeout: int, callback: Callable[[float, str], bool] or None, retry: int,
+                          ranged: bool = True) -> bool:
+        lock = threading.Lock()
+        canceled = threading.Event()
+        start_time = time.perf_counter()
+        start_size = sum(x[2] for x in ranges)
+
+        def report():
+            with lock:
+                if canceled.is_set() or not hasattr(callback, "__call__"):
+                    return
+
+                download_size = sum(x[2] for x in ranges)
+                speed = (download_size - start_size) / max(time.perf_counter() - start_time, 1e-6)
+                info = "{}K/{}K {:.1f}KB/s".format(download_size // 1024, size // 1024, speed / 1024)
+                if not callback(round(download_size / size * 100, 2), info):
+                    canceled.set()
+
+        def fetch(segment: List[int]):
+            errors = 0
+            while segment[2] < segment[1] - segment[0] + 1 and not canceled.is_set():
+                # Without range request every retry download whole file again
+                if not ranged:
+                    segment[2] = 0
+
+                offset = segment[0] + segment[2]
+                headers = None
+                if ranged and (offset or len(ranges) > 1):
+                    headers = {"Range": "bytes={}-{}".format(offset, segment[1])}
+
+                try:
+                    with closing(self.section_get(url, timeout=timeout, stream=True, headers=headers)) as response:
+                        response.raise_for_status()
+                        if headers and response.status_code != self.HTTP_PartialContent:
+                            raise _RangeNotSupported()
+
+                        with open(part, "r+b") as file:
+                            file.seek(offset)
+                            for data in response.iter_content(chunk_size=chunk_size):
+                                if len(data) > segment[1] - segment[0] + 1 - segment[2]:
+                                    canceled.set()
+                                    raise _SizeMismatch("received data exceed size {}".format(size))
+
+                                file.write(data)
+                                segment[2] += len(data)
+                                report()
+
+                                if canceled.is_set() or segment[2] == segment[1] - segment[0] + 1:
+                                    break
+                except (OSError, requests.RequestException):
+                    errors += 1
+                    if errors > retry:
+                        canceled.set()
+                        raise
+
+        try:
+            if len(ranges) == 1:
+                fetch(ranges[0])
+            else:
+                self.ensure_pool_size(len(ranges))
+                with concurrent.futures.ThreadPoolExecutor(max_workers=len(ranges)) as pool:
+                    for future in [pool.submit(fetch, x) for x in ranges]:
+                        future.result()
+        finally:
+            self.__save_download_state(part, url, size, ranges)
+
+        return not canceled.is_set()
+
+    @staticmethod
+    def __load_download_state(part: str, url: str, size: int, segments: int) -> List[List[int]]:
+        """Get download segments: [start, end, downloaded], partial file without state of same url and size is
+        discarded"""
+        try:
+            with open(part + ".json") as file:
+                state = json.load(file)
+
+            if os.path.isfile(part) and state.get("url") == url and state.get("size") == size:
+                return state["ranges"]
+        except (OSError, ValueError, KeyError, AttributeError):
+            pass
+
+        if os.path.isfile(part):
+            os.remove(part)
+
+        step = size // segments
+        return [[i * step, size - 1 if i == segments - 1 else (i + 1) * step - 1, 0] for i in range(segments)]
+
+    @staticmethod
+    def __save_download_state(part: str, url: str, size: int, ranges: List[List[int]]):
+        with contextlib.suppress(OSError):
+            with open(part + ".json", "w") as file:
+                json.dump(dict(url=url, size=size, ranges=ranges), file)
+
+    @staticmethod
+    def __remove_download_state(part: str, remove_part: bool):
+        for path in (part + ".json", part) if remove_part else (part + ".json",):
+            with contextlib.suppress(OSError):
+                os.remove(path)
+
     def download_package(self, package: dict, path: str,
                          timeout: int = 60, parallel: bool = True, max_workers: int = 4,
-                         ignore_error: bool = True, callback: Callable[[str, int], bool] or None = None) -> dict:
+                         ignore_error: bool = True, callback: Callable[[str, int], bool] or None = None,
+                         chunk_size: int = DOWNLOAD_CHUNK_SIZE, cache_dir: str or None = None) -> dict:
         """
         Download an a pack of file
         :param package: Package to download, package is dict include multi-files name is key url is value
@@ -129,6 +393,9 @@ class GogsRequest(HttpRequest):
         :param ignore_error: If set ignore error, when error occurred will ignore error continue download
         :param callback: Callback function, callback(downloaded_file_name: str, download_progress: int) -> bool if
         callback return false mean's canceled, one serial download support this feature
+        :param chunk_size: Download chunk size, files are streamed to disk, concurrent downloads of all packages are
+        limited by set_download_budget, so peak memory is bounded
+        :param cache_dir: Download cache directory, see download
         :return: Success return each file download result, dict key is file name, value is download result
         """
         download_result = dict(zip(package.keys(), [False] * len(package)))
@@ -159,9 +426,11 @@ class GogsRequest(HttpRequest):
 
         if parallel:
             # Thread pool parallel download attachment
+            self.ensure_pool_size(max_workers)
             with concurrent.futures.ThreadPoolExecutor(max_workers=max_workers) as pool:
                 result = [pool.submit(self.download, **DynamicObject(name=os.path.join(path, name), url=url,
-                                                                     timeout=timeout, callback=download_callback).dict)
+                                                                     timeout=timeout, callback=download_callback,
+                                                                     chunk_size=chunk_size, cache_dir=cache_dir).dict)
                           for name, url in package.items()]
 
             # Get each file download result
@@ -169,7 +438,8 @@ class GogsRequest(HttpRequest):
                 download_result[name] = ret.result() if ret.result() is not None else False
         else:
             for name, url in package.items():
-                ret = self.download(name=os.path.join(path, name), url=url, timeout=timeout)
+                ret = self.download(name=os.path.join(path, name), url=url, timeout=timeout,
+                                    chunk_size=chunk_size, cache_dir=cache_dir)
                 download_result[name] = ret
 
                 # Callback and if return false means cancel download
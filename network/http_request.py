@@ -1,9 +1,15 @@
 # -*- coding: utf-8 -*-
+import time
 import requests
 import ipaddress
+import collections
+import threading
 import fake_useragent
+from typing import Callable
 from pyquery import PyQuery
 import requests_toolbelt.adapters
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 __all__ = ['HttpRequest', 'HttpRequestException']
 
 
@@ -16,27 +22,150 @@ class HttpRequestException(Exception):
 
 class HttpRequest(object):
     HTTP_OK = 200
+    HTTP_PartialContent = 206
+    HTTP_NotModified = 304
     HTTP_Forbidden = 403
     HTTP_Unauthorized = 401
 
     TOKEN_NAME = "token"
-
-    def __init__(self, token_name: str = TOKEN_NAME, source_address: str = "", timeout: int = 5):
+    TOKEN_TTL = 60.0
+    POOL_SIZE = 10
+    RETRY_STATUS = (502, 503, 504)
+
+    def __init__(self, token_name: str = TOKEN_NAME, source_address: str = "", timeout: int = 5,
+                 pool_size: int = POOL_SIZE, retries: int = 0, backoff_factor: float = 0.0,
+                 token_ttl: float = TOKEN_TTL):
+        """
+        Http request base on requests.Session
+        :param token_name: form token name
+        :param source_address: bind local address, applies to all pooled connections
+        :param timeout: default request timeout
+        :param pool_size: connection pool size per host, should match concurrent workers
+        :param retries: connect/read/status(502, 503, 504) retry times, 0 disable retry
+        :param backoff_factor: retry backoff factor, sleep backoff_factor * (2 ** (retry - 1)) between retries
+        :param token_ttl: get_token cache expire time in seconds, 0 disable token cache
+        """
         self._timeout = timeout
         self.__token_name = token_name
         self._section = requests.Session()
 
         try:
-            source_address = str(ipaddress.ip_address(source_address))
-            new_source = requests_toolbelt.adapters.source.SourceAddressAdapter(source_address)
-            self._section.mount("http://", new_source)
-            self._section.mount("https://", new_source)
+            self.__source_address = str(ipaddress.ip_address(source_address))
         except ValueError:
-            pass
+            self.__source_address = ""
+
+        self.__pool_size = pool_size
+        self.__retries = retries
+        self.__backoff_factor = backoff_factor
+        self.__transport_lock = threading.RLock()
+        self.__mount_adapter()
+
+        self.__token_ttl = token_ttl
+        self.__token_cache = dict()
+        self.__token_lock = threading.Lock()
+
+        self.__latency_hooks = list()
+        self.__latency_lock = threading.Lock()
+        self.__latency_statistics = dict(count=0, total=0.0, max=0.0)
+        self._section.hooks["response"].append(self.__response_hook)
 
         self._fake_ua = fake_useragent.UserAgent()
         self._section.headers = {'User-Agent': self._fake_ua.chrome}
 
+    def __mount_adapter(self):
+        retry = Retry(total=self.__retries, backoff_factor=self.__backoff_factor,
+                      status_forcelist=self.RETRY_STATUS, raise_on_status=False)
+        kwargs = dict(pool_connections=self.__pool_size, pool_maxsize=self.__pool_size, max_retries=retry)
+
+        if self.__source_address:
+            adapter = requests_toolbelt.adapters.source.SourceAddressAdapter(self.__source_address, **kwargs)
+        else:
+            adapter = HTTPAdapter(**kwargs)
+
+        # Session.mount reorder adapters in place, replace the whole dict so concurrent Session.get_adapter
+        # iterate either old or new adapters, default prefixes are shortest so they are kept at the end
+        with self.__transport_lock:
+            previous = self._section.adapters
+            adapters = collections.OrderedDict((k, v) for k, v in previous.items() if k not in ("http://", "https://"))
+            adapters["https://"] = adapter
+            adapters["http://"] = adapter
+            self._section.adapters = adapters
+
+            # Release pooled connections of old adapter, in flight connections are closed when returned
+            for old in {previous.get("http://"), previous.get("https://")} - {None}:
+                old.close()
+
+    def configure_transport(self, pool_size: int or None = None,
+                            retries: int or None = None, backoff_factor: float or None = None):
+        """
+        Re-mount transport adapter, None means keep current setting
+        :param pool_size: connection pool size per host
+        :param retries: retry times
+        :param backoff_factor: retry backoff factor
+        :return:
+        """
+        with self.__transport_lock:
+            self.__pool_size = self.__pool_size if pool_size is None else max(pool_size, 1)
+            self.__retries = self.__retries if retries is None else retries
+            self.__backoff_factor = self.__backoff_factor if backoff_factor is None else backoff_factor
+            self.__mount_adapter()
+
+    def ensure_pool_size(self, workers: int):
+        """Grow connection pool to match concurrent workers, avoid discarding connections"""
+        with self.__transport_lock:
+            if workers > self.__pool_size:
+                self.configure_transport(pool_size=workers)
+
+    @property
+    def pool_size(self) -> int:
+        return self.__pool_size
+
+    @property
+    def source_address(self) -> str:
+        return self.__source_address
+
+    def add_latency_hook(self, hook: Callable[[str, str, int, float], None]):
+        """
+        Add request latency hook, it will be called after each response received
+        :param hook: hook(method: str, url: str, status_code: int, elapsed: float) -> None, elapsed in seconds
+        :return:
+        """
+        if hasattr(hook, "__call__") and hook not in self.__latency_hooks:
+            self.__latency_hooks.append(hook)
+
+    def remove_latency_hook(self, hook: Callable[[str, str, int, float], None]):
+        if hook in self.__latency_hooks:
+            self.__latency_hooks.remove(hook)
+
+    def get_latency_statistics(self) -> dict:
+        """
+        Get request latency statistics
+        :return: dict(count, total, average, max), time in seconds
+        """
+        with self.__latency_lock:
+            statistics = dict(self.__latency_statistics)
+
+        statistics["average"] = statistics["total"] / statistics["count"] if statistics["count"] else 0.0
+        return statistics
+
+    def reset_latency_statistics(self):
+        with self.__latency_lock:
+            self.__latency_statistics = dict(count=0, total=0.0, max=0.0)
+
+    def __response_hook(self, response: requests.Response, *args, **kwargs):
+        # Elapsed between sending the request and finishing parsing the headers
+        elapsed = response.elapsed.total_seconds()
+        with self.__latency_lock:
+            self.__latency_statistics["count"] += 1
+            self.__latency_statistics["total"] += elapsed
+            self.__latency_statistics["max"] = max(self.__latency_statistics["max"], elapsed)
+
+        for hook in self.__latency_hooks[:]:
+            try:
+                hook(response.request.method, response.url, response.status_code, elapsed)
+            except Exception as e:
+                print("Latency hook error: {}".format(e))
+
     @property
     def timeout(self) -> int:
         return self._timeout
@@ -54,12 +183,37 @@ class HttpRequest(object):
         doc = PyQuery(text.encode())
         return doc('input[name="{}"]'.format(name)).attr("value").strip()
 
-    def get_token(self, url: str) -> str:
+    def get_token(self, url: str, force: bool = False) -> str:
+        """
+        Get form token from url, token is cached for token_ttl seconds
+        :param url: token page url
+        :param force: ignore cache, always request a new token
+        :return: token or empty string if failed
+        """
+        with self.__token_lock:
+            token, expire = self.__token_cache.get(url, ("", 0.0))
+
+        if token and not force and time.monotonic() < expire:
+            return token
+
         res = self.section_get(url)
         if not self.is_response_ok(res):
             return ""
 
-        return self.get_token_from_text(res.text, self.__token_name)
+        token = self.get_token_from_text(res.text, self.__token_name)
+        if token and self.__token_ttl > 0:
+            with self.__token_lock:
+                self.__token_cache[url] = (token, time.monotonic() + self.__token_ttl)
+
+        return token
+
+    def invalidate_token(self, url: str = ""):
+        """Invalidate cached token of url, empty url invalidate all tokens"""
+        with self.__token_lock:
+            if url:
+                self.__token_cache.pop(url, None)
+            else:
+                self.__token_cache.clear()
 
     def section_get(self, url: str, **kwargs) -> requests.Response:
         kwargs.setdefault("timeout", self.timeout)
@@ -73,6 +227,8 @@ class HttpRequest(object):
               login_data: dict,
               headers: dict or None = None,
               require_token: bool = False, verify: bool = False):
+        # Session changed after login, previous tokens are invalid
+        self.invalidate_token()
         if require_token:
             login_data[self.token_name] = self.get_token(url)
 
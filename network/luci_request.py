@@ -6,13 +6,15 @@ import ping3
 import random
 import requests
 import datetime
+import threading
 import ipaddress
 import urllib.parse
-from typing import Callable
+import concurrent.futures
+from typing import Callable, Iterable, Iterator, Tuple
 from pyquery import PyQuery
 from .http_request import *
 from ..core.datatype import DynamicObject
-__all__ = ['LuciRequest', 'LuciRequestException']
+__all__ = ['LuciRequest', 'LuciRequestException', 'LuciFleet']
 
 
 class LuciRequestException(HttpRequestException):
@@ -21,8 +23,10 @@ class LuciRequestException(HttpRequestException):
 
 class LuciRequest(HttpRequest):
     def __init__(self, host: str, username: str, password: str,
-                 main_container_id: str = "", source_address: str = "", timeout: int = 5):
-        super(LuciRequest, self).__init__(source_address=source_address, timeout=timeout)
+                 main_container_id: str = "", source_address: str = "", timeout: int = 5,
+                 pool_size: int = HttpRequest.POOL_SIZE, retries: int = 0, backoff_factor: float = 0.0):
+        super(LuciRequest, self).__init__(source_address=source_address, timeout=timeout,
+                                          pool_size=pool_size, retries=retries, backoff_factor=backoff_factor)
 
         try:
             self._address = ipaddress.IPv4Address(host.split("//")[-1].split(":")[0])
@@ -147,3 +151,224 @@ class LuciRequest(HttpRequest):
 
         print_msg("Wait system reboot timeout")
         return False
+
+
+class LuciFleet(object):
+    POLL_METHODS = ("get_dynamic_status", "get_static_status", "get_firmware_version")
+
+    def __init__(self, username: str, password: str, main_container_id: str = "",
+                 source_address: str = "", timeout: int = 5, max_workers: int = 32, relogin: int = 1):
+        """
+        Manage logged-in LuciRequest sessions of many hosts and poll them concurrently
+        :param username: default login username
+        :param password: default login password
+        :param main_container_id: LuciRequest main container id
+        :param source_address: bind local address
+        :param timeout: per-host request timeout
+        :param max_workers: maximum concurrent hosts
+        :param relogin: re-login times when a request failed(session expired)
+        """
+        self.__username = username
+        self.__password = password
+        self.__main_container_id = main_container_id
+        self.__source_address = source_address
+        self.__timeout = timeout
+        self.__max_workers = max(max_workers, 1)
+        self.__relogin = max(relogin, 0)
+
+        self.__lock = threading.Lock()
+        self.__hosts = dict()
+        self.__sessions = dict()
+        self.__session_locks = dict()
+
+    @property
+    def hosts(self) -> list:
+        with self.__lock:
+            return list(self.__hosts.keys())
+
+    def add_host(self, host: str, username: str = "", password: str = ""):
+        """
+        Add host to fleet, session is created when first used
+        :param host: host url, e.g. http://192.168.1.1
+        :param username: login username, empty using default
+        :param password: login password, empty using default
+        :return:
+        """
+        with self.__lock:
+            self.__hosts[host] = (username or self.__username, password or self.__password)
+            self.__session_locks.setdefault(host, threading.Lock())
+
+    def remove_host(self, host: str):
+        with self.__lock:
+            self.__hosts.pop(host, None)
+            self.__sessions.pop(host, None)
+            self.__session_locks.pop(host, None)
+
+    def get_session(self, host: str) -> LuciRequest:
+        """
+        Get host logged-in session, login if not exist
+        :param host: host url
+        :return: LuciRequest
+        """
+        with self.__lock:
+            if host not in self.__hosts:
+                raise LuciRequestException(0, "Unknown host: {}".format(host))
+
+            session = self.__sessions.get(host)
+            username, password = self.__hosts[host]
+            session_lock = self.__session_locks[host]
+
+        if session is not None:
+            return session
+
+        # Only one thread login a host
+        with session_lock:
+            with self.__lock:
+                session = self.__sessions.get(host)
+
+            if session is None:
+                session = LuciRequest(host, username, password, main_container_id=self.__main_container_id,
+                                      source_address=self.__source_address, timeout=self.__timeout, pool_size=2)
+                with self.__lock:
+                    if host in self.__hosts:
+                        self.__sessions[host] = session
+
+            return session
+
+    def invalidate(self, host: str = ""):
+        """Drop host session(empty host drop all sessions), next request will re-login"""
+        with self.__lock:
+            if host:
+                self.__sessions.pop(host, None)
+            else:
+                self.__sessions.clear()
+
+    def call(self, host: str, method: str, *args, **kwargs):
+        """
+        Call host session method, re-login and retry if it failed or return empty result
+        :param host: host url
+        :param method: LuciRequest method name
+        :return: method result
+        """
+        for retry in range(self.__relogin + 1):
+            try:
+                result = getattr(self.get_session(host), method)(*args, **kwargs)
+            except (requests.RequestException, HttpRequestException):
+                self.invalidate(host)
+                if retry == self.__relogin:
+                    raise
+                continue
+
+            # Expired session return login page instead of status
+            if result or retry == self.__relogin:
+                return result
+
+            self.invalidate(host)
+
+    def ping(self, host: str, timeout: int = 1) -> float or None:
+        return ping3.ping(dest_addr=host.split("//")[-1].split(":")[0].split("/")[0], timeout=timeout)
+
+    def poll(self, method: str = "get_dynamic_status", hosts: Iterable[str] or None = None,
+             deadline: float or None = None) -> Iterator[Tuple[str, object, Exception or None]]:
+        """
+        Concurrent poll hosts, results are yielded as soon as they are completed
+        :param method: LuciRequest method name, POLL_METHODS or is_alive(ping without session)
+        :param hosts: poll hosts, None poll all hosts
+        :param deadline: whole poll deadline in seconds, unfinished hosts yield TimeoutError
+        :return: iterator of (host, result, error)
+        """
+        hosts = self.hosts if hosts is None else list(hosts)
+
+        def task(host):
+            return self.ping(host) if method == "is_alive" else self.call(host, method)
+
+        return self.map(task, hosts, deadline)
+
+    def map(self, func: Callable[[str], object], hosts: Iterable[str],
+            deadline: float or None = None) -> Iterator[Tuple[str, object, Exception or None]]:
+        """
+        Concurrent run func(host) with bounded concurrency
+        :param func: func(host: str) -> object
+        :param hosts: hosts
+        :param deadline: whole deadline in seconds, unfinished hosts yield TimeoutError
+        :return: iterator of (host, result, error) in completed order
+        """
+        hosts = list(hosts)
+        if not hosts:
+            return
+
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(self.__max_workers, len(hosts)))
+        futures = {pool.submit(func, host): host for host in hosts}
+        yielded = set()
+
+        try:
+            for future in concurrent.futures.as_completed(futures, timeout=deadline):
+                error = future.exception()
+                yielded.add(future)
+                yield futures[future], None if error else future.result(), error
+        except concurrent.futures.TimeoutError:
+            # Futures finished after deadline fired still yield their result
+            for future, host in futures.items():
+                if future in yielded:
+                    continue
+
+                if future.done() and not future.cancelled():
+                    error = future.exception()
+                    yield host, None if error else future.result(), error
+                else:
+                    yield host, None, TimeoutError("{} timeout".format(host))
+        finally:
+            pool.shutdown(wait=False, cancel_futures=True)
+
+    def firmware_upgrade(self, firmware: str, hosts: Iterable[str] or None = None,
+                         wave_size: int = 8, canary: int = 1, max_failures: int = 0,
+                         keep: bool = True, reboot_wait: int = 30, timeout: int = 120,
+                         output_msg: Callable[[str], None] = print) -> dict:
+        """
+        Staged firmware upgrade, upgrade canary hosts first then following waves of wave_size hosts in parallel,
+        stop starting new wave when failures exceed max_failures
+        :param firmware: firmware path
+        :param hosts: upgrade hosts, None upgrade all hosts
+        :param wave_size: hosts per wave
+        :param canary: first wave hosts, 0 no canary wave
+        :param max_failures: allowed failures before stop
+        :param keep: keep settings
+        :param reboot_wait: LuciRequest.firmware_upgrade reboot_wait
+        :param timeout: LuciRequest.firmware_upgrade timeout
+        :param output_msg: output message callback, message is prefixed with host
+        :return: dict host -> True/False, hosts not upgraded(stopped) are not included
+        """
+        hosts = self.hosts if hosts is None else list(hosts)
+        waves = [hosts[:canary]] if canary > 0 else []
+        remain = hosts[len(waves[0]):] if waves else hosts
+        waves.extend(remain[i:i + max(wave_size, 1)] for i in range(0, len(remain), max(wave_size, 1)))
+
+        def print_msg(msg):
+            if hasattr(output_msg, "__call__"):
+                output_msg(msg)
+
+        def upgrade(host):
+            def host_msg(msg):
+                print_msg("{}: {}".format(host, msg))
+
+            try:
+                return self.get_session(host).firmware_upgrade(firmware, keep=keep, reboot_wait=reboot_wait,
+                                                               timeout=timeout, output_msg=host_msg)
+            finally:
+                # Session is invalid after reboot
+                self.invalidate(host)
+
+        result = dict()
+        for index, wave in enumerate(waves):
+            print_msg("Upgrade wave {}/{}: {}".format(index + 1, len(waves), ", ".join(wave)))
+            for host, success, error in self.map(upgrade, wave):
+                if error:
+                    print_msg("{}: upgrade failed: {}".format(host, error))
+                result[host] = bool(success) and error is None
+
+            failures = list(result.values()).count(False)
+            if failures > max_failures:
+                print_msg("Upgrade stopped, {} host(s) failed".format(failures))
+                break
+
+        return result
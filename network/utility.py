@@ -2,7 +2,10 @@
 import os
 import sys
 import time
+import errno
 import ping3
+import random
+import asyncio
 import ifaddr
 import struct
 import socket
@@ -10,11 +13,12 @@ import platform
 import ipaddress
 import concurrent.futures
 from threading import Thread
-from typing import List
+from typing import List, Iterable, AsyncIterator, Callable, Awaitable, Tuple
 from ..core.datatype import DynamicObject
 __all__ = ['get_system_nic',
            'get_host_address', 'get_broadcast_address',
            'connect_device', 'scan_lan_port', 'scan_lan_alive',
+           'async_connect_device', 'async_scan', 'async_scan_lan_port', 'async_scan_lan_alive',
            'set_keepalive', 'enable_broadcast', 'enable_multicast', 'set_linger_option',
            'create_socket_and_connect',
            'SocketSingleInstanceLock']
@@ -153,6 +157,269 @@ def scan_lan_alive(network: str or ipaddress.IPv4Network, timeout: int = 1, max_
     return [str(x) for x, r in zip(network.hosts(), result) if r.result() is not None]
 
 
+async def async_connect_device(address: str, port: int, timeout: float = 0.2) -> str or None:
+    loop = asyncio.get_running_loop()
+    sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+    sock.setblocking(False)
+
+    try:
+        error = sock.connect_ex((address, port))
+        if error == 0:
+            return address
+
+        if error not in (errno.EINPROGRESS, errno.EWOULDBLOCK, errno.EAGAIN):
+            return None
+
+        # Wait socket writable or timeout, cheaper than a wait_for task per connect
+        future = loop.create_future()
+
+        def finish(result: bool):
+            if not future.done():
+                future.set_result(result)
+
+        try:
+            loop.add_writer(sock.fileno(), finish, True)
+        except NotImplementedError:
+            # Proactor event loop(windows) do not support add_writer
+            await asyncio.wait_for(loop.sock_connect(sock, (address, port)), timeout)
+            return address
+
+        timer = loop.call_later(timeout, finish, False)
+        try:
+            if await future and sock.getsockopt(socket.SOL_SOCKET, socket.SO_ERROR) == 0:
+                return address
+            return None
+        finally:
+            timer.cancel()
+            loop.remove_writer(sock.fileno())
+    except (asyncio.TimeoutError, OSError):
+        return None
+    finally:
+        sock.close()
+
+
+async def async_scan(targets: Iterable, probe: Callable[..., Awaitable], window: int = 1024,
+                     rate: float = 0) -> AsyncIterator:
+    """Run probe(target) for each target with bounded in-flight window, yield results as soon as they complete
+
+    :param targets: probe targets, consumed lazily
+    :param probe: coroutine function, probe(target) -> result or None
+    :param window: maximum in-flight probes
+    :param rate: maximum new probes per second, 0 no limit
+    :return: async iterator of not None results
+    """
+    done = object()
+    queue = asyncio.Queue()
+    running = set()
+    semaphore = asyncio.Semaphore(max(window, 1))
+
+    async def run(target):
+        try:
+            result = await probe(target)
+            if result is not None:
+                queue.put_nowait(result)
+        except Exception as e:
+            print("async_scan: probe {} error: {}".format(target, e))
+        finally:
+            semaphore.release()
+            running.discard(asyncio.current_task())
+
+    async def produce():
+        try:
+            count = 0
+            interval = 1.0 / rate if rate > 0 else 0
+            start = time.monotonic()
+            for target in targets:
+                await semaphore.acquire()
+                if interval:
+                    await asyncio.sleep(max(start + count * interval - time.monotonic(), 0))
+
+                running.add(asyncio.ensure_future(run(target)))
+                count += 1
+
+            await asyncio.gather(*running, return_exceptions=True)
+        finally:
+            queue.put_nowait(done)
+
+    # Only not None results are queued, queue size is bounded by found results
+    producer = asyncio.ensure_future(produce())
+
+    try:
+        while True:
+            result = await queue.get()
+            if result is done:
+                break
+
+            yield result
+    finally:
+        # Consumer stop early, cancel pending probes
+        producer.cancel()
+        for task in list(running):
+            task.cancel()
+
+
+async def async_scan_lan_port(network: str or ipaddress.IPv4Network, ports: int or Iterable[int],
+                              timeout: float = 0.2, window: int = 1024,
+                              rate: float = 0) -> AsyncIterator[Tuple[str, int]]:
+    """Asyncio scan network hosts open ports
+
+    :param network: scan network
+    :param ports: scan port or ports
+    :param timeout: connect timeout
+    :param window: maximum in-flight connects
+    :param rate: maximum new connects per second, 0 no limit
+    :return: async iterator of (address, port)
+    """
+    try:
+        network = ipaddress.ip_network(network)
+    except ValueError:
+        print("async_scan_lan_port: invalid network: {}".format(network))
+        return
+
+    ports = [ports] if isinstance(ports, int) else list(ports)
+
+    async def probe(target):
+        return target if await async_connect_device(*target, timeout=timeout) else None
+
+    async for result in async_scan(((str(x), port) for x in network.hosts() for port in ports), probe, window, rate):
+        yield result
+
+
+class _AsyncPinger(object):
+    ICMP_ECHO_REQUEST = 8
+    ICMP_ECHO_REPLY = 0
+    RECV_BUFFER_SIZE = 4 * 1024 * 1024
+
+    def __init__(self):
+        # Unprivileged ICMP socket, kernel handles identifier, otherwise using raw socket
+        try:
+            self.__sock = socket.socket(socket.AF_INET, socket.SOCK_DGRAM, socket.IPPROTO_ICMP)
+            self.__raw = False
+        except PermissionError:
+            self.__sock = socket.socket(socket.AF_INET, socket.SOCK_RAW, socket.IPPROTO_ICMP)
+            self.__raw = True
+
+        # Replies of a large in-flight window arrive in a burst
+        self.__sock.setsockopt(socket.SOL_SOCKET, socket.SO_RCVBUF, self.RECV_BUFFER_SIZE)
+        self.__sock.setblocking(False)
+        self.__identifier = random.randint(0, 0xffff)
+        self.__waiters = dict()
+        self.__receiver = None
+
+    def close(self):
+        if self.__receiver:
+            self.__receiver.cancel()
+
+        self.__sock.close()
+
+    @staticmethod
+    def checksum(data: bytes) -> int:
+        data += b"\x00" * (len(data) % 2)
+        total = sum(struct.unpack("!{}H".format(len(data) // 2), data))
+        total = (total >> 16) + (total & 0xffff)
+        total += total >> 16
+        return ~total & 0xffff
+
+    async def __receive(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            # ICMP errors(e.g. host unreachable) are reported on the socket, do not stop receiving
+            try:
+                data, (address, _) = await loop.sock_recvfrom(self.__sock, 1024)
+            except OSError as e:
+                if self.__sock.fileno() < 0:
+                    break
+
+                print("_AsyncPinger receive error: {}".format(e))
+                continue
+
+            if self.__raw:
+                data = data[(data[0] & 0x0f) * 4:]
+
+            if len(data) < 8:
+                continue
+
+            icmp_type, _, _, identifier, _ = struct.unpack("!BBHHH", data[:8])
+            if icmp_type != self.ICMP_ECHO_REPLY or (self.__raw and identifier != self.__identifier):
+                continue
+
+            waiter = self.__waiters.get(address)
+            if waiter and not waiter.done():
+                waiter.set_result(time.monotonic())
+
+    async def ping(self, address: str, timeout: float, sequence: int = 0) -> float or None:
+        loop = asyncio.get_running_loop()
+        if self.__receiver is None:
+            self.__receiver = asyncio.ensure_future(self.__receive())
+
+        header = struct.pack("!BBHHH", self.ICMP_ECHO_REQUEST, 0, 0, self.__identifier, sequence & 0xffff)
+        payload = struct.pack("!d", time.monotonic())
+        packet = struct.pack("!BBHHH", self.ICMP_ECHO_REQUEST, 0, self.checksum(header + payload),
+                             self.__identifier, sequence & 0xffff) + payload
+
+        waiter = self.__waiters[address] = loop.create_future()
+        start = time.monotonic()
+
+        try:
+            await loop.sock_sendto(self.__sock, packet, (address, 0))
+            return await asyncio.wait_for(waiter, timeout) - start
+        except (asyncio.TimeoutError, OSError):
+            return None
+        finally:
+            self.__waiters.pop(address, None)
+
+
+# Fallback ping3 thread pool size, blocking pings do not scale with in-flight window
+_PING3_MAX_WORKERS = 32
+
+
+async def async_scan_lan_alive(network: str or ipaddress.IPv4Network, timeout: float = 1, window: int = 1024,
+                               rate: float = 0) -> AsyncIterator[str]:
+    """Asyncio ping scan network alive hosts, all pings share one icmp socket, if icmp socket is not permitted
+    fallback to ping3 in a small thread pool
+
+    :param network: scan network
+    :param timeout: ping timeout
+    :param window: maximum in-flight pings
+    :param rate: maximum new pings per second, 0 no limit
+    :return: async iterator of alive address
+    """
+    try:
+        network = ipaddress.ip_network(network)
+    except ValueError:
+        print("async_scan_lan_alive: invalid network: {}".format(network))
+        return
+
+    try:
+        pinger = _AsyncPinger()
+    except OSError:
+        pinger = None
+
+    loop = asyncio.get_running_loop()
+    pool = None
+    if pinger is None:
+        pool = concurrent.futures.ThreadPoolExecutor(max_workers=min(window, _PING3_MAX_WORKERS))
+
+    async def probe(target):
+        index, address = target
+        if pinger:
+            delay = await pinger.ping(address, timeout, index)
+        else:
+            delay = await loop.run_in_executor(pool, lambda: ping3.ping(dest_addr=address, timeout=timeout))
+
+        # ping3 return False on error, None on timeout
+        return address if delay is not None and delay is not False else None
+
+    try:
+        async for result in async_scan(enumerate(str(x) for x in network.hosts()), probe, window, rate):
+            yield result
+    finally:
+        if pinger:
+            pinger.close()
+        else:
+            pool.shutdown(wait=False)
+
+
 def create_socket_and_connect(address: str, port: int, timeout: int,
                               recv_buf_size: int = 32 * 1024, retry: int = 3, no_delay: bool = True) -> socket.socket:
     times = 0
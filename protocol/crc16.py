@@ -1,5 +1,13 @@
 # -*- coding: utf-8 -*-
-__all__ = ['crc16', 'crc16IBM']
+import sys
+import threading
+
+try:
+    import numpy
+except ImportError:
+    numpy = None
+
+__all__ = ['crc16', 'crc16IBM', 'crc16_batch', 'Crc16']
 
 
 __CRC_TABLE_HI = [
@@ -54,6 +62,181 @@ __CRC_TABLE_LOW = [
 ]
 
 
+# Modbus and IBM crc16 share the same reflected polynomial(0xA001), only initial value is different
+CRC16_MODBUS_INIT = 0xffff
+CRC16_IBM_INIT = 0x0
+
+# Byte table: crc = (crc >> 8) ^ _CRC_TABLE[(crc ^ byte) & 0xff]
+_CRC_TABLE = [(low << 8) | hi for hi, low in zip(__CRC_TABLE_HI, __CRC_TABLE_LOW)]
+
+# Word table: crc = _CRC_WORD_TABLE[crc ^ word], lazy created at first large buffer (64K entries)
+_CRC_WORD_TABLE = None
+_CRC_WORD_TABLE_LOCK = threading.Lock()
+
+# Buffer shorter than this will use byte table directly
+_WORD_THRESHOLD = 64
+
+# Buffer larger than this will use numpy lanes(if numpy is available)
+_NUMPY_THRESHOLD = 256 * 1024
+_NUMPY_LANE_SIZE = 1024
+
+
+def _get_word_table():
+    global _CRC_WORD_TABLE
+    if _CRC_WORD_TABLE is None:
+        with _CRC_WORD_TABLE_LOCK:
+            if _CRC_WORD_TABLE is None:
+                table = _CRC_TABLE
+                _CRC_WORD_TABLE = [table[(table[word & 0xff] ^ (word >> 8)) & 0xff] ^ (table[word & 0xff] >> 8)
+                                   for word in range(0x10000)]
+
+    return _CRC_WORD_TABLE
+
+
+def _update_bytes(crc, data):
+    table = _CRC_TABLE
+    for byte in data:
+        crc = (crc >> 8) ^ table[(crc ^ byte) & 0xff]
+
+    return crc
+
+
+def _update_words(crc, view):
+    """Process two bytes per lookup(slicing-by-2 with a 16bit table), view must be a 'B' format memoryview"""
+    size = len(view) & ~0x1
+    table = _get_word_table()
+    for word in view[:size].cast('H'):
+        crc = table[crc ^ word]
+
+    return _update_bytes(crc, view[size:])
+
+
+def _shift_matrix(length):
+    """Get the linear operator which feeds length zero bytes to crc register
+
+    Operator is represented by the images of 16 register bits, apply it with _apply_matrix
+    :param length: zero bytes count
+    :return: operator columns
+    """
+    result = [1 << bit for bit in range(16)]
+    square = [_update_bytes(1 << bit, b'\x00') for bit in range(16)]
+    while length:
+        if length & 0x1:
+            result = [_apply_matrix(square, column) for column in result]
+
+        square = [_apply_matrix(square, column) for column in square]
+        length >>= 1
+
+    return result
+
+
+def _apply_matrix(matrix, crc):
+    value = 0
+    for column in matrix:
+        if crc & 0x1:
+            value ^= column
+        crc >>= 1
+
+    return value
+
+
+def _update_numpy(crc, view):
+    """Split buffer to lanes and calculate all lanes crc simultaneously, then combine lanes crc
+
+    crc(A + B) = shift(crc(A), len(B)) ^ crc0(B), crc0 means initial value is zero
+    :param crc: current crc
+    :param view: 'B' format memoryview
+    :return: updated crc
+    """
+    lanes = len(view) // _NUMPY_LANE_SIZE
+    size = lanes * _NUMPY_LANE_SIZE
+    table = numpy.array(_CRC_TABLE, dtype=numpy.uint16)
+    data = numpy.frombuffer(view[:size], dtype=numpy.uint8).reshape(lanes, _NUMPY_LANE_SIZE).T.copy()
+
+    registers = numpy.zeros(lanes, dtype=numpy.uint16)
+    registers[0] = crc
+    for column in data:
+        registers = (registers >> 8) ^ table[(registers ^ column) & 0xff]
+
+    # Apply shift operator byte by byte with two 256 entries table
+    matrix = _shift_matrix(_NUMPY_LANE_SIZE)
+    shift_low = [_apply_matrix(matrix, byte) for byte in range(256)]
+    shift_high = [_apply_matrix(matrix, byte << 8) for byte in range(256)]
+
+    crc = 0
+    for register in registers.tolist():
+        crc = shift_low[crc & 0xff] ^ shift_high[crc >> 8] ^ register
+
+    return _update_words(crc, view[size:])
+
+
+def _as_byte_view(data):
+    try:
+        return memoryview(data).cast('B')
+    except TypeError:
+        return None
+
+
+def _update(crc, data):
+    view = _as_byte_view(data)
+
+    # Not a bytes-like object(list of int etc.)
+    if view is None:
+        return _update_bytes(crc, data)
+
+    if len(view) < _WORD_THRESHOLD or sys.byteorder != "little":
+        return _update_bytes(crc, view)
+
+    if numpy is not None and len(view) >= _NUMPY_THRESHOLD:
+        return _update_numpy(crc, view)
+
+    return _update_words(crc, view)
+
+
+class Crc16(object):
+    def __init__(self, data=b'', init=CRC16_MODBUS_INIT):
+        """Incremental crc16 calculator, hashlib like api
+
+        >>> c = Crc16()
+        >>> c.update(b'amaork')
+        >>> c.update(b'0123456789')
+        >>> c.digest() == crc16(b'amaork0123456789')
+        True
+
+        :param data: initial data
+        :param init: crc register initial value, CRC16_MODBUS_INIT or CRC16_IBM_INIT
+        """
+        self.__init = init & 0xffff
+        self.__crc = self.__init
+        if data:
+            self.update(data)
+
+    def __repr__(self):
+        return "{}(0x{:04x})".format(self.__class__.__name__, self.__crc)
+
+    def reset(self):
+        self.__crc = self.__init
+
+    def update(self, data):
+        """Update crc with data, data can be bytes, bytearray, memoryview or any buffer object
+
+        :param data: will update data
+        :return:
+        """
+        self.__crc = _update(self.__crc, data)
+
+    def copy(self):
+        instance = Crc16(init=self.__init)
+        instance.__crc = self.__crc
+        return instance
+
+    def digest(self):
+        return self.__crc
+
+    def hexdigest(self):
+        return "{:04x}".format(self.__crc)
+
+
 def crc16(data):
     """Calculate data crc16(modbus)
 
@@ -79,15 +262,7 @@ def crc16(data):
     }
     """
 
-    crc_hi = 0xff
-    crc_low = 0xff
-
-    for byte in data:
-        index = crc_low ^ byte
-        crc_low = crc_hi ^ __CRC_TABLE_HI[index]
-        crc_hi = __CRC_TABLE_LOW[index]
-
-    return (crc_hi << 8 | crc_low) & 0xffff
+    return _update(CRC16_MODBUS_INIT, data)
 
 
 def crc16IBM(data):
@@ -124,15 +299,48 @@ def crc16IBM(data):
 
     return crc16;
     """
-    crc = 0x0
+    return _update(CRC16_IBM_INIT, data)
 
-    for byte in data:
-        for i in range(8):
-            if (crc ^ byte) & 0x1:
-                crc = (crc >> 1) ^ 0xA001
-            else:
-                crc = crc >> 1
 
-            byte = byte >> 1
+def crc16_batch(frames, init=CRC16_MODBUS_INIT):
+    """Calculate many frames crc16 at once
 
-    return crc
+    With numpy frames with same length are calculated simultaneously(one vector operation per byte column),
+    without numpy fallback to calculate frame by frame
+
+    :param frames: frames list(bytes-like object) or a 2D numpy uint8 array(one frame per row)
+    :param init: crc register initial value, CRC16_MODBUS_INIT or CRC16_IBM_INIT
+    :return: crc16 list, in the same order as frames
+    """
+    if numpy is None:
+        return [_update(init, frame) for frame in frames]
+
+    if isinstance(frames, numpy.ndarray):
+        if frames.ndim != 2 or frames.dtype != numpy.uint8:
+            raise TypeError("frames must be a 2D uint8 array")
+
+        groups = {frames.shape[1]: (list(range(frames.shape[0])), frames)}
+    else:
+        frames = [_as_byte_view(frame) for frame in frames]
+        if any(frame is None for frame in frames):
+            raise TypeError("frames must be bytes-like objects")
+
+        indexes = dict()
+        for index, frame in enumerate(frames):
+            indexes.setdefault(len(frame), list()).append(index)
+
+        groups = {length: (index_list, numpy.frombuffer(b''.join(frames[i] for i in index_list),
+                                                        dtype=numpy.uint8).reshape(len(index_list), length))
+                  for length, index_list in indexes.items()}
+
+    result = [0] * sum(len(index_list) for index_list, _ in groups.values())
+    table = numpy.array(_CRC_TABLE, dtype=numpy.uint16)
+    for index_list, data in groups.values():
+        registers = numpy.full(len(index_list), init & 0xffff, dtype=numpy.uint16)
+        for column in data.T:
+            registers = (registers >> 8) ^ table[(registers ^ column) & 0xff]
+
+        for index, crc in zip(index_list, registers.tolist()):
+            result[index] = crc
+
+    return result
@@ -1,14 +1,227 @@
 # -*- coding: utf-8 -*-
 import os
 import re
+import json
+import time
+import queue
+import shutil
 import ftplib
-__all__ = ['FTPClient', 'FTPClientError']
+import hashlib
+import calendar
+import threading
+import contextlib
+import collections
+import concurrent.futures
+from typing import *
+__all__ = ['FTPClient', 'FTPClientError', 'FTPTransferEngine', 'FTPTransferProgress']
 
 
 class FTPClientError(Exception):
     pass
 
 
+class FTPTransferProgress(object):
+    def __init__(self, callback: Callable[[int, int, float], None] or None = None):
+        """Single file transfer progress
+
+        :param callback: callback(transferred bytes, total bytes, bytes/s of this transfer)
+        """
+        self.__total = 0
+        self.__offset = 0
+        self.__received = 0
+        self.__callback = callback
+        self.__start = time.perf_counter()
+
+    @property
+    def rate(self) -> float:
+        elapsed = time.perf_counter() - self.__start
+        return self.__received / elapsed if elapsed else 0.0
+
+    @property
+    def transferred(self) -> int:
+        return self.__offset + self.__received
+
+    def start(self, offset: int, total: int or None):
+        """(Re)start transfer from offset, bytes before offset are not counted into rate"""
+        self.__received = 0
+        self.__offset = offset
+        self.__total = total or 0
+        self.__start = time.perf_counter()
+
+    def update(self, size: int):
+        self.__received += size
+        if hasattr(self.__callback, "__call__"):
+            self.__callback(self.transferred, self.__total, self.rate)
+
+    def wrap(self, func: Callable[[bytes], Any]) -> Callable[[bytes], None]:
+        def wrapper(data):
+            func(data)
+            self.update(len(data))
+
+        return wrapper
+
+
+class FTPTransferEngine(object):
+    def __init__(self, client, workers: int = 4, block_size: int = 8192,
+                 progress: Callable[[str, int, int], None] or None = None):
+        """Parallel transfer files over a pool of ftp sessions(FTPClient.create_new_connection)
+
+        :param client: FTPClient, create sessions
+        :param workers: maximum concurrent transfers, 1 means transfer in caller thread
+        :param block_size: transfer block size
+        :param progress: progress(current file, transferred bytes, total bytes), aggregated all files
+        """
+        self.__client = client
+        self.__progress = progress
+        self.__workers = max(workers, 1)
+        self.__block_size = block_size
+
+        self.__total = 0
+        self.__transferred = 0
+        self.__lock = threading.Lock()
+        self.__sessions = queue.LifoQueue()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def close(self):
+        while True:
+            try:
+                ftp = self.__sessions.get_nowait()
+            except queue.Empty:
+                break
+
+            with contextlib.suppress(*ftplib.all_errors):
+                ftp.quit()
+
+    @contextlib.contextmanager
+    def session(self) -> ftplib.FTP:
+        """Get an idle session or create a new one, session is closed if transfer failed
+
+        :return: ftp session
+        """
+        try:
+            ftp = self.__sessions.get_nowait()
+        except queue.Empty:
+            ftp = self.__client.create_new_connection()
+
+        try:
+            yield ftp
+        except BaseException:
+            ftp.close()
+            raise
+        else:
+            self.__sessions.put(ftp)
+
+    def download(self, tasks: Sequence[Tuple[str, str, int]], callback: Callable[[str], None] or None = None) -> dict:
+        """Download files
+
+        :param tasks: (remote path, local path, size) list
+        :param callback: called with remote path before download and local path after downloaded
+        :return: transfer report, see report
+        """
+        return self.__run(self.__download, tasks, callback)
+
+    def upload(self, tasks: Sequence[Tuple[str, str, int]], callback: Callable[[str], None] or None = None) -> dict:
+        """Upload files, remote directories should already exist
+
+        :param tasks: (local path, remote path, size) list
+        :param callback: called with local path before upload
+        :return: transfer report, see report
+        """
+        return self.__run(self.__upload, tasks, callback)
+
+    @staticmethod
+    def report(files: List[dict], elapsed: float) -> dict:
+        """Transfer report
+
+        :param files: each file report: path, size, elapsed and rate(bytes/s)
+        :param elapsed: total elapsed
+        :return: files, total bytes, elapsed and rate(bytes/s)
+        """
+        size = sum(x["size"] for x in files)
+        return dict(files=files, bytes=size, elapsed=elapsed, rate=size / elapsed if elapsed else 0.0)
+
+    def __run(self, transfer, tasks, callback):
+        with self.__lock:
+            self.__transferred = 0
+            self.__total = sum(x[2] or 0 for x in tasks)
+
+        start = time.perf_counter()
+        if self.__workers == 1 or len(tasks) <= 1:
+            files = [transfer(src, dst, callback) for src, dst, _ in tasks]
+            return self.report(files, time.perf_counter() - start)
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=min(self.__workers, len(tasks))) as pool:
+            futures = [pool.submit(transfer, src, dst, callback) for src, dst, _ in tasks]
+            done, pending = concurrent.futures.wait(futures, return_when=concurrent.futures.FIRST_EXCEPTION)
+            for future in pending:
+                future.cancel()
+
+        for future in futures:
+            if not future.cancelled() and future.exception() is not None:
+                raise future.exception()
+
+        return self.report([x.result() for x in futures], time.perf_counter() - start)
+
+    def __update(self, path, size):
+        with self.__lock:
+            self.__transferred += size
+            transferred, total = self.__transferred, self.__total
+
+        if hasattr(self.__progress, "__call__"):
+            self.__progress(path, transferred, total)
+
+    def __download(self, remote_path, local_path, callback):
+        def write(data):
+            fp.write(data)
+            self.__update(remote_path, len(data))
+
+        if hasattr(callback, "__call__"):
+            callback(remote_path)
+
+        start = time.perf_counter()
+
+        try:
+            with self.session() as ftp, open(local_path, "wb") as fp:
+                ftp.retrbinary("RETR " + remote_path, write, self.__block_size)
+        except ftplib.all_errors as e:
+            raise FTPClientError("Download file:{} error:{}".format(remote_path, e))
+
+        if self.__client.verbose:
+            print("Downloading:{}".format(remote_path))
+
+        if hasattr(callback, "__call__"):
+            callback(local_path)
+
+        return self.__file_report(remote_path, os.path.getsize(local_path), time.perf_counter() - start)
+
+    def __upload(self, local_path, remote_path, callback):
+        if hasattr(callback, "__call__"):
+            callback(local_path)
+
+        start = time.perf_counter()
+
+        try:
+            with self.session() as ftp, open(local_path, "rb") as fp:
+                ftp.storbinary("STOR " + remote_path, fp, self.__block_size,
+                               lambda data: self.__update(local_path, len(data)))
+        except ftplib.all_errors as e:
+            raise FTPClientError("Upload file:{} error:{}".format(local_path, e))
+
+        if self.__client.verbose:
+            print("Uploading:{}".format(os.path.abspath(local_path)))
+
+        return self.__file_report(local_path, os.path.getsize(local_path), time.perf_counter() - start)
+
+    @staticmethod
+    def __file_report(path, size, elapsed):
+        return dict(path=path, size=size, elapsed=elapsed, rate=size / elapsed if elapsed else 0.0)
+
+
 class FTPClient(object):
     ROOT = "/"
     EXTx_FS_RECOVERY_DIR = "lost+found"
@@ -178,62 +391,131 @@ class FTPClient(object):
         
         return lst
         
-    def download_dir(self, remote_dir, local_dir, exclude=None, callback=None):
+    @staticmethod
+    def get_exclude_checker(exclude: Sequence[str] or None) -> Callable[[str], bool]:
+        """Get a function check if file name is excluded
+
+        :param exclude: exclude file name list, support file extensions such as *.bmp
+        :return: checker(file name) return true if file is excluded
+        """
+        exclude = exclude if isinstance(exclude, (list, tuple)) else list()
+        extensions = [x[2:] for x in [name for name in exclude if re.search("\\*.(.*?)", name, re.S)]]
+        return lambda name: name in exclude or name.split(".")[-1] in extensions
+
+    def get_file_tree(self, remote_dir: str, exclude: Sequence[str] or None = None) -> \
+            Tuple[List[str], collections.OrderedDict]:
+        """Recursive list remote directory, one listing per directory(MLSD, fallback to NLST if server not support)
+
+        :param remote_dir: remote directory path
+        :param exclude: exclude list, see get_exclude_checker
+        :return: relative directories, relative file path => facts dict(size, modify)
+        """
+        dirs, files = list(), collections.OrderedDict()
+        is_excluded = self.get_exclude_checker(exclude)
+        remote_dir = remote_dir if remote_dir.startswith(self.ROOT) else self.relative_join(remote_dir)
+
+        def mlsd(ftp, relative):
+            for name, facts in ftp.mlsd(self.join(remote_dir, relative), facts=["type", "size", "modify"]):
+                if facts.get("type") in ("cdir", "pdir") or name in (".", "..") or is_excluded(name):
+                    continue
+
+                path = self.join(relative, name) if relative else name
+                if facts.get("type") == "dir":
+                    dirs.append(path)
+                    mlsd(ftp, path)
+                else:
+                    files[path] = dict(size=int(facts["size"]) if "size" in facts else None,
+                                       modify=facts.get("modify"))
+
+        def nlst(ftp, relative):
+            ftp.cwd(self.join(remote_dir, relative))
+            names = ftp.nlst(".")
+
+            # NLST switch to ASCII mode, SIZE require binary mode
+            ftp.voidcmd("TYPE I")
+            for name in names:
+                if name in (".", "..") or is_excluded(name):
+                    continue
+
+                path = self.join(relative, name) if relative else name
+                try:
+                    ftp.cwd(self.join(remote_dir, path))
+                except ftplib.error_perm:
+                    try:
+                        size = ftp.size(self.join(remote_dir, path))
+                    except ftplib.all_errors:
+                        size = None
+
+                    files[path] = dict(size=size, modify=None)
+                else:
+                    dirs.append(path)
+                    nlst(ftp, path)
+
+        ftp = self.create_new_connection()
+
+        try:
+            try:
+                mlsd(ftp, "")
+            except ftplib.error_perm as e:
+                # Server do not support MLSD
+                if not str(e).startswith("50"):
+                    raise
+
+                dirs.clear()
+                files.clear()
+                nlst(ftp, "")
+        except ftplib.all_errors as e:
+            raise FTPClientError("Get dir:{} file tree error:{}".format(remote_dir, e))
+        finally:
+            ftp.close()
+
+        return dirs, files
+
+    def download_dir(self, remote_dir, local_dir, exclude=None, callback=None, workers=1, progress=None):
         """Recursive download remote directory data to local dir without remote dir name equal cp remoteDir/* localDir/
 
         :param remote_dir: remote directory path
         :param local_dir: local directory path
         :param exclude: exclude list file in exclude list do not download, support file extensions such as *.bmp
         :param callback: callback before download file
+        :param workers: concurrent download sessions, callback and progress called from worker threads if > 1
+        :param progress: progress(current file, transferred bytes, total bytes)
+        :return: transfer report, see FTPTransferEngine.report
         """
-
-        pwd = ""
-        exclude = exclude if isinstance(exclude, (list, tuple)) else list()
-        extensions = [x[2:] for x in [name for name in exclude if re.search("\*.(.*?)", name, re.S)]]
-               
         try:
-            # If local dir is not exist create it
-            if not os.path.isdir(local_dir):
-                os.makedirs(local_dir)
-        
-            # Enter remote dir
-            pwd = self.ftp.pwd()
-            self.ftp.cwd(remote_dir)
-        
-            # Recursive download all files
-            for file_name in self.ftp.nlst("."):
-                extension_name = file_name.split(".")[-1]
+            dirs, files = self.get_file_tree(remote_dir, exclude)
+        except FTPClientError as e:
+            raise FTPClientError("Download error remote dir:{} is not exist:{}".format(remote_dir, e))
 
-                # Ignored
-                if file_name in exclude or extension_name in extensions:
-                    continue
-                
-                # file is a directory recursive call self download all
-                if self.is_dir(file_name):
-                    self.download_dir(file_name, os.path.join(local_dir, file_name), exclude, callback)
-                # Normal file call download file
-                else:
-                    remote_file = self.join(self.ftp.pwd(), file_name)
-                    if callback and hasattr(callback, "__call__"):
-                        callback(remote_file)
-                    self.download_file(remote_file, local_dir)
-                    if callback and hasattr(callback, "__call__"):
-                        callback(os.path.join(local_dir, file_name))
+        remote_dir = remote_dir if remote_dir.startswith(self.ROOT) else self.relative_join(remote_dir)
 
-        except ftplib.error_perm as e:
-            raise FTPClientError("Download error remote dir:{} is not exist:{}".format(remote_dir, e))
+        try:
+            # If local dir is not exist create it
+            for path in [""] + dirs:
+                os.makedirs(os.path.join(local_dir, *path.split("/")), exist_ok=True)
         except OSError as e:
             raise FTPClientError("Download error create local dir:{} error:{}".format(local_dir, e))
-        finally:
-            if len(pwd):
-                self.ftp.cwd(pwd)
-                      
-    def download_file(self, remote_path, local_path, local_name=''):
+
+        tasks = [(self.join(remote_dir, path), os.path.join(local_dir, *path.split("/")), facts.get("size"))
+                 for path, facts in files.items()]
+
+        with FTPTransferEngine(self, workers, progress=progress) as engine:
+            return engine.download(tasks, callback)
+
+    def download_file(self, remote_path, local_path, local_name='', resume=False, retry=0, block_size=8192,
+                      buffer_size=1024 * 1024, md5="", progress=None):
         """Download a file to local directory save as local_name
 
         :param remote_path: FTP Server file path
         :param local_path: download file path
         :param local_name: local save as file name
+        :param resume: if local file is a partial of remote file, continue download from it's end(REST)
+        :param retry: reconnect and resume times when transfer failed(connection dropped)
+        :param block_size: transfer block size
+        :param buffer_size: local file write buffer size
+        :param md5: expected file md5, if set verify downloaded file
+        :param progress: progress(transferred bytes, total bytes, bytes/s)
+        :return: local file path
         """
 
         try:
@@ -244,114 +526,469 @@ class FTPClient(object):
         
             if not os.path.isdir(local_path):
                 os.makedirs(local_path)
-        
-            # Check download path
-            if local_path[-1] != os.sep:
-                local_path += os.sep
-            
-            # Create a ftp client object
-            ftp = self.create_new_connection()
-            
-            # Download file
-            file_name = os.path.basename(local_name if local_name else remote_path)
-            with open(os.path.join(local_path, file_name), 'wb') as fp:
-                ftp.retrbinary('RETR ' + remote_path, fp.write)
-
-            if self.verbose:
-                print("Downloading:{}".format(remote_path))
-        except ftplib.all_errors as e:
-            raise FTPClientError("Download file:{} error:{}".format(remote_path, e))
-        except AttributeError as e:
+        except OSError as e:
             raise FTPClientError("Download file:{} error:{}".format(remote_path, e))
 
-    def upload_dir(self, local_dir, remote_dir, exclude=None, callback=None):
+        file_name = os.path.basename(local_name if local_name else remote_path)
+        local_file = os.path.join(local_path, file_name)
+        progress = FTPTransferProgress(progress)
+
+        # Retry only resume the partial file written by this call, never an unrelated existing file
+        attempt, rest_supported, written = 0, True, False
+
+        while True:
+            ftp = None
+            offset = 0
+
+            try:
+                # Create a ftp client object
+                ftp = self.create_new_connection()
+                total = self.get_file_size(remote_path, ftp)
+
+                # Partial file detection
+                if (resume or written) and rest_supported and os.path.isfile(local_file):
+                    offset = os.path.getsize(local_file)
+                    offset = 0 if total is None or offset > total else offset
+
+                progress.start(offset, total)
+                if not offset or offset != total:
+                    with open(local_file, 'ab' if offset else 'wb', buffering=buffer_size) as fp:
+                        written = True
+                        ftp.retrbinary('RETR ' + remote_path, progress.wrap(fp.write), block_size, offset or None)
+
+                break
+            except ftplib.error_perm as e:
+                # Server do not support REST, restart from zero
+                if offset and str(e).startswith("50"):
+                    rest_supported = False
+                    continue
+
+                raise FTPClientError("Download file:{} error:{}".format(remote_path, e))
+            except AttributeError as e:
+                raise FTPClientError("Download file:{} error:{}".format(remote_path, e))
+            except ftplib.all_errors as e:
+                attempt += 1
+                if attempt > retry:
+                    raise FTPClientError("Download file:{} error:{}".format(remote_path, e))
+            finally:
+                if ftp is not None:
+                    ftp.close()
+
+        if total is not None and os.path.getsize(local_file) != total:
+            raise FTPClientError("Download file:{} error: size mismatch {} != {}".format(
+                remote_path, os.path.getsize(local_file), total))
+
+        if md5 and self.get_local_file_md5(local_file) != md5.lower():
+            raise FTPClientError("Download file:{} error: md5 check failed".format(remote_path))
+
+        if self.verbose:
+            print("Downloading:{}".format(remote_path))
+
+        return local_file
+
+    @staticmethod
+    def get_file_size(remote_path: str, ftp: ftplib.FTP) -> int or None:
+        """Get remote file size(SIZE), ftp will switch to binary mode
+
+        :param remote_path: remote file path
+        :param ftp: ftp session
+        :return: file size, None means server do not support SIZE or file is not exist
+        """
+        ftp.voidcmd("TYPE I")
+
+        try:
+            return ftp.size(remote_path)
+        except ftplib.error_perm:
+            return None
+
+    def upload_dir(self, local_dir, remote_dir, exclude=None, callback=None, workers=1, progress=None):
         """Recursive upload local dir to remote, if remote dir is not exist create it, else replace all files
 
         :param local_dir: Local path, will upload
         :param remote_dir: FTP Server remote path, receive upload data
         :param exclude: exclude list file in exclude list do not upload, support file extensions such as *.bmp
         :param callback: callback before upload file
+        :param workers: concurrent upload sessions, callback and progress called from worker threads if > 1
+        :param progress: progress(current file, transferred bytes, total bytes)
+        :return: transfer report, see FTPTransferEngine.report
         """
+        # Check local dir
+        if not os.path.isdir(local_dir):
+            raise FTPClientError("Upload dir error local dir:{} is not exist".format(local_dir))
 
-        pwd = ""
-        exclude = exclude if isinstance(exclude, (list, tuple)) else list()
-        extensions = [x[2:] for x in [name for name in exclude if re.search("\*.(.*?)", name, re.S)]]
-        
+        # Check remote dir
+        if self.is_file(remote_dir):
+            raise FTPClientError("Upload dir error remote dir:{} is not a directory".format(remote_dir))
+
+        dirs, files = self.get_local_file_tree(local_dir, exclude)
+        remote_dir = remote_dir if remote_dir.startswith(self.ROOT) else self.relative_join(remote_dir)
+        tasks = [(os.path.join(local_dir, *path.split("/")), self.join(remote_dir, path), stat.st_size)
+                 for path, stat in files.items()]
+
+        self.__create_remote_dirs(local_dir, remote_dir, dirs)
+        with FTPTransferEngine(self, workers, progress=progress) as engine:
+            return engine.upload(tasks, callback)
+
+    def __create_remote_dirs(self, local_dir, remote_dir, dirs):
         try:
-            
-            # Check local dir
-            if not os.path.isdir(local_dir):
-                raise FTPClientError("Upload dir error local dir:{} is not exist".format(local_dir))
-                 
-            # Check remote dir
-            if self.is_file(remote_dir):
-                raise FTPClientError("Upload dir error remote dir:{} is not a directory".format(remote_dir))
-        
-            # Enter local dir
-            pwd = os.getcwd()
-            os.chdir(local_dir)
-                
-            # Recursive upload local file
-            for file_name in os.listdir('.'):
-                extension_name = file_name.split(".")[-1]
+            # Create remote directories parent first, ignore already exist
+            if not self.create_dirs(remote_dir):
+                raise FTPClientError("Upload error, remote path:{} is not a directory".format(remote_dir))
 
-                if file_name in exclude or extension_name in extensions:
-                    continue
-                                
-                # Is a directory, recursive call self upload all
-                if os.path.isdir(os.path.abspath(file_name)):
-                    self.upload_dir(file_name, self.join(remote_dir, file_name), exclude, callback)
-                else:
-                    if callback and hasattr(callback, "__call__"):
-                        callback(os.path.join(pwd, local_dir, file_name))
-                    # Upload to remote dir same directory
-                    self.upload_file(file_name, remote_dir)
+            for path in dirs:
+                path = self.join(remote_dir, path)
+                try:
+                    self.ftp.mkd(path)
+                except ftplib.error_perm:
+                    if not self.is_dir(path):
+                        raise
+        except ftplib.all_errors as e:
+            raise FTPClientError("Uploading:{} error:{}".format(local_dir, e))
 
-        except (IOError, ftplib.error_perm) as e:
-            raise FTPClientError("Uploading:{} error:{}".format(os.getcwd(), e))
-        finally:
-            if len(pwd):
-                os.chdir(pwd)
+    def get_local_file_tree(self, local_dir: str, exclude: Sequence[str] or None = None) -> \
+            Tuple[List[str], collections.OrderedDict]:
+        """Recursive list local directory
+
+        :param local_dir: local directory path
+        :param exclude: exclude list, see get_exclude_checker
+        :return: relative directories, relative file path("/" separated) => os.stat_result
+        """
+        dirs, files = list(), collections.OrderedDict()
+        is_excluded = self.get_exclude_checker(exclude)
+
+        for root, dir_names, file_names in os.walk(local_dir):
+            relative = os.path.relpath(root, local_dir).replace("\\", "/")
+            relative = "" if relative == "." else relative
+            dir_names[:] = sorted(x for x in dir_names if not is_excluded(x))
+            dirs.extend(self.join(relative, x) if relative else x for x in dir_names)
+
+            for file_name in sorted(file_names):
+                if not is_excluded(file_name):
+                    files[self.join(relative, file_name) if relative else file_name] = \
+                        os.stat(os.path.join(root, file_name))
+
+        return dirs, files
+
+    @staticmethod
+    def get_local_file_md5(path: str, block_size: int = 1024 * 1024) -> str:
+        md5 = hashlib.md5()
+        with open(path, "rb") as fp:
+            for data in iter(lambda: fp.read(block_size), b""):
+                md5.update(data)
+
+        return md5.hexdigest()
+
+    @staticmethod
+    def load_sync_manifest(manifest: str or None) -> dict:
+        try:
+            with open(manifest, "r") as fp:
+                return json.load(fp)
+        except (TypeError, OSError, ValueError):
+            return dict()
+
+    @staticmethod
+    def save_sync_manifest(manifest: str, data: dict):
+        try:
+            with open(manifest + ".tmp", "w") as fp:
+                json.dump(data, fp, indent=1, sort_keys=True)
+            os.replace(manifest + ".tmp", manifest)
+        except OSError as e:
+            raise FTPClientError("Save sync manifest:{} error:{}".format(manifest, e))
+
+    def __get_manifest_md5(self, entry: dict or None, path: str, stat: os.stat_result) -> str:
+        # Local file is not changed since last sync, use recorded md5
+        if entry and entry.get("size") == stat.st_size and entry.get("mtime_ns") == stat.st_mtime_ns:
+            return entry.get("md5")
+
+        return self.get_local_file_md5(path)
+
+    @staticmethod
+    def __get_modify_time(modify: str or None) -> float or None:
+        # MLSD/MDTM modify fact: YYYYMMDDHHMMSS[.sss] in UTC
+        try:
+            return calendar.timegm(time.strptime(modify[:14], "%Y%m%d%H%M%S"))
+        except (TypeError, ValueError):
+            return None
+
+    def sync_upload(self, local_dir, remote_dir, exclude=None, delete=False, dry_run=False, manifest=None,
+                    workers=1, callback=None, progress=None) -> dict:
+        """Incremental upload local dir to remote, only upload changed files
+
+        Without manifest a file is changed if remote is not exist, size is different or local file is newer
+        With manifest(local json file, updated after sync) a file is also changed if content md5 is different
+        with last sync, local md5 is only calculated when file size or modify time is changed
+
+        :param local_dir: Local path, will upload
+        :param remote_dir: FTP Server remote path, receive upload data
+        :param exclude: exclude list, see get_exclude_checker
+        :param delete: delete remote files(and directories) not exist in local dir
+        :param dry_run: only report what will be done
+        :param manifest: content hash manifest file path
+        :param workers: concurrent upload sessions
+        :param callback: callback before upload or delete file
+        :param progress: progress(current file, transferred bytes, total bytes)
+        :return: sync report dict: transfer, delete, skip(relative paths), report(transfer report or None)
+        """
+        if not os.path.isdir(local_dir):
+            raise FTPClientError("Sync error local dir:{} is not exist".format(local_dir))
+
+        remote_dir = remote_dir if remote_dir.startswith(self.ROOT) else self.relative_join(remote_dir)
+        local_dirs, local_files = self.get_local_file_tree(local_dir, exclude)
+
+        try:
+            remote_dirs, remote_files = self.get_file_tree(remote_dir, exclude)
+        except FTPClientError:
+            remote_dirs, remote_files = list(), collections.OrderedDict()
+
+        records = self.load_sync_manifest(manifest)
+        transfer, skip, hashes = list(), list(), dict()
+
+        for path, stat in local_files.items():
+            facts = remote_files.get(path)
+            local_path = os.path.join(local_dir, *path.split("/"))
+
+            if facts is None or facts.get("size") != stat.st_size:
+                changed = True
+            elif manifest:
+                hashes[path] = self.__get_manifest_md5(records.get(path), local_path, stat)
+                changed = records.get(path, dict()).get("md5") != hashes[path] or \
+                    records.get(path, dict()).get("remote") != facts
+            else:
+                modify = self.__get_modify_time(facts.get("modify"))
+                changed = modify is None or int(stat.st_mtime) > modify
+
+            (transfer if changed else skip).append(path)
+
+        delete = self.__get_stale(remote_dirs, remote_files, local_dirs, local_files) if delete else list()
+        result = dict(transfer=transfer, delete=delete, skip=skip, report=None)
+        if dry_run:
+            return result
+
+        if delete:
+            self.__remove_remote(remote_dir, delete, callback)
+
+        self.__create_remote_dirs(local_dir, remote_dir, local_dirs)
+        tasks = [(os.path.join(local_dir, *path.split("/")), self.join(remote_dir, path), local_files[path].st_size)
+                 for path in transfer]
+
+        with FTPTransferEngine(self, workers, progress=progress) as engine:
+            result["report"] = engine.upload(tasks, callback)
 
-    def upload_file(self, local_path, remote_path, remote_name=""):
+        if manifest:
+            # Record remote facts after upload, next sync could detect remote changes
+            _, remote_files = self.get_file_tree(remote_dir, exclude)
+            records = dict()
+            for path, stat in local_files.items():
+                local_path = os.path.join(local_dir, *path.split("/"))
+                records[path] = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, remote=remote_files.get(path),
+                                     md5=hashes.get(path) or self.get_local_file_md5(local_path))
+
+            self.save_sync_manifest(manifest, records)
+
+        return result
+
+    def sync_download(self, remote_dir, local_dir, exclude=None, delete=False, dry_run=False, manifest=None,
+                      workers=1, callback=None, progress=None) -> dict:
+        """Incremental download remote dir to local, only download changed files
+
+        Without manifest a file is changed if local is not exist, size is different or remote file is newer,
+        downloaded file modify time is set to remote modify time
+        With manifest(local json file, updated after sync) a file is also changed if remote facts or local content
+        md5 is different with last sync
+
+        :param remote_dir: remote directory path
+        :param local_dir: local directory path
+        :param exclude: exclude list, see get_exclude_checker
+        :param delete: delete local files(and directories) not exist in remote dir
+        :param dry_run: only report what will be done
+        :param manifest: content hash manifest file path
+        :param workers: concurrent download sessions
+        :param callback: callback before download or delete file
+        :param progress: progress(current file, transferred bytes, total bytes)
+        :return: sync report dict: transfer, delete, skip(relative paths), report(transfer report or None)
+        """
+        remote_dir = remote_dir if remote_dir.startswith(self.ROOT) else self.relative_join(remote_dir)
+        remote_dirs, remote_files = self.get_file_tree(remote_dir, exclude)
+        local_dirs, local_files = self.get_local_file_tree(local_dir, exclude) if os.path.isdir(local_dir) else \
+            (list(), collections.OrderedDict())
+
+        records = self.load_sync_manifest(manifest)
+        transfer, skip, hashes = list(), list(), dict()
+
+        for path, facts in remote_files.items():
+            stat = local_files.get(path)
+            local_path = os.path.join(local_dir, *path.split("/"))
+
+            if stat is None or facts.get("size") != stat.st_size:
+                changed = True
+            elif manifest:
+                hashes[path] = self.__get_manifest_md5(records.get(path), local_path, stat)
+                changed = records.get(path, dict()).get("md5") != hashes[path] or \
+                    records.get(path, dict()).get("remote") != facts
+            else:
+                modify = self.__get_modify_time(facts.get("modify"))
+                changed = modify is None or modify > int(stat.st_mtime)
+
+            (transfer if changed else skip).append(path)
+
+        delete = self.__get_stale(local_dirs, local_files, remote_dirs, remote_files) if delete else list()
+        result = dict(transfer=transfer, delete=delete, skip=skip, report=None)
+        if dry_run:
+            return result
+
+        try:
+            for path in delete:
+                local_path = os.path.join(local_dir, *path.split("/"))
+                if hasattr(callback, "__call__"):
+                    callback(local_path)
+
+                shutil.rmtree(local_path) if os.path.isdir(local_path) else os.remove(local_path)
+
+            for path in [""] + remote_dirs:
+                os.makedirs(os.path.join(local_dir, *path.split("/")), exist_ok=True)
+        except OSError as e:
+            raise FTPClientError("Sync error update local dir:{} error:{}".format(local_dir, e))
+
+        tasks = [(self.join(remote_dir, path), os.path.join(local_dir, *path.split("/")),
+                  remote_files[path].get("size")) for path in transfer]
+
+        with FTPTransferEngine(self, workers, progress=progress) as engine:
+            result["report"] = engine.download(tasks, callback)
+
+        for path in transfer:
+            modify = self.__get_modify_time(remote_files[path].get("modify"))
+            if modify is not None:
+                os.utime(os.path.join(local_dir, *path.split("/")), (modify, modify))
+
+        if manifest:
+            records = dict()
+            for path, facts in remote_files.items():
+                local_path = os.path.join(local_dir, *path.split("/"))
+                stat = os.stat(local_path)
+                records[path] = dict(size=stat.st_size, mtime_ns=stat.st_mtime_ns, remote=facts,
+                                     md5=hashes.get(path) or self.get_local_file_md5(local_path))
+
+            self.save_sync_manifest(manifest, records)
+
+        return result
+
+    @staticmethod
+    def __get_stale(dirs, files, source_dirs, source_files) -> List[str]:
+        """Get top most directories and files in dirs/files but not in source, source is sync from"""
+        stale = list()
+        for path in sorted(set(dirs) - set(source_dirs)):
+            if not any(path.startswith(x + "/") for x in stale):
+                stale.append(path)
+
+        stale.extend(path for path in files if path not in source_files and
+                     not any(path.startswith(x + "/") for x in stale))
+        return stale
+
+    def __remove_remote(self, remote_dir, paths, callback):
+        groups = collections.OrderedDict()
+        for path in paths:
+            groups.setdefault(self.join(remote_dir, self.dirname(path)), list()).append(os.path.basename(path))
+
+        for directory, names in groups.items():
+            self.remove_files(directory.rstrip("/") or self.ROOT, names, callback)
+
+    def upload_file(self, local_path, remote_path, remote_name="", resume=False, retry=0, block_size=8192,
+                    verify=False, progress=None):
         """Upload local_path specified file to remote path
 
         :param local_path: Local file path
         :param remote_path: Remote path
         :param remote_name: If is not empty will rename to this name
+        :param resume: if remote file is a partial of local file, continue upload from it's end(REST)
+        :param retry: reconnect and resume times when transfer failed(connection dropped)
+        :param block_size: transfer block size
+        :param verify: verify remote file size and md5(if server support XMD5) after upload
+        :param progress: progress(transferred bytes, total bytes, bytes/s)
+        :return: remote file path
         """
 
-        pwd = ""
-        
-        try:
-            
-            # Local path check
-            if not os.path.isfile(local_path):
-                raise FTPClientError("Upload error, local file:{} doesn't exist".format(local_path))
+        # Local path check
+        if not os.path.isfile(local_path):
+            raise FTPClientError("Upload error, local file:{} doesn't exist".format(local_path))
 
+        try:
             # Remote path check, if remote path isn't a dir create it
             if not self.is_dir(remote_path) and not self.create_dirs(remote_path):
                 raise FTPClientError("Upload error, remote path:{} is not a directory".format(remote_path))
-            
-            # Enter remote path
-            pwd = self.ftp.pwd()
-            self.ftp.cwd(remote_path)
-            
-            # Upload file to remote
-            if len(remote_name):
-                self.ftp.storbinary('STOR ' + os.path.basename(remote_name), open(local_path, 'rb'))
-            else:
-                self.ftp.storbinary('STOR ' + os.path.basename(local_path), open(local_path, 'rb'))
-            
-            if self.verbose:
-                print("Uploading:{}".format(os.path.abspath(local_path)))
-                
+
+            remote_path = remote_path if remote_path.startswith(self.ROOT) else self.relative_join(remote_path)
         except ftplib.all_errors as e:
             raise FTPClientError("Upload file:{} error:{}".format(os.path.basename(local_path), e))
-        finally:
-            if len(pwd):
-                self.ftp.cwd(pwd)
-             
+
+        total = os.path.getsize(local_path)
+        progress = FTPTransferProgress(progress)
+        remote_file = self.join(remote_path, os.path.basename(remote_name if remote_name else local_path))
+
+        # Retry only resume the partial remote file written by this call, never an unrelated existing file
+        attempt, rest_supported, written = 0, True, False
+
+        def block_sent(data):
+            nonlocal written
+            written = True
+
+        while True:
+            ftp = None
+            offset = 0
+
+            try:
+                ftp = self.create_new_connection()
+
+                # Partial file detection
+                if (resume or written) and rest_supported:
+                    offset = self.get_file_size(remote_file, ftp) or 0
+                    offset = 0 if offset > total else offset
+
+                progress.start(offset, total)
+                if not offset or offset != total:
+                    with open(local_path, 'rb') as fp:
+                        fp.seek(offset)
+                        ftp.storbinary('STOR ' + remote_file, fp, block_size,
+                                       progress.wrap(block_sent), offset or None)
+
+                if verify:
+                    self.__verify_upload(ftp, local_path, remote_file, total)
+
+                break
+            except ftplib.error_perm as e:
+                # Server do not support REST, restart from zero
+                if offset and str(e).startswith("50"):
+                    rest_supported = False
+                    continue
+
+                raise FTPClientError("Upload file:{} error:{}".format(os.path.basename(local_path), e))
+            except ftplib.all_errors as e:
+                attempt += 1
+                if attempt > retry:
+                    raise FTPClientError("Upload file:{} error:{}".format(os.path.basename(local_path), e))
+            finally:
+                if ftp is not None:
+                    ftp.close()
+
+        if self.verbose:
+            print("Uploading:{}".format(os.path.abspath(local_path)))
+
+        return remote_file
+
+    def __verify_upload(self, ftp, local_path, remote_file, total):
+        size = self.get_file_size(remote_file, ftp)
+        if size is not None and size != total:
+            raise FTPClientError("Upload file:{} error: size mismatch {} != {}".format(
+                os.path.basename(local_path), size, total))
+
+        try:
+            remote_md5 = ftp.sendcmd("XMD5 " + remote_file).split()[-1].lower()
+        except ftplib.error_perm:
+            # Server do not support XMD5
+            return
+
+        if remote_md5 != self.get_local_file_md5(local_path):
+            raise FTPClientError("Upload file:{} error: md5 check failed".format(os.path.basename(local_path)))
+
     def remove_files(self, remote_dir, remove_files, callback=None):
         """Remove files form remote dir
 
@@ -1,9 +1,19 @@
 # -*- coding: utf-8 -*-
+import io
+import abc
 import time
 import glob
+import queue
 import ctypes
+import random
+import select
 import serial
+import struct
 import platform
+import threading
+import contextlib
+import collections
+import concurrent.futures
 from typing import *
 from threading import Thread
 import serial.tools.list_ports
@@ -14,7 +24,8 @@ from .crc16 import crc16
 from ..core.datatype import BasicTypeLE, ip4_check
 
 
-__all__ = ['SerialPort',
+__all__ = ['SerialPort', 'SerialPortDiscovery', 'SerialPortReader', 'SerialRingBuffer',
+           'SerialFrameParser', 'DelimiterFrameParser', 'LengthPrefixedFrameParser', 'MessageFrameParser',
            'ReadAckMsg', 'ReadReqMsg',
            'SerialPortProtocolSimulate',
            'SerialTransferProtocol', 'SerialTransferError', 'SerialTransferProtocolReadSimulate']
@@ -48,6 +59,24 @@ class BasicMsg(BasicTypeLE):
     def calc_crc(self):
         return crc16(self.cdata()[1:ctypes.sizeof(self) - 2])
 
+    @classmethod
+    def from_frame(cls, frame):
+        """Map a message onto a received frame without copy and check it
+
+        Message shares memory with frame, it is only valid until frame buffer is reused
+
+        :param frame: writable buffer(bytearray or memoryview of bytearray)
+        :return: result and message or error
+        """
+        if len(frame) != ctypes.sizeof(cls):
+            return False, ErrorCode.get_desc(ErrorCode.E_LEN)
+
+        # Crc check
+        if crc16(memoryview(frame)[1:]):
+            return False, ErrorCode.get_desc(ErrorCode.E_CRC)
+
+        return True, cls.from_buffer(frame)
+
     def calc_len(self):
         return ctypes.sizeof(self) - 1
 
@@ -78,6 +107,9 @@ class ReadReqMsg(BasicMsg):
     # Read done request
     DATA_DONE = 0xe
 
+    # Negotiate windowed transfer request, args is the requested payload size
+    NEGOTIATE_REQ = 0xf
+
     _fields_ = [
         ('len',     ctypes.c_ubyte),
         ('req',     ctypes.c_ubyte),
@@ -101,11 +133,17 @@ class ReadReqMsg(BasicMsg):
     def is_done_request(self):
         return self.req == self.DATA_DONE
 
+    def is_negotiate_request(self):
+        return self.req == self.NEGOTIATE_REQ
+
 
 class ReadAckMsg(BasicMsg):
     # Message payload size
     PAYLOAD_SIZE = 128
 
+    # Maximum payload size, message length(len field is a byte) should not exceed 255
+    MAX_PAYLOAD_SIZE = 248
+
     _fields_ = [
         ('len',     ctypes.c_ubyte),
         ('ack',     ctypes.c_ubyte),
@@ -114,13 +152,15 @@ class ReadAckMsg(BasicMsg):
         ('crc16',   ctypes.c_ushort),
     ]
 
+    _types = dict()
+
     @property
     def args(self):
         return self.args
 
-    @staticmethod
-    def create(ack, args, payload):
-        instance = ReadAckMsg()
+    @classmethod
+    def create(cls, ack, args, payload):
+        instance = cls()
         instance.ack = ack
         instance.args = args
         instance.len = instance.calc_len()
@@ -128,6 +168,38 @@ class ReadAckMsg(BasicMsg):
         instance.crc16 = instance.calc_crc()
         return instance
 
+    @staticmethod
+    def get_type(payload_size=PAYLOAD_SIZE):
+        """Get read ack message type with specified payload size(negotiated by windowed transfer)
+
+        :param payload_size: payload size, 1 - MAX_PAYLOAD_SIZE
+        :return: ReadAckMsg or a ReadAckMsg like type
+        """
+        if payload_size == ReadAckMsg.PAYLOAD_SIZE:
+            return ReadAckMsg
+
+        if not 0 < payload_size <= ReadAckMsg.MAX_PAYLOAD_SIZE:
+            raise ValueError("payload size must be 1 - {}".format(ReadAckMsg.MAX_PAYLOAD_SIZE))
+
+        try:
+            return ReadAckMsg._types[payload_size]
+        except KeyError:
+            ack_type = type("ReadAckMsg{}".format(payload_size), (BasicMsg,), {
+                "PAYLOAD_SIZE": payload_size,
+                "_fields_": [
+                    ('len',     ctypes.c_ubyte),
+                    ('ack',     ctypes.c_ubyte),
+                    ('args',    ctypes.c_ushort),
+                    ('payload', ctypes.c_ubyte * payload_size),
+                    ('crc16',   ctypes.c_ushort),
+                ],
+                "create": classmethod(ReadAckMsg.create.__func__),
+                "get_data_payload": ReadAckMsg.get_data_payload,
+                "set_data_payload": ReadAckMsg.set_data_payload,
+            })
+            ReadAckMsg._types[payload_size] = ack_type
+            return ack_type
+
     # Get payload data
     def get_data_payload(self):
         return ctypes.string_at(ctypes.addressof(self.payload), ctypes.sizeof(self.payload))
@@ -192,11 +264,26 @@ class SerialTransferError(Exception):
 class SerialTransferProtocol(object):
     PAYLOAD_SIZE = 128
 
-    def __init__(self, send, recv):
+    # Windowed transfer maximum retransmit times of a package
+    MAX_RETRANSMIT = 3
+
+    def __init__(self, send, recv, window=1, payload_size=PAYLOAD_SIZE, recv_into=None):
         """"Init a serial port transfer protocol object
 
+        When window > 1 or payload_size is not PAYLOAD_SIZE, recv will negotiate a windowed transfer first:
+        several DATA_REQ are sent without waiting ack, acks may arrive out of order, and a package is
+        re-requested when its ack is lost or crc check failed. If the peer do not support negotiation,
+        fallback to stop-and-wait transfer
+
+        Negotiate ack also carries the real data length, so a partial last package is trimmed. A stop-and-wait
+        transfer only knows package size, the last package is zero padded to PAYLOAD_SIZE
+
         :param send: serial port send function
         :param recv: serial port receive function
+        :param window: maximum read requests in flight
+        :param payload_size: requested read ack payload size, 1 - ReadAckMsg.MAX_PAYLOAD_SIZE
+        :param recv_into: serial port receive into buffer function recv_into(buffer) -> size, e.g. SerialPort.read_into
+        if provided, ack frames are received directly into a reusable frame buffer
         :return:
         """
         if not hasattr(send, "__call__"):
@@ -205,19 +292,45 @@ class SerialTransferProtocol(object):
         if not hasattr(recv, "__call__"):
             raise AttributeError("{} recv function is not callable".format(self.__class__.__name__))
 
-        self.__send, self.__recv = send, recv
+        if not isinstance(window, int) or window <= 0:
+            raise ValueError("window must be a positive integer")
+
+        if not 0 < payload_size <= ReadAckMsg.MAX_PAYLOAD_SIZE:
+            raise ValueError("payload size must be 1 - {}".format(ReadAckMsg.MAX_PAYLOAD_SIZE))
+
+        if recv_into is not None and not hasattr(recv_into, "__call__"):
+            raise AttributeError("{} recv_into function is not callable".format(self.__class__.__name__))
+
+        self.__send, self.__recv, self.__recv_into = send, recv, recv_into
+        self.__request_window, self.__request_payload_size = window, payload_size
+
+        # Reusable ack frame buffer and receive package data buffer
+        self.__frame = bytearray(ctypes.sizeof(ReadAckMsg.get_type(ReadAckMsg.MAX_PAYLOAD_SIZE)))
+        self.__buffer = bytearray()
+
+        # Negotiated result
+        self.__window, self.__payload_size = 1, self.PAYLOAD_SIZE
+
+    @property
+    def window(self):
+        return self.__window
+
+    @property
+    def payload_size(self):
+        return self.__payload_size
 
     @staticmethod
-    def calc_package_size(data):
-        return len(data) // SerialTransferProtocol.PAYLOAD_SIZE
+    def calc_package_size(data, payload_size=PAYLOAD_SIZE):
+        # Last package may be partial, round up
+        return (len(data) + payload_size - 1) // payload_size
 
     @staticmethod
-    def get_package_data(idx, data):
-        size = SerialTransferProtocol.calc_package_size(data)
+    def get_package_data(idx, data, payload_size=PAYLOAD_SIZE):
+        size = SerialTransferProtocol.calc_package_size(data, payload_size)
         if not 0 <= idx < size:
             return ""
 
-        return data[idx * SerialTransferProtocol.PAYLOAD_SIZE: (idx + 1) * SerialTransferProtocol.PAYLOAD_SIZE]
+        return data[idx * payload_size: (idx + 1) * payload_size]
 
     def recv(self, callback=None):
         """Receive data
@@ -225,18 +338,55 @@ class SerialTransferProtocol(object):
         :param callback: update recv percentage callback callback(percentage)
         :return: (global data and  package data)
         """
+        global_data, package_data = self.recv_into(callback=callback)
+        return global_data, package_data.tobytes()
+
+    def recv_into(self, buffer=None, callback=None):
+        """Receive data, packages are written directly into buffer
+
+        :param buffer: writable buffer(bytearray, memoryview...) large enough for all packages,
+        None means use protocol internal buffer(reused by next recv_into)
+        :param callback: update recv percentage callback callback(percentage)
+        :return: (global data and package data memoryview of buffer)
+        """
+        # Negotiate windowed transfer
+        length = 0
+        self.__window, self.__payload_size = 1, self.PAYLOAD_SIZE
+        if self.__request_window > 1 or self.__request_payload_size != self.PAYLOAD_SIZE:
+            self.__window, self.__payload_size, length = self.__r_negotiate()
+
         # Send r_init request, get package_size and global data
         package_size, global_data = self.__r_init()
 
+        # Peer reported data length, trim the partial last package
+        size = package_size * self.__payload_size
+        if length:
+            if not size - self.__payload_size < length <= size:
+                raise SerialTransferError("Data length {} mismatch package size {}".format(length, package_size))
+
+            size = length
+
+        if buffer is None:
+            if len(self.__buffer) < size:
+                self.__buffer = bytearray(size)
+            buffer = self.__buffer
+
+        buffer = memoryview(buffer).cast('B')
+        if len(buffer) < size:
+            raise SerialTransferError("Receive buffer is too small, requires {} bytes".format(size))
+
+        if self.__window > 1 or self.__payload_size != self.PAYLOAD_SIZE:
+            self.__r_data_window(package_size, buffer[:size], callback)
+            return global_data, buffer[:size]
+
         # Read package data
-        package_data = bytes()
         for package_index in range(package_size):
-            package_data += self.__r_data(package_index)
+            self.__r_data(package_index, buffer)
 
             if callback and hasattr(callback, "__call__"):
                 callback((package_index + 1) / (package_size * 1.0) * 100)
 
-        return global_data, package_data
+        return global_data, buffer[:size]
 
     def send(self, global_data, package_data, callback=None):
         """Write data
@@ -268,17 +418,17 @@ class SerialTransferProtocol(object):
         """
         # Type check
         if isinstance(req, ReadReqMsg):
-            ack = ReadAckMsg()
+            ack = ReadAckMsg
         elif isinstance(req, WriteReqMsg):
-            ack = WriteAckMsg()
+            ack = WriteAckMsg
         else:
             raise SerialTransferError("Request message type error:'{0:s}'".format(req.__class__.__name__))
 
         try:
             self.__send(req.cdata())
-            data = self.__recv(ctypes.sizeof(ack))
-            success, error = ack.init_and_check(data)
+            success, error = ack.from_frame(self.__recv_frame(ctypes.sizeof(ack)))
             if success:
+                ack = error
                 if ack.ack != req.req:
                     raise SerialTransferError(ErrorCode.get_desc(ack.args))
                 return ack
@@ -300,17 +450,157 @@ class SerialTransferProtocol(object):
         # Return package size data global data
         return int(ack.args), ack.get_data_payload()
 
-    def __r_data(self, package_index):
-        """Read package_index specified package index
+    def __recv_frame(self, size):
+        """Receive a frame into reusable frame buffer
+
+        :param size: frame size
+        :return: memoryview of received data(valid until next receive)
+        """
+        frame = memoryview(self.__frame)[:size]
+        if self.__recv_into is not None:
+            return frame[:self.__recv_into(frame)]
+
+        data = self.__recv(size)
+        frame = frame[:len(data)]
+        frame[:] = data
+        return frame
+
+    def __r_negotiate(self):
+        """Negotiate windowed transfer, ack args is accepted payload size, first payload byte is peer window,
+        following 4 bytes(little endian) is data length, 0 means unknown
+
+        :return: window, payload_size, length (1, PAYLOAD_SIZE, 0 if peer do not support)
+        """
+        try:
+            ack = self.__basic_transfer(ReadReqMsg(ReadReqMsg.NEGOTIATE_REQ, self.__request_payload_size))
+            payload = ack.get_data_payload()
+            payload_size, window, length = int(ack.args), payload[0], struct.unpack("<I", payload[1:5])[0]
+            if not 0 < payload_size <= self.__request_payload_size or window == 0:
+                raise SerialTransferError("Negotiate ack error")
+
+            return min(self.__request_window, window), payload_size, length
+        except SerialTransferError:
+            return 1, self.PAYLOAD_SIZE, 0
+
+    def __r_data_window(self, package_size, buffer, callback=None):
+        """Read all packages with a sliding window
+
+        Peer handle requests in order, so acks arrive in request order: requests before the matched one
+        are lost, a crc error ack belongs to the oldest request. Requests timed out are kept as stale,
+        their late acks are matched and dropped, all acks in flight are drained before return
+
+        :param package_size: total package size
+        :param buffer: package data buffer, the last package is trimmed to buffer size
+        :param callback: update recv percentage callback callback(percentage)
+        :return:
+        """
+        ack_type = ReadAckMsg.get_type(self.__payload_size)
+        ack_size = ctypes.sizeof(ack_type)
+        payload_offset, payload_size = ack_type.payload.offset, self.__payload_size
+
+        retransmit = [0] * package_size
+        completed = [False] * package_size
+        pending = collections.deque(range(package_size))
+
+        # Package index of requests waiting ack in request order, and requests already timed out
+        sent = collections.deque()
+        stale = collections.deque()
+        received = 0
+
+        def re_request(index):
+            if completed[index]:
+                return
+
+            retransmit[index] += 1
+            if retransmit[index] > self.MAX_RETRANSMIT:
+                raise SerialTransferError("Package {} retransmit too many times".format(index))
+
+            pending.appendleft(index)
+
+        def match(index):
+            # Requests before the matched one are lost, return False if index is not waiting ack
+            if index in stale:
+                while stale.popleft() != index:
+                    pass
+                return True
+
+            if index not in sent:
+                return False
+
+            # Not a late ack, all stale acks are lost
+            stale.clear()
+            while sent[0] != index:
+                re_request(sent.popleft())
+
+            sent.popleft()
+            return True
+
+        while received < package_size or sent or stale:
+            # Fill the window, requests are sent back to back
+            requests = list()
+            while pending and len(sent) < self.__window:
+                package_index = pending.popleft()
+                if not completed[package_index]:
+                    sent.append(package_index)
+                    requests.append(ReadReqMsg(ReadReqMsg.DATA_REQ, package_index).cdata())
+
+            if requests:
+                try:
+                    self.__send(b"".join(requests))
+                except serial.SerialException as error:
+                    raise SerialTransferError(error)
+
+            try:
+                frame = self.__recv_frame(ack_size)
+            except serial.SerialException:
+                # Timeout, requests waiting ack are considered lost, their acks may still arrive late
+                while sent:
+                    re_request(sent[0])
+                    stale.append(sent.popleft())
+
+                # All packages are received, do not wait lost acks any more
+                if received == package_size:
+                    break
+
+                continue
+
+            success, ack = ack_type.from_frame(frame)
+            if not success:
+                # Crc error, it is the ack of oldest request
+                if stale:
+                    stale.popleft()
+                elif sent:
+                    re_request(sent.popleft())
+                continue
+
+            if ack.ack != ReadReqMsg.DATA_REQ:
+                raise SerialTransferError(ErrorCode.get_desc(ack.args))
+
+            if not match(ack.args) or completed[ack.args]:
+                continue
+
+            completed[ack.args] = True
+            offset = ack.args * payload_size
+            size = min(payload_size, len(buffer) - offset)
+            buffer[offset:offset + size] = frame[payload_offset:payload_offset + size]
+            received += 1
+
+            if callback and hasattr(callback, "__call__"):
+                callback(received / (package_size * 1.0) * 100)
+
+    def __r_data(self, package_index, buffer):
+        """Read package_index specified package index into buffer
 
         :param package_index:  will read package data
-        :return: result, package_data or error
+        :param buffer: package data buffer
+        :return:
         """
         req = ReadReqMsg(ReadReqMsg.DATA_REQ, package_index)
 
-        # Send read init request and get ack
+        # Send read init request and get ack, ack is mapped on frame buffer copy payload directly
         ack = self.__basic_transfer(req)
-        return ack.get_data_payload()
+        offset = package_index * self.PAYLOAD_SIZE
+        buffer[offset:offset + self.PAYLOAD_SIZE] = memoryview(ack.payload).cast('B')
 
     def __w_init(self, package_size, global_data):
         """Launch a write transfer section
@@ -415,8 +705,23 @@ class SerialPort(object):
         :param timeout: receive data timeout(s)
         :return: received data or timeout exception
         """
+        if size == 0:
+            raise serial.SerialException("Receive data length error")
+
+        buffer = bytearray(size)
+        return bytes(memoryview(buffer)[:self.read_into(buffer, timeout)])
+
+    def read_into(self, buffer, timeout: float or None = None) -> int:
+        """Receive data directly into buffer
+
+        :param buffer: writable buffer(bytearray, memoryview...), receive at most len(buffer) bytes
+        :param timeout: receive data timeout(s)
+        :return: received data size or timeout exception
+        """
         start = time.time()
         timeout = timeout if timeout else self.__timeout
+        buffer = memoryview(buffer).cast('B')
+        size = len(buffer)
 
         if size == 0:
             raise serial.SerialException("Receive data length error")
@@ -424,42 +729,584 @@ class SerialPort(object):
         if not self.__port.isOpen():
             raise serial.SerialException("Serial port: {} is not opened".format(self.__port.port))
 
-        data = bytes()
-        while len(data) < size and time.time() - start < timeout:
-            data += self.__port.read(size - len(data))
-            if data and hasattr(self.__ending_check, "__call__") and self.__ending_check(data):
+        received = 0
+        readinto = getattr(self.__port, "readinto", None)
+        while received < size and time.time() - start < timeout:
+            if readinto is not None:
+                received += readinto(buffer[received:])
+            else:
+                data = self.__port.read(size - received)
+                buffer[received:received + len(data)] = data
+                received += len(data)
+
+            if received and hasattr(self.__ending_check, "__call__") and \
+                    self.__ending_check(buffer[:received].tobytes()):
                 break
 
-        if not data:
+        if not received:
             raise serial.SerialTimeoutException("Receive data timeout!")
 
-        return data
+        return received
 
     @staticmethod
     def get_serial_list(timeout=0.04):
-        port_list = list()
-        system = platform.system().lower()
+        return SerialPortDiscovery.default().get_serial_list(timeout)
+
+
+class SerialPortDiscovery(object):
+    # Default instance shared by SerialPort.get_serial_list and gui selectors
+    __default = None
+    __default_lock = threading.Lock()
+
+    def __init__(self, ttl: float = 10.0, timeout: float = 0.04, max_workers: int = 8):
+        """Serial port discovery service, scan local and LAN raspberry serial ports concurrently
+
+        Local ports are cheap to scan, so they are rescanned every refresh(hotplug),
+        remote ports are cached and only rescanned when cache is older than ttl or force rescan
+
+        Ports are a ordered dict: port name => port data(SerialPort port argument),
+        local port data is device name, remote port data is a tuple (raspberry address, device name)
+
+        :param ttl: remote ports cache time to live
+        :param timeout: raspberry server scan timeout
+        :param max_workers: maximum concurrent scan workers
+        """
+        self.__ttl = ttl
+        self.__timeout = timeout
+        self.__local = collections.OrderedDict()
+        self.__remote = collections.OrderedDict()
+        self.__remote_timestamp = None
+
+        self.__listeners = list()
+        self.__lock = threading.Lock()
+        self.__refresh_lock = threading.Lock()
+        self.__pool = concurrent.futures.ThreadPoolExecutor(max_workers=max_workers)
+
+        # Background refresh waits scan_remote on pool, must not occupy pool workers(deadlock)
+        self.__refresh_pool = concurrent.futures.ThreadPoolExecutor(max_workers=1)
+
+        self.__running = False
+        self.__thread = Thread()
+        self.__event = threading.Event()
+
+    @classmethod
+    def default(cls):
+        with cls.__default_lock:
+            if cls.__default is None:
+                cls.__default = cls()
+
+            return cls.__default
+
+    @property
+    def ttl(self) -> float:
+        return self.__ttl
+
+    def is_expired(self) -> bool:
+        with self.__lock:
+            return self.__remote_timestamp is None or time.monotonic() - self.__remote_timestamp >= self.__ttl
+
+    def ports(self) -> collections.OrderedDict:
+        """Get cached ports without scan(do not block)
+
+        :return: port name => port data
+        """
+        with self.__lock:
+            ports = collections.OrderedDict(self.__local)
+            ports.update(self.__remote)
+            return ports
+
+    def add_listener(self, listener: Callable[[dict, dict], None]):
+        """Add ports change listener, listener(added, removed) is called in the refresh thread
+
+        :param listener: listener
+        :return:
+        """
+        with self.__lock:
+            if listener not in self.__listeners:
+                self.__listeners.append(listener)
+
+    def remove_listener(self, listener: Callable[[dict, dict], None]):
+        with self.__lock:
+            if listener in self.__listeners:
+                self.__listeners.remove(listener)
+
+    def get_serial_list(self, timeout: float or None = None, force: bool = False) -> List[str]:
+        return list(self.refresh(timeout, force).keys())
+
+    def refresh(self, timeout: float or None = None, force: bool = False) -> collections.OrderedDict:
+        """Rescan local ports and rescan remote ports(concurrently) if cache is expired or force is set
+
+        :param timeout: raspberry server scan timeout, None means use default timeout
+        :param force: force rescan remote ports
+        :return: port name => port data
+        """
+        with self.__refresh_lock:
+            remote = None
+            if force or self.is_expired():
+                remote = self.__pool.submit(self.scan_remote, self.__timeout if timeout is None else timeout)
+
+            local = self.scan_local()
+            remote = remote.result() if remote is not None else None
+
+            with self.__lock:
+                previous = collections.OrderedDict(self.__local)
+                previous.update(self.__remote)
+
+                self.__local = local
+                if remote is not None:
+                    self.__remote = remote
+                    self.__remote_timestamp = time.monotonic()
+
+                current = collections.OrderedDict(self.__local)
+                current.update(self.__remote)
+                listeners = self.__listeners[:]
+
+            added = collections.OrderedDict((k, v) for k, v in current.items() if previous.get(k) != v)
+            removed = collections.OrderedDict((k, v) for k, v in previous.items() if current.get(k) != v)
+            if added or removed:
+                for listener in listeners:
+                    listener(added, removed)
+
+            return current
+
+    def refresh_async(self, timeout: float or None = None, force: bool = False,
+                      callback: Callable[[collections.OrderedDict], None] or None = None) -> concurrent.futures.Future:
+        """Refresh ports in background
+
+        :param timeout: raspberry server scan timeout, None means use default timeout
+        :param force: force rescan remote ports
+        :param callback: called with refreshed ports in background thread(e.g. a Qt signal emit)
+        :return: refresh future
+        """
+        future = self.__refresh_pool.submit(self.refresh, timeout, force)
+        if hasattr(callback, "__call__"):
+            future.add_done_callback(lambda f: f.exception() is None and callback(f.result()))
+
+        return future
+
+    def is_running(self) -> bool:
+        return self.__running
+
+    def start(self, interval: float = 1.0):
+        """Start hotplug monitor, rescan local ports every interval and remote ports when cache expired,
+        changes are notified to listeners
+
+        :param interval: local ports rescan interval
+        :return:
+        """
+        if self.__running:
+            return False
+
+        self.__running = True
+        self.__event.clear()
+        self.__thread = Thread(target=self.__monitor, args=(interval,), name="{}".format(self.__class__.__name__))
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+        return True
+
+    def stop(self):
+        self.__running = False
+        self.__event.set()
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+    def __monitor(self, interval: float):
+        while self.__running:
+            with contextlib.suppress(Exception):
+                self.refresh()
 
-        # Scan local port
-        if system == "linux":
-            for index, port in enumerate(glob.glob("/dev/tty[A-Za-z]*")):
-                port_list.append("{}".format(port))
+            self.__event.wait(interval)
+
+    @staticmethod
+    def scan_local() -> collections.OrderedDict:
+        ports = collections.OrderedDict()
+        if platform.system().lower() == "linux":
+            for port in sorted(glob.glob("/dev/tty[A-Za-z]*")):
+                ports[port] = port
         else:
-            for index, port in enumerate(list(serial.tools.list_ports.comports())):
+            for port in serial.tools.list_ports.comports():
                 # Windows serial port is a object linux is a tuple
-                device = port.device
-                desc = "{0:s}".format(device).split(" - ")[-1]
-                port_list.append("{0:s}".format(desc))
+                desc = "{0:s}".format(port.device).split(" - ")[-1]
+                ports[desc] = port.device
+
+        return ports
 
-        # Scan LAN raspberry serial port
+    def scan_remote(self, timeout: float) -> collections.OrderedDict:
+        """Scan LAN raspberry servers and query their serial ports concurrently
+
+        :param timeout: raspberry server scan timeout
+        :return: port name => (raspberry address, device name)
+        """
+        def query(address):
+            try:
+                return Query(address).get_serial_list()
+            except (RaspiSocketError, IndexError, ValueError, OSError):
+                return list()
+
+        ports = collections.OrderedDict()
         try:
-            for raspberry in scan_server(timeout):
-                for port in Query(raspberry).get_serial_list():
-                    port_list.append("{}/{}".format(raspberry, port.split("/")[-1]))
+            servers = scan_server(timeout)
         except (RaspiSocketError, IndexError, ValueError, OSError):
-            pass
+            return ports
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=max(len(servers), 1)) as pool:
+            result = [pool.submit(query, raspberry) for raspberry in servers]
+
+        for raspberry, future in zip(servers, result):
+            for port in future.result():
+                ports["{}/{}".format(raspberry, port.split("/")[-1])] = (raspberry, port)
+
+        return ports
+
+
+class SerialFrameParser(abc.ABC):
+    """Serial frame parser, split received byte stream into frames"""
+
+    @abc.abstractmethod
+    def parse(self, buffer: bytearray, start: int, end: int) -> Tuple[List[bytes], int, int]:
+        """Parse frames from buffer[start:end]
+
+        :param buffer: receive buffer
+        :param start: unparsed data start
+        :param end: unparsed data end
+        :return: frames, parsed position(data before it can be discarded), parse errors
+        """
+        pass
+
+
+class DelimiterFrameParser(SerialFrameParser):
+    def __init__(self, delimiter: bytes = b"\n", max_size: int = 4096, keep_delimiter: bool = False):
+        """Frames end with delimiter
+
+        :param delimiter: frame delimiter
+        :param max_size: maximum frame size, data exceed it without delimiter will be discarded as an error
+        :param keep_delimiter: keep delimiter in frame
+        """
+        if not delimiter:
+            raise ValueError("delimiter can not be empty")
+
+        self.__max_size = max_size
+        self.__discarding = False
+        self.__delimiter = bytes(delimiter)
+        self.__keep_delimiter = keep_delimiter
+
+    def parse(self, buffer: bytearray, start: int, end: int) -> Tuple[List[bytes], int, int]:
+        frames = list()
+        errors = 0
+        delimiter_size = len(self.__delimiter)
+        while start < end:
+            # Oversize frame, discard data until next delimiter
+            if self.__discarding:
+                position = buffer.find(self.__delimiter, start, end)
+                if position < 0:
+                    start = max(start, end - delimiter_size + 1)
+                    break
+
+                self.__discarding = False
+                start = position + delimiter_size
+                continue
+
+            position = buffer.find(self.__delimiter, start, min(end, start + self.__max_size + delimiter_size))
+            if position < 0:
+                if end - start > self.__max_size:
+                    errors += 1
+                    self.__discarding = True
+                    continue
+                break
+
+            frame_end = position + delimiter_size
+            frames.append(bytes(buffer[start:frame_end if self.__keep_delimiter else position]))
+            start = frame_end
+
+        return frames, start, errors
+
+
+class LengthPrefixedFrameParser(SerialFrameParser):
+    def __init__(self, length_format: str = "<H", length_offset: int = 0, length_adjust: int = 0,
+                 max_size: int = 4096, check: Callable[[bytes], bool] or None = None):
+        """Frames with a length field, frame size = length field value + length_adjust
+
+        :param length_format: length field struct format, e.g. "<B", "<H", ">I"
+        :param length_offset: length field offset in frame
+        :param length_adjust: adjust value, e.g. length field do not count header
+        :param max_size: maximum frame size, larger frames are treated as errors
+        :param check: frame check function, invalid frame will be skipped one byte to resync
+        """
+        self.__check = check
+        self.__max_size = max_size
+        self.__resyncing = False
+        self.__length_adjust = length_adjust
+        self.__length_offset = length_offset
+        self.__length_format = struct.Struct(length_format)
+        self.__header_size = length_offset + self.__length_format.size
+
+    def parse(self, buffer: bytearray, start: int, end: int) -> Tuple[List[bytes], int, int]:
+        frames = list()
+        errors = 0
+        while end - start >= self.__header_size:
+            size = self.__length_format.unpack_from(buffer, start + self.__length_offset)[0] + self.__length_adjust
+            if self.__header_size <= size <= self.__max_size:
+                if end - start < size:
+                    break
+
+                frame = bytes(buffer[start:start + size])
+                if not hasattr(self.__check, "__call__") or self.__check(frame):
+                    frames.append(frame)
+                    self.__resyncing = False
+                    start += size
+                    continue
+
+            # Skip one byte to resync, continuous skipped bytes count as one error
+            if not self.__resyncing:
+                errors += 1
+                self.__resyncing = True
+
+            start += 1
+
+        return frames, start, errors
+
+
+class MessageFrameParser(LengthPrefixedFrameParser):
+    def __init__(self, msg_type: Type[BasicMsg] = ReadAckMsg):
+        """BasicMsg sized frames, first byte is message length(size - 1) and frame is checked with crc16
+
+        :param msg_type: BasicMsg subclass
+        """
+        size = ctypes.sizeof(msg_type)
+
+        def check(frame):
+            return len(frame) == size and not crc16(frame[1:])
+
+        super(MessageFrameParser, self).__init__("<B", 0, 1, size, check)
+
+
+class SerialRingBuffer(object):
+    def __init__(self, capacity: int = 65536):
+        """Serial receive buffer, data is kept contiguous so parsers can work on it without copy
+
+        :param capacity: maximum unparsed data size, oldest data is discarded when overflow
+        """
+        self.__start = 0
+        self.__end = 0
+        self.__capacity = capacity
+        self.__buffer = bytearray(capacity * 2)
+
+    def __len__(self):
+        return self.__end - self.__start
+
+    @property
+    def buffer(self) -> bytearray:
+        return self.__buffer
+
+    @property
+    def start(self) -> int:
+        return self.__start
+
+    @property
+    def end(self) -> int:
+        return self.__end
+
+    def write(self, data: bytes) -> int:
+        """Write data to buffer
+
+        :param data: received data
+        :return: overflow(discarded) data size
+        """
+        size = len(data)
+        overflow = max(0, len(self) + size - self.__capacity)
+        if overflow:
+            self.__start += min(overflow, len(self))
+            data = data[max(0, size - self.__capacity):]
+            size = len(data)
+
+        # Move unparsed data to buffer head
+        if self.__end + size > len(self.__buffer):
+            length = len(self)
+            self.__buffer[:length] = self.__buffer[self.__start:self.__end]
+            self.__start, self.__end = 0, length
+
+        self.__buffer[self.__end:self.__end + size] = data
+        self.__end += size
+        return overflow
+
+    def consume(self, position: int):
+        self.__start = min(max(position, self.__start), self.__end)
+        if self.__start == self.__end:
+            self.__start = self.__end = 0
+
+
+class SerialPortReader(object):
+    # Statistics rate calculate interval
+    RATE_INTERVAL = 1.0
+
+    def __init__(self, port: SerialPort, parser: SerialFrameParser,
+                 callback: Callable[[bytes], None] or None = None,
+                 queue_size: int = 1024, buffer_size: int = 65536, poll_interval: float = 0.1):
+        """Serial port background reader, wait data with select(or a blocking read), split frames with parser and
+        deliver frames to callback(e.g. a Qt signal emit) or queue
+
+        SerialPort.read should not be used while reader is running
+
+        :param port: serial port
+        :param parser: frame parser
+        :param callback: frame callback, called in reader thread
+        :param queue_size: frame queue size, oldest frame is dropped when queue is full, 0 means do not use queue
+        :param buffer_size: receive ring buffer size
+        :param poll_interval: maximum time of waiting data(stop response time)
+        """
+        if not isinstance(port, SerialPort):
+            raise TypeError("port require {!r}".format(SerialPort.__name__))
+
+        if not isinstance(parser, SerialFrameParser):
+            raise TypeError("parser require {!r}".format(SerialFrameParser.__name__))
+
+        self.__port = port
+        self.__parser = parser
+        self.__callback = callback
+        self.__poll_interval = poll_interval
+        self.__buffer = SerialRingBuffer(buffer_size)
+        self.__queue = queue.Queue(maxsize=queue_size) if queue_size else None
+
+        self.__running = False
+        self.__thread = Thread()
+        self.__lock = threading.Lock()
+        self.__statistics = dict(bytes=0, frames=0, errors=0, overflows=0, dropped=0, bytes_rate=0.0, frames_rate=0.0)
 
-        return port_list
+    @property
+    def queue(self) -> queue.Queue or None:
+        return self.__queue
+
+    def get(self, timeout: float or None = None) -> bytes:
+        """Get a frame from frame queue
+
+        :param timeout: wait timeout, None means block until a frame is received
+        :return: frame or raise queue.Empty
+        """
+        if self.__queue is None:
+            raise queue.Empty()
+
+        return self.__queue.get(timeout=timeout)
+
+    def statistics(self) -> dict:
+        """Get reader statistics
+
+        :return: received bytes, frames, parse errors, buffer overflow bytes, dropped frames(queue full),
+        bytes/s and frames/s of last statistics interval
+        """
+        with self.__lock:
+            return self.__statistics.copy()
+
+    def is_running(self) -> bool:
+        return self.__running
+
+    def start(self):
+        if self.__running:
+            return False
+
+        self.__running = True
+        self.__thread = Thread(target=self.__reading, name="{}".format(self.__class__.__name__))
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+        return True
+
+    def stop(self):
+        self.__running = False
+        if self.__thread.is_alive():
+            self.__thread.join()
+
+    def __get_waiter(self, raw_port):
+        """Get a function wait until data is readable(or poll interval passed) and return readable data
+
+        :param raw_port: pyserial or websocket serial port
+        :return: waiter, waiter blocks on port read timeout or not
+        """
+        try:
+            if platform.system().lower() == "windows":
+                raise AttributeError("select do not support serial port on windows")
+
+            fd = raw_port.fileno()
+
+            def wait_select():
+                readable, _, _ = select.select([fd], [], [], self.__poll_interval)
+                return raw_port.read(max(raw_port.in_waiting, 1)) if readable else b""
+
+            return wait_select, False
+        except (AttributeError, OSError, ValueError, io.UnsupportedOperation):
+            # Without file descriptor, block in driver with a read timeout
+            def wait_read():
+                data = raw_port.read(1)
+                in_waiting = getattr(raw_port, "in_waiting", 0)
+                return data + raw_port.read(in_waiting) if data and in_waiting else data
+
+            return wait_read, True
+
+    def __reading(self):
+        raw_port = self.__port.raw_port
+        timeout = getattr(raw_port, "timeout", None)
+        waiter, use_timeout = self.__get_waiter(raw_port)
+        if use_timeout:
+            raw_port.timeout = self.__poll_interval
+
+        interval_start = time.perf_counter()
+        interval_bytes = interval_frames = 0
+
+        try:
+            while self.__running:
+                try:
+                    data = waiter()
+                except (serial.SerialException, OSError, ValueError):
+                    # Port is closed
+                    break
+
+                frames, errors, overflow = list(), 0, 0
+                if data:
+                    overflow = self.__buffer.write(data)
+                    try:
+                        frames, position, errors = self.__parser.parse(self.__buffer.buffer,
+                                                                       self.__buffer.start, self.__buffer.end)
+                    except Exception as error:
+                        # Parser failed, discard buffered data and keep reading
+                        print("{} parse error: {}".format(self.__class__.__name__, error))
+                        frames, position, errors = list(), self.__buffer.end, 1
+
+                    self.__buffer.consume(position)
+
+                dropped = 0
+                for frame in frames:
+                    if self.__queue is not None:
+                        try:
+                            self.__queue.put_nowait(frame)
+                        except queue.Full:
+                            with contextlib.suppress(queue.Empty):
+                                self.__queue.get_nowait()
+                            self.__queue.put_nowait(frame)
+                            dropped += 1
+
+                    if hasattr(self.__callback, "__call__"):
+                        try:
+                            self.__callback(frame)
+                        except Exception as error:
+                            print("{} callback error: {}".format(self.__class__.__name__, error))
+
+                interval_bytes += len(data)
+                interval_frames += len(frames)
+                now = time.perf_counter()
+                with self.__lock:
+                    statistics = self.__statistics
+                    statistics["bytes"] += len(data)
+                    statistics["frames"] += len(frames)
+                    statistics["errors"] += errors
+                    statistics["dropped"] += dropped
+                    statistics["overflows"] += overflow
+                    if now - interval_start >= self.RATE_INTERVAL:
+                        statistics["bytes_rate"] = interval_bytes / (now - interval_start)
+                        statistics["frames_rate"] = interval_frames / (now - interval_start)
+                        interval_start, interval_bytes, interval_frames = now, 0, 0
+        finally:
+            self.__running = False
+            if use_timeout:
+                with contextlib.suppress(serial.SerialException, ValueError, AttributeError):
+                    raw_port.timeout = timeout
 
 
 class SerialPortProtocolSimulate(object):
@@ -542,16 +1389,31 @@ class SerialPortProtocolSimulate(object):
 
 
 class SerialTransferProtocolReadSimulate(SerialPortProtocolSimulate):
-    def __init__(self, send, recv, data, error_handle=print):
+    def __init__(self, send, recv, data, error_handle=print, payload_size=None, window=1, error_rate=0.0):
+        """SerialTransferProtocol read peer simulate
+
+        :param send: serial port send function
+        :param recv: serial port receive function
+        :param data: (global data, config data)
+        :param error_handle: error handle function
+        :param payload_size: maximum payload size for windowed transfer, None means a stop-and-wait only peer
+        :param window: maximum requests can be queued by peer
+        :param error_rate: probability of corrupting a data ack crc, for retransmit testing
+        """
         super(SerialTransferProtocolReadSimulate, self).__init__(send, recv, error_handle)
         self.__global_data, self.__config_data = data
+        self.__window = window
+        self.__error_rate = error_rate
+        self.__max_payload_size = payload_size
+        self.__negotiated_payload_size = None
+        self.__ack_type = ReadAckMsg
         self.__total_package = SerialTransferProtocol.calc_package_size(self.__config_data)
 
     def _get_request_size(self):
         return ctypes.sizeof(ReadReqMsg)
 
     def _check_request(self, data):
-        if not isinstance(data, str):
+        if not isinstance(data, (bytes, bytearray)):
             return False, "Request data type error!"
 
         return ReadReqMsg(0, 0).init_and_check(data)
@@ -560,19 +1422,39 @@ class SerialTransferProtocolReadSimulate(SerialPortProtocolSimulate):
         if not isinstance(req, ReadReqMsg):
             return self._check_request
 
-        return {
+        handles = {
 
             ReadReqMsg.INIT_REQ: self.read_init,
             ReadReqMsg.DATA_REQ: self.read_data,
 
-        }.get(req.req, self._error_request)
+        }
+
+        if self.__max_payload_size:
+            handles[ReadReqMsg.NEGOTIATE_REQ] = self.read_negotiate
+
+        return handles.get(req.req, self._error_request)
 
     def _error_request(self, req):
         return ""
 
+    def read_negotiate(self, req):
+        self.__negotiated_payload_size = min(req.args, self.__max_payload_size)
+        payload = bytes([min(self.__window, 255)]) + struct.pack("<I", len(self.__config_data))
+        return ReadAckMsg.create(req.req, self.__negotiated_payload_size, payload).cdata()
+
     def read_init(self, req):
+        # Negotiated payload size only valid for the following transfer session
+        payload_size = self.__negotiated_payload_size or SerialTransferProtocol.PAYLOAD_SIZE
+        self.__negotiated_payload_size = None
+        self.__ack_type = ReadAckMsg.get_type(payload_size)
+        self.__total_package = SerialTransferProtocol.calc_package_size(self.__config_data, payload_size)
         return ReadAckMsg.create(req.req, self.__total_package, self.__global_data).cdata()
 
     def read_data(self, req):
-        data = SerialTransferProtocol.get_package_data(req.args, self.__config_data)
-        return ReadAckMsg.create(req.req, req.args, data).cdata()
+        payload_size = self.__ack_type.PAYLOAD_SIZE
+        data = SerialTransferProtocol.get_package_data(req.args, self.__config_data, payload_size)
+        ack = self.__ack_type.create(req.req, req.args, data)
+        if self.__error_rate and random.random() < self.__error_rate:
+            ack.crc16 ^= 0xffff
+
+        return ack.cdata()
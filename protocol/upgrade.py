@@ -1,10 +1,20 @@
 # -*- coding: utf-8 -*-
+import io
 import os
+import re
 import json
+import time
 import socket
+import asyncio
+import mimetypes
+import urllib.parse
+import email.utils
 import http.client
 import pathlib
 import hashlib
+import tarfile
+import tempfile
+import functools
 import datetime
 import threading
 import socketserver
@@ -17,8 +27,9 @@ from ..network.gogs_request import *
 
 NEW_VERSION_DURL_CMD = "GET_NEWEST_DURL"
 NEW_VERSION_CHECK_CMD = "GET_NEWEST_VERSION"
-__all__ = ['UpgradeClient', 'UpgradeServer', 'UpgradeServerHandler', 'GogsUpgradeClient',
-           'GogsSoftwareReleaseDesc', 'GogsUpgradeClientDownloadError']
+__all__ = ['UpgradeClient', 'UpgradeServer', 'UpgradeServerHandler', 'UpgradeVersionCatalog', 'AsyncUpgradeServer',
+           'UpgradeFramedProtocol', 'FramedUpgradeClient', 'UpgradeDeltaPackage', 'UpgradeDeltaPackageError',
+           'GogsUpgradeClient', 'GogsSoftwareReleaseDesc', 'GogsSoftwareDeltaDesc', 'GogsUpgradeClientDownloadError']
 
 
 class UpgradeClient(object):
@@ -141,6 +152,605 @@ class UpgradeClient(object):
             return error
 
 
+# Upgrade package version catalog, index software directory once and answer queries from memory
+class UpgradeVersionCatalog(object):
+    MD5_CHUNK_SIZE = 1024 * 1024
+
+    def __init__(self, root: str, suffix: str, check_interval: float = 1.0):
+        """Software version catalog
+
+        :param root: upgrade package root, each software has it's own directory under root
+        :param suffix: upgrade package suffix
+        :param check_interval: minimum interval(seconds) between two directory/file mtime checks
+        """
+        self.__root = root
+        self.__suffix = suffix
+        self.__check_interval = check_interval
+
+        self.__lock = threading.Lock()
+        self.__locks = dict()
+        self.__catalog = dict()
+        self.__digests = dict()
+
+    @staticmethod
+    def calc_file_md5(path: str, chunk_size: int = MD5_CHUNK_SIZE) -> str:
+        md5 = hashlib.md5()
+        with open(path, "rb") as fp:
+            for chunk in iter(lambda: fp.read(chunk_size), b""):
+                md5.update(chunk)
+
+        return md5.hexdigest()
+
+    def get_file_md5(self, path: str) -> str:
+        """Get file md5, digest is cached until file size or mtime changed
+
+        :param path: file path
+        :return: file md5
+        """
+        st = os.stat(path)
+        key = (st.st_size, st.st_mtime_ns)
+        with self.__lock:
+            cached = self.__digests.get(path)
+
+        if cached and cached[0] == key:
+            return cached[1]
+
+        md5 = self.calc_file_md5(path)
+        with self.__lock:
+            self.__digests[path] = (key, md5)
+
+        return md5
+
+    def invalidate(self, software: str = ""):
+        """Drop software(empty drop all) index, next query will re-index it"""
+        with self.__lock:
+            if software:
+                self.__catalog.pop(software, None)
+            else:
+                self.__catalog.clear()
+                self.__digests.clear()
+
+    def __get_entry(self, software: str) -> dict or None:
+        with self.__lock:
+            entry = self.__catalog.get(software)
+            lock = self.__locks.get(software)
+
+        if entry and time.monotonic() - entry["checked"] < self.__check_interval:
+            return entry
+
+        # Only existing software has a lock, unknown names do not grow the locks
+        if lock is None:
+            if not os.path.isdir(os.path.join(self.__root, software)):
+                return None
+
+            with self.__lock:
+                lock = self.__locks.setdefault(software, threading.Lock())
+
+        # Only one thread index a software, others wait and reuse the result
+        with lock:
+            with self.__lock:
+                entry = self.__catalog.get(software)
+
+            if entry and time.monotonic() - entry["checked"] < self.__check_interval:
+                return entry
+
+            entry = self.__index(software, entry)
+            with self.__lock:
+                if entry is None:
+                    self.__catalog.pop(software, None)
+                    self.__locks.pop(software, None)
+                else:
+                    self.__catalog[software] = entry
+
+            return entry
+
+    def __index(self, software: str, entry: dict or None) -> dict or None:
+        package_dir = os.path.join(self.__root, software)
+
+        try:
+            dir_mtime = os.stat(package_dir).st_mtime_ns
+            if not os.path.isdir(package_dir):
+                return None
+
+            # Directory changed(package added, removed or renamed), re-index it
+            if entry is None or entry["mtime"] != dir_mtime:
+                names = os.listdir(package_dir)
+                versions = sorted(((str2float(os.path.splitext(name)[0]), name) for name in names
+                                   if self.__suffix in name), key=lambda x: x[0], reverse=True)
+                deltas = {UpgradeDeltaPackage.parse_name(name): name for name in names
+                          if UpgradeDeltaPackage.parse_name(name)}
+                entry = dict(mtime=dir_mtime, versions=versions, deltas=deltas, md5="", stat=None)
+            else:
+                # Readers hold the old entry without lock, never modify it in place
+                entry = dict(entry)
+
+            # Newest package replaced in place, re-calc md5
+            if entry["versions"]:
+                st = os.stat(os.path.join(package_dir, entry["versions"][0][1]))
+                if entry["stat"] != (st.st_size, st.st_mtime_ns):
+                    entry["md5"] = self.get_file_md5(os.path.join(package_dir, entry["versions"][0][1]))
+                    entry["stat"] = (st.st_size, st.st_mtime_ns)
+
+            entry["checked"] = time.monotonic()
+            return entry
+        except FileNotFoundError:
+            return None
+        except OSError as e:
+            print("Index software {!r} error: {}".format(software, e))
+            return None
+
+    def get_versions(self, software: str) -> List[Tuple[float, str]]:
+        """Get software all versions
+
+        :param software: software name
+        :return: [(version, package name), ...] newest first
+        """
+        entry = self.__get_entry(software)
+        return list(entry["versions"]) if entry else []
+
+    def get_newest(self, software: str) -> Tuple[float, str, str, int]:
+        """Get software newest package
+
+        :param software: software name
+        :return: version, package name, md5, size, (0.0, "", "", 0) if not found
+        """
+        entry = self.__get_entry(software)
+        if not entry or not entry["versions"]:
+            return 0.0, "", "", 0
+
+        version, name = entry["versions"][0]
+        return version, name, entry["md5"], entry["stat"][0]
+
+    def get_delta(self, software: str, base_version: float) -> Tuple[str, str, int] or None:
+        """Get delta package from base version to newest version
+
+        :param software: software name
+        :param base_version: base version
+        :return: delta package name, md5, size, None if not found
+        """
+        entry = self.__get_entry(software)
+        if not entry or not entry["versions"]:
+            return None
+
+        name = entry["deltas"].get((entry["versions"][0][0], str2float(base_version)))
+        if not name:
+            return None
+
+        path = os.path.join(self.__root, software, name)
+        try:
+            return name, self.get_file_md5(path), os.path.getsize(path)
+        except OSError:
+            return None
+
+
+class UpgradeDeltaPackageError(Exception):
+    pass
+
+
+# Delta upgrade package, only carry files which base package do not have
+class UpgradeDeltaPackage(object):
+    SUFFIX = ".tdelta"
+    MANIFEST = "delta.json"
+    BLOB_DIR = "blobs/"
+    CHUNK_SIZE = 1024 * 1024
+    SPOOL_SIZE = 8 * 1024 * 1024
+    SHA256_PATTERN = re.compile(r"[0-9a-f]{64}")
+
+    # Package suffix => compress format
+    support_format = {
+        "tar": "",
+        "gz": "gz",
+        "tgz": "gz",
+        "bz2": "bz2",
+        "tbz2": "bz2",
+        "xz": "xz",
+        "txz": "xz",
+    }
+
+    @classmethod
+    def get_name(cls, base_version: float, target_version: float) -> str:
+        return "{}_{}{}".format(target_version, base_version, cls.SUFFIX)
+
+    @classmethod
+    def parse_name(cls, name: str) -> Tuple[float, float] or None:
+        """Parse delta package name
+
+        :param name: delta package name
+        :return: (target version, base version) or None if it's not a delta package
+        """
+        if not name.endswith(cls.SUFFIX):
+            return None
+
+        target, _, base = name[:-len(cls.SUFFIX)].partition("_")
+        target, base = str2float(target), str2float(base)
+        return (target, base) if target and base else None
+
+    @classmethod
+    def get_format(cls, name: str) -> str:
+        """Get package compress format from it's suffix
+
+        :param name: package name
+        :return: tarfile compress format
+        """
+        suffix = name.rsplit(".", 1)[-1].lower() if "." in name else ""
+        if suffix not in cls.support_format:
+            raise UpgradeDeltaPackageError("Unknown package format: {!r}".format(name))
+
+        return cls.support_format[suffix]
+
+    @classmethod
+    def __read_member(cls, archive: tarfile.TarFile, member: tarfile.TarInfo, fp: BinaryIO) -> str:
+        sha256 = hashlib.sha256()
+        src = archive.extractfile(member)
+        for chunk in iter(lambda: src.read(cls.CHUNK_SIZE), b""):
+            sha256.update(chunk)
+            fp.write(chunk)
+
+        return sha256.hexdigest()
+
+    @classmethod
+    def __scan(cls, package: str, store: Callable[[tarfile.TarFile, tarfile.TarInfo], str] or None = None) -> tuple:
+        # Package files sha256 and content digest(all members header and file sha256 in order)
+        digests, content = set(), hashlib.sha256()
+        with tarfile.open(package, "r|*") as archive, open(os.devnull, "wb") as null:
+            for member in archive:
+                sha256 = ""
+                if member.isfile():
+                    sha256 = store(archive, member) if store else cls.__read_member(archive, member, null)
+                    digests.add(sha256)
+
+                content.update(cls.__get_header_digest(cls.__get_header(member, sha256)))
+
+        return digests, content.hexdigest()
+
+    @staticmethod
+    def __get_header_digest(header: dict) -> bytes:
+        return json.dumps(header, sort_keys=True).encode()
+
+    @staticmethod
+    def __get_header(member: tarfile.TarInfo, sha256: str = "") -> dict:
+        return dict(name=member.name, type=member.type.decode(), mode=member.mode, mtime=member.mtime,
+                    uid=member.uid, gid=member.gid, uname=member.uname, gname=member.gname,
+                    linkname=member.linkname, size=member.size if member.isfile() else 0, sha256=sha256)
+
+    @staticmethod
+    def __get_tarinfo(header: dict) -> tarfile.TarInfo:
+        member = tarfile.TarInfo(header["name"])
+        member.type = header["type"].encode()
+        for key in ("mode", "mtime", "uid", "gid", "uname", "gname", "linkname", "size"):
+            setattr(member, key, header[key])
+
+        return member
+
+    @classmethod
+    def generate(cls, base_package: str, target_package: str, delta_package: str) -> dict:
+        """Generate delta package from base package to target package
+
+        :param base_package: base(old version) package path
+        :param target_package: target(new version) package path
+        :param delta_package: delta package save path
+        :return: dict(members, blobs, delta_size, target_size)
+        """
+        try:
+            base, base_digest = cls.__scan(base_package)
+            headers, blobs, content = list(), set(), hashlib.sha256()
+
+            with tarfile.open(delta_package, "w:xz") as delta, tarfile.open(target_package, "r|*") as target:
+                for member in target:
+                    if not member.isfile():
+                        headers.append(cls.__get_header(member))
+                        content.update(cls.__get_header_digest(headers[-1]))
+                        continue
+
+                    with tempfile.SpooledTemporaryFile(max_size=cls.SPOOL_SIZE) as fp:
+                        sha256 = cls.__read_member(target, member, fp)
+                        headers.append(cls.__get_header(member, sha256))
+                        content.update(cls.__get_header_digest(headers[-1]))
+
+                        # Content addressed, renamed or duplicated files cost nothing
+                        if sha256 in base or sha256 in blobs:
+                            continue
+
+                        fp.seek(0)
+                        blobs.add(sha256)
+                        blob = tarfile.TarInfo(cls.BLOB_DIR + sha256)
+                        blob.size = member.size
+                        delta.addfile(blob, fp)
+
+                manifest = json.dumps(dict(base=UpgradeVersionCatalog.calc_file_md5(base_package),
+                                           target=UpgradeVersionCatalog.calc_file_md5(target_package),
+                                           base_digest=base_digest, target_digest=content.hexdigest(),
+                                           members=headers)).encode()
+                info = tarfile.TarInfo(cls.MANIFEST)
+                info.size = len(manifest)
+                delta.addfile(info, io.BytesIO(manifest))
+
+            return dict(members=len(headers), blobs=len(blobs),
+                        delta_size=os.path.getsize(delta_package), target_size=os.path.getsize(target_package))
+        except (OSError, tarfile.TarError) as e:
+            raise UpgradeDeltaPackageError("Generate delta package failed: {}".format(e))
+
+    @classmethod
+    def apply(cls, base_package: str, delta_package: str, output_package: str, fmt: str = "bz2") -> dict:
+        """Apply delta package to base package, rebuild target package
+
+        Each file is verified by sha256, base and rebuilt package are verified by content digest(all members header
+        and file sha256). Rebuilt package is re-compressed, it's md5 is not the same as target package md5
+
+        :param base_package: base(old version) package path
+        :param delta_package: delta package path
+        :param output_package: rebuilt target package path
+        :param fmt: output package compress format, see support_format
+        :return: manifest dict(base, target, base_digest, target_digest, members),
+        base/target is md5 of base/target package
+        """
+        output_part = output_package + ".part"
+
+        try:
+            with tempfile.TemporaryDirectory() as blob_dir:
+                def store(archive, member):
+                    with tempfile.NamedTemporaryFile(dir=blob_dir, delete=False) as fp:
+                        sha256 = cls.__read_member(archive, member, fp)
+                    os.replace(fp.name, os.path.join(blob_dir, sha256))
+                    return sha256
+
+                # Base package files and delta blobs, stored by it's sha256
+                _, base_digest = cls.__scan(base_package, store)
+
+                manifest = None
+                with tarfile.open(delta_package, "r|*") as delta:
+                    for member in delta:
+                        if member.name == cls.MANIFEST:
+                            manifest = json.loads(delta.extractfile(member).read().decode())
+                        elif member.isfile() and member.name.startswith(cls.BLOB_DIR):
+                            if store(delta, member) != member.name[len(cls.BLOB_DIR):]:
+                                raise UpgradeDeltaPackageError("Delta blob {!r} verify failed".format(member.name))
+
+                if not isinstance(manifest, dict):
+                    raise UpgradeDeltaPackageError("Delta package manifest do not found")
+
+                if manifest["base_digest"] != base_digest:
+                    raise UpgradeDeltaPackageError("Base package mismatch")
+
+                with tarfile.open(output_part, "w:{}".format(fmt)) as output:
+                    for header in manifest["members"]:
+                        member = cls.__get_tarinfo(header)
+                        if not member.isfile():
+                            output.addfile(member)
+                            continue
+
+                        if not isinstance(header["sha256"], str) or not cls.SHA256_PATTERN.fullmatch(header["sha256"]):
+                            raise UpgradeDeltaPackageError("{!r} invalid sha256".format(member.name))
+
+                        blob = os.path.join(blob_dir, header["sha256"])
+                        if not os.path.isfile(blob) or os.path.getsize(blob) != member.size:
+                            raise UpgradeDeltaPackageError("{!r} missing, base package mismatch".format(member.name))
+
+                        with open(blob, "rb") as fp:
+                            output.addfile(member, fp)
+
+            # Verify rebuilt package as a whole
+            if cls.__scan(output_part)[1] != manifest["target_digest"]:
+                raise UpgradeDeltaPackageError("Rebuilt package verify failed")
+
+            os.replace(output_part, output_package)
+            return manifest
+        except (OSError, ValueError, KeyError, tarfile.TarError) as e:
+            raise UpgradeDeltaPackageError("Apply delta package failed: {}".format(e))
+        finally:
+            if os.path.isfile(output_part):
+                os.remove(output_part)
+
+
+# Framed protocol, newline delimited json, one request could query several software
+class UpgradeFramedProtocol(object):
+    QUERY_CMD = "QUERY"
+    FRAME_START = b"{"
+    FRAME_END = b"\n"
+    MAX_FRAME_SIZE = 64 * 1024
+
+    @classmethod
+    def encode(cls, frame: dict) -> bytes:
+        return json.dumps(frame, separators=(",", ":")).encode() + cls.FRAME_END
+
+    @staticmethod
+    def decode(frame: bytes) -> dict:
+        frame = json.loads(frame.decode())
+        if not isinstance(frame, dict):
+            raise ValueError("frame require {!r} not {!r}".format(dict.__name__, frame.__class__.__name__))
+
+        return frame
+
+    @classmethod
+    def query(cls, request_id: int, software: List[str], current: Dict[str, float] or None = None) -> bytes:
+        request = dict(id=request_id, cmd=cls.QUERY_CMD, software=software)
+        if current:
+            request["current"] = current
+
+        return cls.encode(request)
+
+    @classmethod
+    def reply(cls, frame: bytes, catalog: UpgradeVersionCatalog, file_server: str) -> bytes:
+        """Process a request frame
+
+        :param frame: request frame
+        :param catalog: software version catalog
+        :param file_server: file server address
+        :return: reply frame, {id, result: {software: {version, url, md5, size}}} or {id, error}, if request
+        carry current versions({software: version}) and delta package exist, result has delta: {base, url, md5, size}
+        """
+        request_id = None
+
+        try:
+            request = cls.decode(frame)
+            request_id = request.get("id")
+            software_list = request.get("software")
+            current = request.get("current") or dict()
+            if request.get("cmd") != cls.QUERY_CMD:
+                raise ValueError("unknown request: {}".format(request.get("cmd")))
+
+            if not isinstance(software_list, list) or not all(isinstance(x, str) for x in software_list):
+                raise ValueError("software require a list of str")
+
+            if not isinstance(current, dict):
+                raise ValueError("current require a dict of software version")
+
+            result = dict()
+            for software in software_list:
+                version, file_name, file_md5, file_size = catalog.get_newest(software)
+                result[software] = dict(version=version, url="", md5="", size=0) if version == 0.0 else \
+                    dict(version=version, url="{}/{}/{}".format(file_server, software, file_name),
+                         md5=file_md5, size=file_size)
+
+                delta = catalog.get_delta(software, current[software]) if software in current else None
+                if version and delta:
+                    result[software]["delta"] = dict(base=str2float(current[software]), md5=delta[1], size=delta[2],
+                                                     url="{}/{}/{}".format(file_server, software, delta[0]))
+
+            return cls.encode(dict(id=request_id, result=result))
+        except (ValueError, AttributeError) as e:
+            return cls.encode(dict(id=request_id, error="{}".format(e)))
+
+
+# Framed upgrade client, pipeline queries over one persistent connection
+class FramedUpgradeClient(object):
+    def __init__(self, addr: str, port: int, timeout: float = 3, retries: int = 3, backoff: float = 0.5):
+        """Framed upgrade client, connection is created when first used and reconnect if broken
+
+        :param addr: upgrade server address
+        :param port: upgrade server port
+        :param timeout: socket timeout
+        :param retries: reconnect retry times
+        :param backoff: reconnect backoff, sleep backoff * (2 ** retry) before retry
+        """
+        self.__addr = addr
+        self.__port = port
+        self.__timeout = timeout
+        self.__retries = max(retries, 0)
+        self.__backoff = backoff
+
+        self.__sock = None
+        self.__buffer = b""
+        self.__request_id = 0
+        self.__lock = threading.Lock()
+
+    def __del__(self):
+        self.close()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def is_connected(self) -> bool:
+        return self.__sock is not None
+
+    def connect(self) -> bool:
+        if self.__sock is not None:
+            return True
+
+        try:
+            self.__sock = socket.create_connection((self.__addr, self.__port), timeout=self.__timeout)
+            self.__buffer = b""
+            return True
+        except (TypeError, socket.error) as e:
+            print("Connect server:{}:{} error:{}".format(self.__addr, self.__port, e))
+            return False
+
+    def close(self):
+        if self.__sock is not None:
+            self.__sock.close()
+            self.__sock = None
+
+    def __read_frame(self) -> dict:
+        while UpgradeFramedProtocol.FRAME_END not in self.__buffer:
+            if len(self.__buffer) > UpgradeFramedProtocol.MAX_FRAME_SIZE:
+                raise ValueError("frame too large")
+
+            data = self.__sock.recv(UpgradeFramedProtocol.MAX_FRAME_SIZE)
+            if not data:
+                raise ConnectionError("connection closed by server")
+
+            self.__buffer += data
+
+        frame, self.__buffer = self.__buffer.split(UpgradeFramedProtocol.FRAME_END, 1)
+        return UpgradeFramedProtocol.decode(frame)
+
+    def __transact(self, batches: List[List[str]], current: Dict[str, float] or None) -> List[dict]:
+        # Send all requests at once, then collect replies by request id
+        requests_id = list()
+        for _ in batches:
+            self.__request_id += 1
+            requests_id.append(self.__request_id)
+
+        self.__sock.sendall(b"".join(UpgradeFramedProtocol.query(request_id, list(software), current)
+                                     for request_id, software in zip(requests_id, batches)))
+
+        replies = dict()
+        while len(replies) < len(requests_id):
+            reply = self.__read_frame()
+            if reply.get("id") in requests_id:
+                replies[reply.get("id")] = reply
+
+        result = list()
+        for request_id in requests_id:
+            if "error" in replies[request_id]:
+                print("Query error:{}".format(replies[request_id]["error"]))
+            result.append(replies[request_id].get("result", dict()))
+
+        return result
+
+    def query_pipelined(self, batches: List[List[str]], current: Dict[str, float] or None = None) -> List[dict]:
+        """Pipeline several query requests over connection, all of them cost one round trip
+
+        :param batches: software list of each request
+        :param current: software current version, {software: version}, for delta package query
+        :return: each request query result, {software: {version, url, md5, size, [delta]}}, empty dict if failed
+        """
+        with self.__lock:
+            for retry in range(self.__retries + 1):
+                if retry:
+                    time.sleep(self.__backoff * (2 ** (retry - 1)))
+
+                if not self.connect():
+                    continue
+
+                try:
+                    return self.__transact(batches, current)
+                except (socket.error, ValueError) as e:
+                    # Queries are idempotent, reconnect and resend
+                    print("Query error:{}, retry:{}".format(e, retry))
+                    self.close()
+
+            return [dict() for _ in batches]
+
+    def query(self, software: List[str], current: Dict[str, float] or None = None) -> dict:
+        """Query several software newest version in one round trip
+
+        :param software: software list
+        :param current: software current version, {software: version}, if delta package from current version to
+        newest version exist, result has delta: {base, url, md5, size}, see UpgradeDeltaPackage.apply
+        :return: {software: {version, url, md5, size, [delta]}}, empty dict if failed
+        """
+        return self.query_pipelined([software], current)[0]
+
+    def has_new_version(self, software: str, current_ver) -> bool:
+        info = self.query([software]).get(software, dict())
+        return str2float(info.get("version", 0.0)) > str2float(current_ver)
+
+    def get_new_version_info(self, software: str) -> Tuple[bool, str, str, str, int]:
+        """Get new version software information, same as UpgradeClient.get_new_version_info
+
+        :return: result(True or False), download url, file name, file md5, file size
+        """
+        info = self.query([software]).get(software, dict())
+        if not info.get("url"):
+            return False, "", "", "", 0
+
+        return True, info["url"], os.path.basename(info["url"]), info["md5"], info["size"]
+
+
 # Upgrade File server provide upgrade file download services
 class UpgradeFileServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     pass
@@ -151,10 +761,13 @@ class UpgradeServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     UPGRADE_PACKAGE_SUFFIX = ".tbz2"
     FILE_SERVER_ROOT = "upgrade_package_repo"
 
-    def __init__(self, upgrade_server_port=9999, file_server_port=8888, file_server_root=FILE_SERVER_ROOT):
+    def __init__(self, upgrade_server_port=9999, file_server_port=8888, file_server_root=FILE_SERVER_ROOT,
+                 check_interval=1.0):
         socketserver.TCPServer.__init__(self, ("0.0.0.0", upgrade_server_port), UpgradeServerHandler)
 
         # Init http file server
+        self.__file_server_root = os.path.abspath(file_server_root)
+        self.__catalog = UpgradeVersionCatalog(self.__file_server_root, self.UPGRADE_PACKAGE_SUFFIX, check_interval)
         if not self.__initHTTPFileServer(file_server_port, file_server_root):
             raise RuntimeError("Init upgrade http file server failed!")
 
@@ -194,11 +807,9 @@ class UpgradeServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
             if not os.path.isdir(root):
                 os.makedirs(root)
 
-            # Enter file server root
-            os.chdir(root)
-
-            # Create a file server instance
-            self.__httpd = UpgradeFileServer((self.getHostIPAddr(), port), http.server.SimpleHTTPRequestHandler)
+            # Create a file server instance serve files under root, do not change process work directory
+            handler = functools.partial(http.server.SimpleHTTPRequestHandler, directory=self.__file_server_root)
+            self.__httpd = UpgradeFileServer((self.getHostIPAddr(), port), handler)
 
             # Create a threading serve it
             th = threading.Thread(target=self.__httpd.serve_forever, name="Upgrade file server")
@@ -237,29 +848,25 @@ class UpgradeServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
     def get_file_server_address(self):
         return self.__file_server
 
+    def get_package_path(self, *paths: str) -> str:
+        """Get path under file server root
+
+        :param paths: path components relative to file server root
+        :return: absolute path
+        """
+        return os.path.join(self.__file_server_root, *paths)
+
+    @property
+    def catalog(self) -> UpgradeVersionCatalog:
+        return self.__catalog
+
     def get_newest_version(self, software):
         """Get newest software version
 
         :param software: software name
         :return: software newest version
         """
-
-        package_dir = software
-
-        # Do not have new
-        if not os.path.isdir(package_dir):
-            return 0.0
-
-        try:
-
-            # Get software upgrade package dir all upgrade files
-            file_list = [name for name in os.listdir(package_dir) if self.UPGRADE_PACKAGE_SUFFIX in name]
-            version_list = [str2float(os.path.splitext(name)[0]) for name in file_list]
-            newest_version = str2float(max(version_list))
-            return newest_version
-
-        except Exception as e:
-            return 0.0
+        return self.__catalog.get_newest(software)[0]
 
     def get_newest_version_durl(self, software):
         """Get newest software download address
@@ -270,38 +877,32 @@ class UpgradeServer(socketserver.ThreadingMixIn, socketserver.TCPServer):
 
         try:
 
-            file_md5 = ""
-
-            # First get software newest version
-            version = self.get_newest_version(software)
+            version, file_name, file_md5, file_size = self.__catalog.get_newest(software)
 
             if version == 0.0:
                 return "No new version to download"
 
-            # Get newest version download path
-            for name in [x for x in os.listdir(software) if self.UPGRADE_PACKAGE_SUFFIX in x]:
-                if str2float(os.path.splitext(name)[0]) == version:
-                    file_name = name
-                    break
-            else:
-                return "Do not found software:{0:s}, newest version:{1:f}".format(software, version)
-
-            local_file_path = software + "/" + file_name
-            download_url = self.__file_server + "/" + local_file_path
-
-            if os.path.isfile(local_file_path):
-                file_md5 = hashlib.md5(open(local_file_path, 'rb').read()).hexdigest()
-
-            return download_url + '#' + file_md5 + '#' + str(os.path.getsize(local_file_path))
+            download_url = self.__file_server + "/" + software + "/" + file_name
+            return download_url + '#' + file_md5 + '#' + str(file_size)
 
         except Exception as e:
-            return "Get software:{0:s} download url error:{1:s}".format(software, e)
+            return "Get software:{0:s} download url error:{1}".format(software, e)
 
 
 class UpgradeServerHandler(socketserver.BaseRequestHandler):
     # TCP handler
     def handle(self):
-        
+
+        try:
+            data = self.request.recv(128)
+        except socket.error as e:
+            print("Error:{}".format(e))
+            return
+
+        # Framed protocol request start with json object
+        if data.startswith(UpgradeFramedProtocol.FRAME_START):
+            return self.handle_framed(data)
+
         while True:
             try:
 
@@ -310,7 +911,7 @@ class UpgradeServerHandler(socketserver.BaseRequestHandler):
                     break
 
                 # Received data
-                data = self.request.recv(128).decode().strip().split(":")
+                data = data.decode().strip().split(":")
 
                 # Check request
                 if len(data) != 2:
@@ -327,15 +928,333 @@ class UpgradeServerHandler(socketserver.BaseRequestHandler):
                     self.request.sendall(str(self.server.get_newest_version(req_arg)).encode())
                 # Get newest version download url
                 elif request == NEW_VERSION_DURL_CMD:
-                    self.request.sendall(self.server.get_newest_version_durl(req_arg.encode()))
+                    self.request.sendall(self.server.get_newest_version_durl(req_arg).encode())
                 else:
                     self.request.sendall(b"Error:unknown request!")
+
+                data = self.request.recv(128)
             
             except Exception as e:
                 self.request.close()
                 print("Error:{}".format(e))
                 break
 
+    def handle_framed(self, buffer: bytes):
+        # Check server
+        if not isinstance(self.server, UpgradeServer):
+            return
+
+        try:
+            while True:
+                while UpgradeFramedProtocol.FRAME_END not in buffer:
+                    if len(buffer) > UpgradeFramedProtocol.MAX_FRAME_SIZE:
+                        return
+
+                    data = self.request.recv(UpgradeFramedProtocol.MAX_FRAME_SIZE)
+                    if not data:
+                        return
+
+                    buffer += data
+
+                # Pipelined requests, reply all of them at once
+                frames = buffer.split(UpgradeFramedProtocol.FRAME_END)
+                buffer = frames.pop()
+                self.request.sendall(b"".join(UpgradeFramedProtocol.reply(
+                    frame, self.server.catalog, self.server.get_file_server_address()) for frame in frames if frame))
+        except socket.error as e:
+            print("Error:{}".format(e))
+
+
+# Asyncio upgrade server, single thread serve both inquire service and file download service
+class AsyncUpgradeServer(object):
+    UPGRADE_PACKAGE_SUFFIX = UpgradeServer.UPGRADE_PACKAGE_SUFFIX
+    FILE_SERVER_ROOT = UpgradeServer.FILE_SERVER_ROOT
+    MAX_HEADER_SIZE = 64 * 1024
+    INQUIRE_TIMEOUT = 60
+    HTTP_TIMEOUT = 30
+
+    def __init__(self, upgrade_server_port=9999, file_server_port=8888, file_server_root=FILE_SERVER_ROOT,
+                 max_connections=4096, check_interval=1.0, host="0.0.0.0"):
+        """Asyncio upgrade server, speak the same protocol as UpgradeServer
+
+        :param upgrade_server_port: inquire server port
+        :param file_server_port: http file server port
+        :param file_server_root: upgrade package root
+        :param max_connections: maximum concurrent served connections(inquire and http), exceeded connections wait
+        :param check_interval: catalog check interval
+        :param host: listen address
+        """
+        self.__host = host
+        self.__upgrade_server_port = upgrade_server_port
+        self.__file_server_port = file_server_port
+        self.__max_connections = max_connections
+        self.__file_server_root = os.path.abspath(file_server_root)
+        self.__catalog = UpgradeVersionCatalog(self.__file_server_root, self.UPGRADE_PACKAGE_SUFFIX, check_interval)
+
+        if not os.path.isdir(self.__file_server_root):
+            os.makedirs(self.__file_server_root)
+
+        self.__loop = None
+        self.__thread = None
+        self.__servers = list()
+        self.__started = threading.Event()
+        self.__file_server = ""
+
+    @property
+    def catalog(self) -> UpgradeVersionCatalog:
+        return self.__catalog
+
+    @property
+    def server_address(self) -> Tuple[str, int]:
+        return self.__servers[0].sockets[0].getsockname()[:2] if self.__servers else (self.__host, 0)
+
+    def get_file_server_address(self):
+        return self.__file_server
+
+    def get_newest_version(self, software):
+        return self.__catalog.get_newest(software)[0]
+
+    def get_newest_version_durl(self, software):
+        version, file_name, file_md5, file_size = self.__catalog.get_newest(software)
+        if version == 0.0:
+            return "No new version to download"
+
+        return "{}/{}/{}#{}#{}".format(self.__file_server, software, file_name, file_md5, file_size)
+
+    def start(self, timeout: float = 5.0) -> bool:
+        """Start server in a background thread
+
+        :param timeout: wait server start timeout
+        :return: success return True
+        """
+        if self.__thread and self.__thread.is_alive():
+            return True
+
+        self.__started.clear()
+        self.__thread = threading.Thread(target=self.serve_forever, name="Async upgrade server")
+        self.__thread.setDaemon(True)
+        self.__thread.start()
+        return self.__started.wait(timeout) and bool(self.__servers)
+
+    def stop(self):
+        if self.__loop and self.__loop.is_running():
+            for server in self.__servers:
+                self.__loop.call_soon_threadsafe(server.close)
+
+        if self.__thread and self.__thread is not threading.current_thread():
+            self.__thread.join()
+
+    def serve_forever(self):
+        """Run server in current thread until stop"""
+        try:
+            asyncio.run(self.__serve())
+        except Exception as e:
+            print("Async upgrade server error:{}".format(e))
+        finally:
+            self.__servers = list()
+            self.__started.set()
+
+    async def __serve(self):
+        self.__loop = asyncio.get_running_loop()
+        semaphore = asyncio.Semaphore(self.__max_connections)
+        connections = dict()
+
+        def limited(handler):
+            async def wrapper(reader, writer):
+                connections[asyncio.current_task()] = writer
+                try:
+                    async with semaphore:
+                        await handler(reader, writer)
+                except (OSError, asyncio.IncompleteReadError, asyncio.LimitOverrunError, asyncio.TimeoutError):
+                    pass
+                finally:
+                    writer.close()
+                    connections.pop(asyncio.current_task(), None)
+
+            return wrapper
+
+        try:
+            inquire = await asyncio.start_server(limited(self.__handle_inquire),
+                                                 self.__host, self.__upgrade_server_port, backlog=1024)
+            http_server = await asyncio.start_server(limited(self.__handle_http), self.__host,
+                                                     self.__file_server_port, backlog=1024,
+                                                     limit=self.MAX_HEADER_SIZE)
+        except OSError as e:
+            print("Init async upgrade server error:{}".format(e))
+            return
+
+        self.__servers = [inquire, http_server]
+        host = UpgradeServer.getHostIPAddr() if self.__host == "0.0.0.0" else self.__host
+        self.__file_server = "http://{0:s}:{1:d}".format(host, http_server.sockets[0].getsockname()[1])
+        self.__started.set()
+
+        async with inquire, http_server:
+            await asyncio.gather(inquire.serve_forever(), http_server.serve_forever(), return_exceptions=True)
+
+            # Server stopped, close alive connections and wait handlers exit
+            for writer in list(connections.values()):
+                writer.transport.abort()
+
+            await asyncio.gather(*connections.keys(), return_exceptions=True)
+
+    async def __handle_inquire(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        data = await asyncio.wait_for(reader.read(128), self.INQUIRE_TIMEOUT)
+
+        # Framed protocol request start with json object
+        if data.startswith(UpgradeFramedProtocol.FRAME_START):
+            return await self.__handle_framed(data, reader, writer)
+
+        while True:
+            data = data.decode(errors="ignore").strip().split(":")
+
+            if len(data) != 2:
+                writer.write(b"Error:unknown request, request format error!")
+                await writer.drain()
+                break
+
+            request, req_arg = data[0].upper(), data[1]
+            if request == NEW_VERSION_CHECK_CMD:
+                writer.write(str(self.get_newest_version(req_arg)).encode())
+            elif request == NEW_VERSION_DURL_CMD:
+                writer.write(self.get_newest_version_durl(req_arg).encode())
+            else:
+                writer.write(b"Error:unknown request!")
+
+            await writer.drain()
+            data = await asyncio.wait_for(reader.read(128), self.INQUIRE_TIMEOUT)
+
+    async def __handle_framed(self, buffer: bytes, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        while True:
+            while UpgradeFramedProtocol.FRAME_END not in buffer:
+                if len(buffer) > UpgradeFramedProtocol.MAX_FRAME_SIZE:
+                    return
+
+                data = await asyncio.wait_for(reader.read(UpgradeFramedProtocol.MAX_FRAME_SIZE), self.INQUIRE_TIMEOUT)
+                if not data:
+                    return
+
+                buffer += data
+
+            # Pipelined requests, reply all of them at once
+            frames = buffer.split(UpgradeFramedProtocol.FRAME_END)
+            buffer = frames.pop()
+            writer.write(b"".join(UpgradeFramedProtocol.reply(frame, self.__catalog, self.__file_server)
+                                  for frame in frames if frame))
+            await writer.drain()
+
+    @staticmethod
+    def parse_range(header: str, size: int) -> Tuple[int, int] or None:
+        """Parse http single byte range
+
+        :param header: Range header
+        :param size: file size
+        :return: (start, end) inclusive, None if header is invalid or multi ranges(serve whole file)
+        :raise: ValueError if range is not satisfiable
+        """
+        match = re.fullmatch(r"bytes=(\d*)-(\d*)", header.strip())
+        if not match or not any(match.groups()):
+            return None
+
+        start, end = match.groups()
+        if not start:
+            # Suffix range of an empty file is not satisfiable either
+            length = int(end)
+            if not length or not size:
+                raise ValueError("Range not satisfiable")
+            return max(size - length, 0), size - 1
+
+        start, end = int(start), min(int(end) if end else size - 1, size - 1)
+        if start >= size or start > end:
+            raise ValueError("Range not satisfiable")
+
+        return start, end
+
+    def __get_file_path(self, target: str) -> str:
+        path = urllib.parse.unquote(urllib.parse.urlsplit(target).path)
+        path = os.path.normpath(os.path.join(self.__file_server_root, path.lstrip("/")))
+        return path if path.startswith(self.__file_server_root + os.sep) and os.path.isfile(path) else ""
+
+    @staticmethod
+    async def __send_response(writer: asyncio.StreamWriter, status: int, reason: str, headers: List[Tuple[str, str]]):
+        lines = ["HTTP/1.1 {} {}".format(status, reason), "Server: AsyncUpgradeServer",
+                 "Date: {}".format(email.utils.formatdate(usegmt=True))]
+        lines.extend("{}: {}".format(key, value) for key, value in headers)
+        writer.write(("\r\n".join(lines) + "\r\n\r\n").encode("latin-1"))
+        await writer.drain()
+
+    async def __handle_http(self, reader: asyncio.StreamReader, writer: asyncio.StreamWriter):
+        loop = asyncio.get_running_loop()
+
+        while True:
+            try:
+                head = await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), self.HTTP_TIMEOUT)
+            except asyncio.IncompleteReadError:
+                break
+
+            lines = head.decode("latin-1").split("\r\n")
+            try:
+                method, target, version = lines[0].split()
+            except ValueError:
+                await self.__send_response(writer, 400, "Bad Request", [("Content-Length", "0"),
+                                                                        ("Connection", "close")])
+                break
+
+            headers = dict()
+            for line in lines[1:]:
+                key, _, value = line.partition(":")
+                if key:
+                    headers[key.strip().lower()] = value.strip()
+
+            connection = headers.get("connection", "").lower()
+            keep_alive = connection == "keep-alive" if version == "HTTP/1.0" else connection != "close"
+            connection = [("Connection", "keep-alive" if keep_alive else "close")]
+
+            if method not in ("GET", "HEAD"):
+                await self.__send_response(writer, 501, "Not Implemented", [("Content-Length", "0")] + connection)
+                if not keep_alive:
+                    break
+                continue
+
+            path = self.__get_file_path(target)
+            if not path:
+                await self.__send_response(writer, 404, "Not Found", [("Content-Length", "0")] + connection)
+                if not keep_alive:
+                    break
+                continue
+
+            with open(path, "rb") as fp:
+                st = os.fstat(fp.fileno())
+                size = st.st_size
+                common = [("Content-Type", mimetypes.guess_type(path)[0] or "application/octet-stream"),
+                          ("Accept-Ranges", "bytes"),
+                          ("Last-Modified", email.utils.formatdate(st.st_mtime, usegmt=True))] + connection
+
+                try:
+                    byte_range = self.parse_range(headers["range"], size) if "range" in headers else None
+                except ValueError:
+                    await self.__send_response(writer, 416, "Range Not Satisfiable",
+                                               [("Content-Range", "bytes */{}".format(size)),
+                                                ("Content-Length", "0")] + connection)
+                    if not keep_alive:
+                        break
+                    continue
+
+                if byte_range:
+                    start, end = byte_range
+                    await self.__send_response(writer, 206, "Partial Content",
+                                               common + [("Content-Range", "bytes {}-{}/{}".format(start, end, size)),
+                                                         ("Content-Length", str(end - start + 1))])
+                else:
+                    start, end = 0, size - 1
+                    await self.__send_response(writer, 200, "OK", common + [("Content-Length", str(size))])
+
+                # Zero-copy send file, asyncio fallback to read and send if sendfile is not available
+                if method == "GET" and end >= start:
+                    await loop.sendfile(writer.transport, fp, start, end - start + 1)
+
+            if not keep_alive:
+                break
+
 
 class GogsSoftwareReleaseDesc(JsonSettings):
     _default_path = "release.json"
@@ -373,16 +1292,64 @@ class GogsSoftwareReleaseDesc(JsonSettings):
             return True
 
 
+class GogsSoftwareDeltaDesc(JsonSettings):
+    _default_path = "deltas.json"
+    _properties = {'version', 'deltas'}
+
+    @classmethod
+    def default(cls):
+        return GogsSoftwareDeltaDesc(version=0.0, deltas=list())
+
+    def get_delta(self, base_version: float) -> dict or None:
+        """Get delta package desc
+
+        :param base_version: base version
+        :return: dict(base, name, md5, size) or None
+        """
+        for delta in self.deltas:
+            if str2float(delta.get("base")) == str2float(base_version):
+                return delta
+
+        return None
+
+    @classmethod
+    def generate(cls, path: str, version: float, bases: List[Tuple[str, float]]) -> bool:
+        """
+        Generate #path specified software delta packages from each base version and delta desc, upload them
+        as release attachments alongside release desc
+        :param path: software path
+        :param version: software version
+        :param bases: base software path and version list
+        :return: success return True
+        """
+        try:
+            deltas = list()
+            for base_path, base_version in bases:
+                name = UpgradeDeltaPackage.get_name(base_version, version)
+                delta_path = os.path.join(os.path.dirname(path), name)
+                UpgradeDeltaPackage.generate(base_path, path, delta_path)
+                deltas.append(dict(base=base_version, name=name, size=os.path.getsize(delta_path),
+                                   md5=UpgradeVersionCatalog.calc_file_md5(delta_path)))
+
+            desc = GogsSoftwareDeltaDesc(version=version, deltas=deltas)
+            return desc.save(os.path.join(os.path.dirname(path), GogsSoftwareDeltaDesc.file_path()))
+        except (OSError, UpgradeDeltaPackageError) as e:
+            print("Generate {!r} delta desc failed: {}".format(path, e))
+            return False
+
+
 class GogsUpgradeClientDownloadError(Exception):
     pass
 
 
 class GogsUpgradeClient(object):
     DESC_FILE = GogsSoftwareReleaseDesc.file_path()
+    DELTA_DESC_FILE = GogsSoftwareDeltaDesc.file_path()
 
     def __init__(self, server: str, repo: str, username="", password=""):
         self._repo = repo
         self._server = server
+        self._attachments = dict()
         self._gogs_client = GogsRequest(server, username, password)
 
     def get_releases(self) -> List[GogsSoftwareReleaseDesc]:
@@ -406,6 +1373,7 @@ class GogsUpgradeClient(object):
                 desc.update(DynamicObject(url=release.get_attachment_url(desc.name)))
 
                 release_list.append(desc)
+                self._attachments[desc.url] = release.attachment
             except (IndexError, ValueError, AttributeError, DynamicObjectEncodeError) as e:
                 print("{!r} get_releases error {}".format(self.__class__.__name__, e))
                 continue
@@ -417,8 +1385,66 @@ class GogsUpgradeClient(object):
         releases = sorted(releases, key=lambda x: x.version, reverse=True)
         return releases[0] if releases else None
 
+    def download_delta(self, release: GogsSoftwareReleaseDesc, path: str,
+                       current_version: float, current_package: str,
+                       callback: Callable[[float, str], bool] or None = None) -> bool:
+        """
+        Download delta package from current version to release version and rebuild release package
+        :param release: software release desc
+        :param path: download path
+        :param current_version: current software version
+        :param current_package: current software package
+        :param callback: download progress callback
+        :return: success return True, release package is rebuilt as path/release.name
+        """
+        attachments = self._attachments.get(release.url, dict())
+        if self.DELTA_DESC_FILE not in attachments or not os.path.isfile(current_package):
+            return False
+
+        try:
+            response = self._gogs_client.section_get(attachments[self.DELTA_DESC_FILE])
+            if not GogsRequest.is_response_ok(response):
+                return False
+
+            desc = GogsSoftwareDeltaDesc.default()
+            desc.update(json.loads(response.content))
+            delta = desc.get_delta(current_version)
+            if str2float(desc.version) != str2float(release.version) or not delta or delta["name"] not in attachments:
+                return False
+
+            fmt = UpgradeDeltaPackage.get_format(release.name)
+            delta_path = os.path.join(path, delta["name"])
+            if not self._gogs_client.stream_download(delta_path, attachments[delta["name"]], delta["size"],
+                                                     callback=callback, md5=delta["md5"]):
+                return False
+
+            try:
+                # Delta must be generated from this release package
+                manifest = UpgradeDeltaPackage.apply(current_package, delta_path, os.path.join(path, release.name), fmt)
+                if manifest["target"] != release.md5:
+                    os.remove(os.path.join(path, release.name))
+                    return False
+
+                return True
+            finally:
+                os.remove(delta_path)
+        except (OSError, KeyError, ValueError, DynamicObjectEncodeError, UpgradeDeltaPackageError) as e:
+            print("{!r} download delta error {}".format(self.__class__.__name__, e))
+            return False
+
     def download_release(self, release: GogsSoftwareReleaseDesc, path: str,
-                         callback: Callable[[float, str], bool] or None = None) -> bool:
+                         callback: Callable[[float, str], bool] or None = None,
+                         current_version: float = 0.0, current_package: str = "") -> bool:
+        """
+        Download software release, if current package is specified and delta package from current version exist,
+        download delta package instead of full package, fallback to full package if failed
+        :param release: software release desc
+        :param path: download path
+        :param callback: download progress callback
+        :param current_version: current software version
+        :param current_package: current software package path
+        :return: success return True
+        """
         if not isinstance(release, GogsSoftwareReleaseDesc) or not release.check():
             raise GogsUpgradeClientDownloadError("Invalid software release desc")
 
@@ -428,6 +1454,10 @@ class GogsUpgradeClient(object):
         except OSError as e:
             raise GogsUpgradeClientDownloadError("Create download directory failed: {}".format(e))
 
+        # Delta rebuilt package is verified by content digest, it's md5 is different from release md5
+        if current_package and self.download_delta(release, path, current_version, current_package, callback):
+            return True
+
         download_path = os.path.join(path, release.name)
         if not self._gogs_client.stream_download(download_path, release.url, release.size, callback=callback):
             return False
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import timeit
+from framework.protocol import crc16 as crc
+
+# Original module private tables
+LEGACY_TABLE_HI = vars(crc)['__CRC_TABLE_HI']
+LEGACY_TABLE_LOW = vars(crc)['__CRC_TABLE_LOW']
+
+
+def legacy_crc16(data):
+    crc_hi = 0xff
+    crc_low = 0xff
+    for byte in data:
+        index = crc_low ^ byte
+        crc_low = crc_hi ^ LEGACY_TABLE_HI[index]
+        crc_hi = LEGACY_TABLE_LOW[index]
+
+    return (crc_hi << 8 | crc_low) & 0xffff
+
+
+def legacy_crc16_ibm(data):
+    checksum = 0x0
+    for byte in data:
+        for i in range(8):
+            if (checksum ^ byte) & 0x1:
+                checksum = (checksum >> 1) ^ 0xA001
+            else:
+                checksum = checksum >> 1
+
+            byte = byte >> 1
+
+    return checksum
+
+
+def benchmark(name, legacy, current, data, number):
+    if legacy(data) != current(data):
+        raise AssertionError("{}: result mismatch".format(name))
+
+    legacy_time = timeit.timeit(lambda: legacy(data), number=number) / number
+    current_time = timeit.timeit(lambda: current(data), number=number) / number
+    print("{:<24s} legacy: {:9.3f}ms current: {:9.3f}ms speedup: {:6.1f}x".format(
+        name, legacy_time * 1000, current_time * 1000, legacy_time / current_time))
+
+
+if __name__ == "__main__":
+    print("numpy: {}".format("enabled" if crc.numpy is not None else "disabled"))
+    frame = os.urandom(132)
+    firmware = os.urandom(int(sys.argv[1]) if len(sys.argv) > 1 else 4 * 1024 * 1024)
+    frames = [os.urandom(132) for _ in range(10000)]
+
+    benchmark("crc16 frame(132B)", legacy_crc16, crc.crc16, frame, 10000)
+    benchmark("crc16 firmware", legacy_crc16, crc.crc16, firmware, 3)
+    benchmark("crc16IBM firmware", legacy_crc16_ibm, crc.crc16IBM, firmware[:256 * 1024], 3)
+    benchmark("crc16 batch(10000x132B)",
+              lambda x: [legacy_crc16(frame) for frame in x], crc.crc16_batch, frames, 3)
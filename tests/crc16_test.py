@@ -1,4 +1,5 @@
 # -*- coding: utf-8 -*-
+import os
 import ctypes
 import struct
 import unittest
@@ -23,6 +24,36 @@ class CRC16Test(unittest.TestCase):
         with self.assertRaises(TypeError):
             crc.crc16(123)
 
+    def testIBM(self):
+        self.assertEqual(crc.crc16IBM(b"123456789"), 0xbb3d)
+        self.assertEqual(crc.crc16IBM(b"123456789"), crc.Crc16(b"123456789", init=crc.CRC16_IBM_INIT).digest())
+
+    def testLargeBuffer(self):
+        data = os.urandom(1024 * 1024 + 3)
+        reference = crc.CRC16_MODBUS_INIT
+        for byte in data:
+            reference = (reference >> 8) ^ crc._CRC_TABLE[(reference ^ byte) & 0xff]
+
+        self.assertEqual(crc.crc16(data), reference)
+        self.assertEqual(crc.crc16(bytearray(data)), reference)
+        self.assertEqual(crc.crc16(memoryview(data)[1:]), crc.crc16(data[1:]))
+
+    def testIncremental(self):
+        data = os.urandom(4099)
+        checksum = crc.Crc16()
+        for offset in range(0, len(data), 333):
+            checksum.update(data[offset:offset + 333])
+
+        self.assertEqual(checksum.digest(), crc.crc16(data))
+        self.assertEqual(checksum.copy().digest(), checksum.digest())
+        checksum.reset()
+        self.assertEqual(checksum.digest(), crc.CRC16_MODBUS_INIT)
+
+    def testBatch(self):
+        frames = [os.urandom(132) for _ in range(100)] + [b"amaork0123456789", b""]
+        self.assertEqual(crc.crc16_batch(frames), [crc.crc16(frame) for frame in frames])
+        self.assertEqual(crc.crc16_batch(frames, init=crc.CRC16_IBM_INIT), [crc.crc16IBM(frame) for frame in frames])
+
 
 if __name__ == "__main__":
     unittest.main()
@@ -0,0 +1,65 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import tempfile
+from framework.core.database import SQLiteDatabase
+
+
+COLUMNS = [
+    ("id", "INTEGER", False, None, True),
+    ("timestamp", "REAL", False, None, False),
+    ("name", "TEXT", True, None, False),
+    ("value", "REAL", True, None, False),
+]
+
+
+def create_database(**kwargs):
+    fd, path = tempfile.mkstemp(suffix=".db")
+    os.close(fd)
+    db = SQLiteDatabase(path, **kwargs)
+    db.createTable("measurement", COLUMNS)
+    return db, path
+
+
+def remove_database(db, path):
+    db.raw_connect.close()
+    for suffix in ("", "-wal", "-shm"):
+        if os.path.isfile(path + suffix):
+            os.remove(path + suffix)
+
+
+def benchmark(name, count, insert, **kwargs):
+    db, path = create_database(**kwargs)
+    records = [(i, time.time(), "channel{}".format(i % 16), i * 0.1) for i in range(count)]
+    try:
+        start = time.perf_counter()
+        insert(db, records)
+        elapsed = time.perf_counter() - start
+        print("{:<36s} {:8d} rows {:8.3f}s {:12.0f} rows/s".format(name, count, elapsed, count / elapsed))
+    finally:
+        remove_database(db, path)
+
+
+def per_row(db, records):
+    for record in records:
+        db.insertRecord("measurement", record)
+
+
+def bulk(db, records):
+    db.insertRecords("measurement", records)
+
+
+def grouped(db, records):
+    with db.transaction():
+        for record in records:
+            db.insertRecord("measurement", record)
+
+
+if __name__ == "__main__":
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 100000
+    benchmark("insertRecord(per row commit)", min(rows, 2000), per_row)
+    benchmark("insertRecord(WAL, per row commit)", min(rows, 2000), per_row, journal_mode="WAL", synchronous="NORMAL")
+    benchmark("insertRecord in transaction()", rows, grouped)
+    benchmark("insertRecords", rows, bulk)
+    benchmark("insertRecords(WAL)", rows, bulk, journal_mode="WAL", synchronous="NORMAL", cache_size=-16384)
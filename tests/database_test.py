@@ -0,0 +1,270 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import tempfile
+import unittest
+import threading
+from framework.core.database import SQLiteDatabase, SQLiteDatabaseError, SQLiteConnectionPool, \
+    SQLiteUserPasswordDatabase
+
+
+class SQLiteDatabaseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        fd, self.path = tempfile.mkstemp(suffix=".db")
+        os.close(fd)
+        self.db = SQLiteDatabase(self.path)
+        self.db.createTable("record", [
+            ("id", "INTEGER", False, None, True),
+            ("name", "TEXT", True, None, False),
+            ("value", "REAL", True, None, False),
+            ("raw", "BLOB", True, None, False),
+        ])
+
+    def tearDown(self) -> None:
+        self.db.raw_connect.close()
+        for suffix in ("", "-wal", "-shm"):
+            if os.path.isfile(self.path + suffix):
+                os.remove(self.path + suffix)
+
+    def testInsertRecord(self):
+        self.db.insertRecord("record", [1, 'quote "name"', 1.5, b"\x00\x01"])
+        self.db.insertRecord("record", (2, None, 2, None))
+        self.assertEqual(self.db.selectRecord("record"), [(1, 'quote "name"', 1.5, b"\x00\x01"), (2, None, 2.0, None)])
+
+        with self.assertRaises(TypeError):
+            self.db.insertRecord("record", 1)
+
+        with self.assertRaises(ValueError):
+            self.db.insertRecord("record", [3, "name"])
+
+        with self.assertRaises(SQLiteDatabaseError):
+            self.db.insertRecord("record", [1, "duplicate", 0.0, b""])
+
+    def testUpdateRecord(self):
+        self.db.insertRecord("record", [1, "name", 1.5, b""])
+        self.db.updateRecord("record", {"name": "it's", "raw": b"\xff"}, "id = 1")
+        self.assertEqual(self.db.selectRecord("record", ["name", "raw"]), [("it's", b"\xff")])
+
+        self.db.updateRecord("record", [1, "new", 3.0, b""])
+        self.assertEqual(self.db.selectRecord("record", ["name", "value"]), [("new", 3.0)])
+
+        with self.assertRaises(SQLiteDatabaseError):
+            self.db.updateRecord("record", {"unknown": 1})
+
+    def testSchemaCache(self):
+        self.assertEqual(self.db.getColumnList("record"), ["id", "name", "value", "raw"])
+        self.assertEqual(self.db.getTablePrimaryKey("record"), (0, "id", "INTEGER"))
+
+        self.db.rawExecute("ALTER TABLE record ADD COLUMN note TEXT")
+        self.assertEqual(self.db.getColumnList("record"), ["id", "name", "value", "raw", "note"])
+        self.db.insertRecord("record", [1, "name", 1.5, b"", "note"])
+        self.assertEqual(self.db.selectRecord("record", ["note"]), [("note",)])
+
+        # Multi-line DDL
+        self.db.rawExecute("\n  ALTER\n\tTABLE record\n  ADD COLUMN extra INTEGER")
+        self.assertEqual(self.db.getColumnList("record"), ["id", "name", "value", "raw", "note", "extra"])
+        self.db.insertRecord("record", [2, "name", 1.5, b"", "note", 2])
+        self.assertEqual(self.db.selectRecord("record", ["extra"], "id = 2"), [(2,)])
+        self.assertTrue(SQLiteDatabase.isDDLStatement("CREATE\nTABLE x (id INTEGER)"))
+        self.assertFalse(SQLiteDatabase.isDDLStatement("  \n"))
+        self.assertFalse(SQLiteDatabase.isDDLStatement("SELECT * FROM record"))
+
+        self.assertEqual(self.db.getColumnList("new_table"), [])
+        self.db.createTable("new_table", [("id", "INTEGER", False, None, True)])
+        self.assertEqual(self.db.getColumnList("new_table"), ["id"])
+
+    def testBulkRecords(self):
+        self.assertEqual(self.db.insertRecords("record", ([i, str(i), i / 2, b""] for i in range(100))), 100)
+        self.assertEqual(len(self.db.selectRecord("record")), 100)
+
+        with self.assertRaises(SQLiteDatabaseError):
+            self.db.insertRecords("record", [[100, "100", 0.0, b""], [101, "101"]])
+        with self.assertRaises(SQLiteDatabaseError):
+            self.db.insertRecords("record", [[100, "100", 0.0, b""], "101"])
+        self.assertEqual(len(self.db.selectRecord("record")), 100)
+
+        self.assertEqual(self.db.updateRecords("record", [{"id": i, "name": "new"} for i in range(10)]), 10)
+        self.assertEqual(self.db.updateRecords("record", [(i, "full", 0.0, b"") for i in range(10, 20)]), 10)
+        self.assertEqual(self.db.updateRecords("record", [{"name": "new", "value": 1.0}], key="name"), 10)
+        self.assertEqual(self.db.selectRecord("record", ["count(*)"], "name = 'new' AND value = 1.0"), [(10,)])
+        self.assertEqual(self.db.selectRecord("record", ["count(*)"], "name = 'full'"), [(10,)])
+
+        with self.assertRaises(SQLiteDatabaseError):
+            self.db.updateRecords("record", [{"id": 1, "name": "1"}, {"id": 2, "value": 2.0}])
+
+    def testTransaction(self):
+        with self.db.transaction():
+            self.db.insertRecord("record", [1, "1", 1.0, b""])
+            with self.db.transaction():
+                self.db.insertRecord("record", [2, "2", 2.0, b""])
+
+        with self.assertRaises(RuntimeError):
+            with self.db.transaction():
+                self.db.deleteRecord("record", "id = 1")
+                self.db.updateRecord("record", {"name": "rollback"}, "id = 2")
+                raise RuntimeError("rollback")
+
+        self.assertEqual(self.db.selectRecord("record", ["name"]), [("1",), ("2",)])
+
+    def testPragmas(self):
+        self.db.raw_connect.close()
+        self.db = SQLiteDatabase(self.path, journal_mode="WAL", synchronous="NORMAL", cache_size=-4096)
+        self.assertEqual(self.db.rawExecute("PRAGMA journal_mode"), [("wal",)])
+        self.assertEqual(self.db.rawExecute("PRAGMA synchronous"), [(1,)])
+        self.assertEqual(self.db.rawExecute("PRAGMA cache_size"), [(-4096,)])
+
+        with self.assertRaises(ValueError):
+            SQLiteDatabase(self.path, journal_mode="UNKNOWN")
+
+    def testIterRecords(self):
+        self.db.insertRecords("record", ([i, "name{}".format(i % 3), i / 2, b""] for i in range(1000)))
+        self.assertEqual(list(self.db.iterRecords("record", arraysize=7)), self.db.selectRecord("record"))
+        self.assertEqual(list(self.db.iterTableData("record")), self.db.getTableData("record"))
+        self.assertEqual(list(self.db.iterTableData("unknown")), [])
+
+        rows = self.db.iterRecords("record", ["max(id) AS id", "count(*)"], "name = 'name1'",
+                                   row_factory=SQLiteDatabase.namedTupleRowFactory)
+        row = next(rows)
+        self.assertEqual((row.id, row[1]), (997, 333))
+
+        with self.assertRaises(SQLiteDatabaseError):
+            self.db.iterRecords("unknown")
+
+    def testPagination(self):
+        self.db.insertRecords("record", ([i, "name{}".format(i % 3), i / 2, b""] for i in range(100)))
+        self.assertEqual(self.db.selectPage("record", 2, 30, ["id"]), [(i,) for i in range(60, 90)])
+        self.assertEqual(self.db.selectPage("record", 4, 30), [])
+
+        pages = list(self.db.iterPages("record", 30, columns=["name", "id"], condition="name != 'name0'",
+                                       row_factory=SQLiteDatabase.namedTupleRowFactory))
+        self.assertEqual([len(page) for page in pages], [30, 30, 6])
+        self.assertEqual([row.id for page in pages for row in page], [i for i in range(100) if i % 3])
+        self.assertEqual(sum(len(page) for page in self.db.iterPages("record", 10)), 100)
+
+        with self.assertRaises(SQLiteDatabaseError):
+            self.db.iterPages("record", 10, columns=["name"])
+
+    def testConnectionPool(self):
+        with SQLiteConnectionPool(self.path, size=3) as pool:
+            # Assertion inside worker threads never fail the test, collect results and check in main thread
+            results, errors = list(), list()
+
+            def collect(func):
+                def wrapper(*args):
+                    try:
+                        func(*args)
+                    except Exception as error:
+                        errors.append(error)
+
+                return wrapper
+
+            @collect
+            def write(start):
+                for i in range(start, start + 50):
+                    with pool.writer() as db:
+                        db.insertRecord("record", [i, str(i), 0.0, b""])
+                        with pool.reader() as reader:
+                            results.append(("writer nested reader", reader is db))
+
+            @collect
+            def read():
+                for _ in range(50):
+                    with pool.reader() as db:
+                        with pool.reader() as nested:
+                            results.append(("reader nested reader", db is nested))
+                        db.selectRecord("record", ["count(*)"])
+
+                        try:
+                            db.insertRecord("record", [-1, "", 0.0, b""])
+                            results.append(("reader readonly", False))
+                        except SQLiteDatabaseError:
+                            results.append(("reader readonly", True))
+
+            threads = [threading.Thread(target=write, args=(i * 50,)) for i in range(2)]
+            threads.extend(threading.Thread(target=read) for _ in range(6))
+            for thread in threads:
+                thread.start()
+
+            for thread in threads:
+                thread.join()
+
+            self.assertEqual(errors, [])
+            self.assertEqual(len(results), 100 + 6 * 50 * 2)
+            self.assertEqual([name for name, success in results if not success], [])
+
+            with pool.reader() as db:
+                self.assertEqual(db.selectRecord("record", ["count(*)"]), [(100,)])
+
+            statistics = pool.statistics()
+            self.assertLessEqual(statistics["connections"], 4)
+            self.assertEqual(statistics["writer_acquire"], 100)
+            self.assertEqual(statistics["reader_acquire"], 301)
+            self.assertGreater(sum(statistics["queries"]), 400)
+
+    def testConnectionPoolCreateError(self):
+        with SQLiteConnectionPool(self.path, size=2, timeout=1) as pool:
+            create = pool._createDatabase
+
+            def failed_create(**kwargs):
+                raise SQLiteDatabaseError("unable to open database file")
+
+            # Failed creation give back it's slot, never wait for a reader which do not exist
+            pool._createDatabase = failed_create
+            for _ in range(pool.size + 1):
+                start = time.perf_counter()
+                with self.assertRaisesRegex(SQLiteDatabaseError, "unable to open"):
+                    with pool.reader():
+                        pass
+                self.assertLess(time.perf_counter() - start, 0.5)
+
+            pool._createDatabase = create
+            with pool.reader() as db:
+                self.assertEqual(db.selectRecord("record", ["count(*)"]), [(0,)])
+
+
+class SQLiteUserPasswordDatabaseTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.dir.name, "cipher.db")
+        SQLiteUserPasswordDatabase.create_database(self.path)
+        self.db = SQLiteUserPasswordDatabase(path=self.path)
+
+    def tearDown(self) -> None:
+        self.db.db.raw_connect.close()
+        self.dir.cleanup()
+
+    def testUser(self):
+        for user in ("admin", "operator", "guest"):
+            self.db.addUser(user, self.db.generateC1(user.encode()), desc=user.upper())
+
+        self.assertEqual(self.db.getUserList(), ["admin", "operator", "guest"])
+        self.assertEqual(self.db.getCipherLevel("guest"), (7, 8, 9))
+        self.assertEqual(self.db.getUserDescriptor("operator"), "OPERATOR")
+        self.assertTrue(self.db.checkPassword("operator", self.db.generateC1(b"operator")))
+        self.assertFalse(self.db.checkPassword("operator", self.db.generateC1(b"admin")))
+
+        self.db.updatePassword("operator", self.db.generateC1(b"new"))
+        self.assertTrue(self.db.checkPassword("operator", self.db.generateC1(b"new")))
+
+        self.db.deleteUser("guest")
+        self.assertEqual(self.db.getUserList(), ["admin", "operator"])
+        with self.assertRaises(RuntimeError):
+            self.db.checkPassword("guest", self.db.generateC1(b"guest"))
+
+        self.assertTrue(SQLiteUserPasswordDatabase(path=self.path).selfTest())
+
+    def testSelfTest(self):
+        self.db.addUser("admin", self.db.generateC1(b"admin"))
+        self.db.addUser("operator", self.db.generateC1(b"operator"))
+        self.assertTrue(self.db.selfTest())
+
+        # Modified outside, cached index is still valid until invalidated
+        self.db.db.updateRecord("cipher", {"cipher": self.db.generateC1(b"hacked")}, "level = 4")
+        self.assertTrue(self.db.selfTest())
+        self.db.invalidateCache()
+        with self.assertRaises(RuntimeError):
+            self.db.selfTest()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,94 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import sys
+import shutil
+import hashlib
+import logging
+import tempfile
+import threading
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+from pyftpdlib.authorizers import DummyAuthorizer
+from framework.protocol.ftp import FTPClient
+
+
+def start_server(root):
+    authorizer = DummyAuthorizer()
+    authorizer.add_user("user", "12345", root, perm="elradfmwMT")
+    handler = type("BenchmarkHandler", (FTPHandler,), dict(authorizer=authorizer))
+    server = ThreadedFTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+def create_file(path, size):
+    md5 = hashlib.md5()
+    with open(path, "wb") as fp:
+        for _ in range(size // (1024 * 1024)):
+            data = os.urandom(1024 * 1024)
+            md5.update(data)
+            fp.write(data)
+
+    return md5.hexdigest()
+
+
+def report(name, size, rate):
+    print("{:<40s} {:8.1f}MB {:10.1f}MB/s".format(name, size / 1024 / 1024, rate / 1024 / 1024))
+
+
+def benchmark(client, local_file, download_dir, md5, block_size):
+    size = os.path.getsize(local_file)
+    rates = list()
+
+    client.upload_file(local_file, "/", block_size=block_size,
+                       progress=lambda transferred, total, rate: rates.append(rate))
+    report("upload_file(block_size={})".format(block_size), size, rates[-1])
+
+    client.download_file("/" + os.path.basename(local_file), download_dir, block_size=block_size, md5=md5,
+                         progress=lambda transferred, total, rate: rates.append(rate))
+    report("download_file(block_size={})".format(block_size), size, rates[-1])
+
+
+def resume(client, local_file, download_dir, md5):
+    size = os.path.getsize(local_file)
+    name = os.path.basename(local_file)
+    transferred = list()
+
+    # Half downloaded local file
+    with open(local_file, "rb") as src, open(os.path.join(download_dir, name), "wb") as dst:
+        dst.write(src.read(size // 2))
+
+    client.download_file("/" + name, download_dir, resume=True, md5=md5, block_size=65536,
+                         progress=lambda *args: transferred.append(args))
+    report("download_file(resume from 50%)", transferred[-1][0] - size // 2, transferred[-1][2])
+
+    # Quarter uploaded remote file
+    with open(local_file, "rb") as fp:
+        client.ftp.storbinary("STOR /" + name, io.BytesIO(fp.read(size // 4)))
+
+    client.upload_file(local_file, "/", resume=True, verify=True, block_size=65536,
+                       progress=lambda *args: transferred.append(args))
+    report("upload_file(resume from 25%, verify)", transferred[-1][0] - size // 4, transferred[-1][2])
+
+
+if __name__ == "__main__":
+    logging.disable(logging.CRITICAL)
+    file_size = (int(sys.argv[1]) if len(sys.argv) > 1 else 64) * 1024 * 1024
+
+    root, local, download = tempfile.mkdtemp(), tempfile.mkdtemp(), tempfile.mkdtemp()
+    server = start_server(root)
+
+    try:
+        path = os.path.join(local, "large.bin")
+        file_md5 = create_file(path, file_size)
+        ftp = FTPClient("127.0.0.1", server.address[1], "user", "12345")
+
+        for blocksize in (8192, 65536, 1024 * 1024):
+            benchmark(ftp, path, download, file_md5, blocksize)
+
+        resume(ftp, path, download, file_md5)
+    finally:
+        server.close_all()
+        for directory in (root, local, download):
+            shutil.rmtree(directory, ignore_errors=True)
@@ -0,0 +1,294 @@
+# -*- coding: utf-8 -*-
+import os
+import ftplib
+import shutil
+import hashlib
+import logging
+import tempfile
+import unittest
+import threading
+from pyftpdlib.handlers import FTPHandler
+from pyftpdlib.servers import ThreadedFTPServer
+from pyftpdlib.authorizers import DummyAuthorizer
+from framework.protocol.ftp import FTPClient, FTPClientError, FTPTransferEngine
+
+
+class FaultyFTPHandler(FTPHandler):
+    # Drop control connection(without 226 reply) of next drops transfers, only half of the file is transferred
+    drops = 0
+    rest = True
+    temp = tempfile.gettempdir()
+
+    def __init__(self, *args, **kwargs):
+        super(FaultyFTPHandler, self).__init__(*args, **kwargs)
+        self.__drop = None
+
+    def ftp_REST(self, line):
+        if not self.rest:
+            return self.respond("502 Command not implemented.")
+
+        return super(FaultyFTPHandler, self).ftp_REST(line)
+
+    def ftp_RETR(self, file):
+        if not self.drops or self._restart_position:
+            return super(FaultyFTPHandler, self).ftp_RETR(file)
+
+        FaultyFTPHandler.drops -= 1
+        with open(file, "rb") as fp:
+            data = fp.read()
+
+        self.__drop = (os.path.join(self.temp, "half"), "RETR")
+        with open(self.__drop[0], "wb") as fp:
+            fp.write(data[:len(data) // 2])
+
+        return super(FaultyFTPHandler, self).ftp_RETR(self.__drop[0])
+
+    def ftp_STOR(self, file, mode="w"):
+        if self.drops and not self._restart_position:
+            FaultyFTPHandler.drops -= 1
+            self.__drop = (file, "STOR")
+
+        return super(FaultyFTPHandler, self).ftp_STOR(file, mode)
+
+    def respond(self, resp, *args, **kwargs):
+        if self.__drop is None or not resp.startswith("226"):
+            return super(FaultyFTPHandler, self).respond(resp, *args, **kwargs)
+
+        path, cmd = self.__drop
+        self.__drop = None
+        if cmd == "STOR":
+            os.truncate(path, os.path.getsize(path) // 2)
+
+        self.close()
+
+
+class FTPClientTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        # Threaded server stop event is shared by all instances, start only one server
+        logging.getLogger("pyftpdlib").setLevel(logging.CRITICAL)
+        cls.root = tempfile.mkdtemp()
+        authorizer = DummyAuthorizer()
+        authorizer.add_user("user", "password", cls.root, perm="elradfmwMT")
+        FaultyFTPHandler.authorizer = authorizer
+        FaultyFTPHandler.temp = tempfile.mkdtemp()
+        cls.server = ThreadedFTPServer(("127.0.0.1", 0), FaultyFTPHandler)
+        threading.Thread(target=cls.server.serve_forever, kwargs=dict(timeout=0.1), daemon=True).start()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.close_all()
+        shutil.rmtree(cls.root, ignore_errors=True)
+        shutil.rmtree(FaultyFTPHandler.temp, ignore_errors=True)
+
+    def setUp(self) -> None:
+        FaultyFTPHandler.drops, FaultyFTPHandler.rest = 0, True
+        self.local = tempfile.mkdtemp()
+        self.client = FTPClient("127.0.0.1", self.server.address[1], "user", "password")
+        for path, data in self.files().items():
+            self.write(self.local, path, data)
+
+    def tearDown(self) -> None:
+        self.client.ftp.close()
+        shutil.rmtree(self.local, ignore_errors=True)
+        for name in os.listdir(self.root):
+            path = os.path.join(self.root, name)
+            shutil.rmtree(path) if os.path.isdir(path) else os.remove(path)
+
+    @staticmethod
+    def files():
+        return {"x.txt": b"x" * 100, "a/y.txt": b"y" * 2000, "a/b/z.bmp": b"z", "c/w.txt": b"", "c/d/v.bin": b"v" * 10}
+
+    @staticmethod
+    def write(root, path, data):
+        path = os.path.join(root, *path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fp:
+            fp.write(data)
+
+    @staticmethod
+    def tree(root):
+        files = dict()
+        for top, _, names in os.walk(root):
+            for name in names:
+                path = os.path.join(top, name)
+                with open(path, "rb") as fp:
+                    files[os.path.relpath(path, root).replace(os.sep, "/")] = fp.read()
+
+        return files
+
+    def read(self, root, path):
+        with open(os.path.join(root, *path.split("/")), "rb") as fp:
+            return fp.read()
+
+    def fail_connections(self, times):
+        # Next times connections fail before any transfer
+        create_new_connection = self.client.create_new_connection
+
+        def create():
+            if self.failures:
+                self.failures -= 1
+                raise ftplib.error_temp("421 Service not available")
+            return create_new_connection()
+
+        self.failures = times
+        self.client.create_new_connection = create
+
+    def testDownloadRetry(self):
+        data = os.urandom(100 * 1024)
+        self.write(self.root, "f.bin", data)
+        download = os.path.join(self.local, "download")
+
+        # Connection dropped, resume the partial file from it's end
+        for rest in (True, False):
+            FaultyFTPHandler.drops, FaultyFTPHandler.rest = 1, rest
+            path = self.client.download_file("/f.bin", download, retry=1, block_size=1024)
+            self.assertEqual(self.read(download, "f.bin"), data)
+            self.assertEqual(path, os.path.join(download, "f.bin"))
+
+        FaultyFTPHandler.drops = 1
+        with self.assertRaises(FTPClientError):
+            self.client.download_file("/f.bin", download, local_name="failed.bin")
+
+        # Stale local file is not resumed without resume
+        self.write(download, "f.bin", bytes(len(data)))
+        self.fail_connections(1)
+        self.client.download_file("/f.bin", download, retry=1)
+        self.assertEqual(self.read(download, "f.bin"), data)
+
+        # Explicit resume from a partial local file
+        self.write(download, "f.bin", data[:1000])
+        self.client.download_file("/f.bin", download, resume=True, md5=hashlib.md5(data).hexdigest())
+        self.assertEqual(self.read(download, "f.bin"), data)
+
+    def testUploadRetry(self):
+        data = os.urandom(100 * 1024)
+        self.write(self.local, "f.bin", data)
+        local = os.path.join(self.local, "f.bin")
+
+        # Connection dropped, resume the partial remote file from it's end
+        for rest in (True, False):
+            FaultyFTPHandler.drops, FaultyFTPHandler.rest = 1, rest
+            self.assertEqual(self.client.upload_file(local, "/up", retry=1, verify=True), "/up/f.bin")
+            self.assertEqual(self.read(self.root, "up/f.bin"), data)
+
+        FaultyFTPHandler.drops = 1
+        with self.assertRaises(FTPClientError):
+            self.client.upload_file(local, "/up", remote_name="failed.bin")
+        self.assertEqual(os.path.getsize(os.path.join(self.root, "up", "failed.bin")), len(data) // 2)
+
+        # Stale remote file is not resumed without resume
+        self.write(self.root, "up/f.bin", bytes(len(data)))
+        self.fail_connections(1)
+        self.client.upload_file(local, "/up", retry=1)
+        self.assertEqual(self.read(self.root, "up/f.bin"), data)
+
+        # Explicit resume from a partial remote file
+        self.write(self.root, "up/f.bin", data[:1000])
+        self.client.upload_file(local, "/up", resume=True)
+        self.assertEqual(self.read(self.root, "up/f.bin"), data)
+
+    def testTransferEngine(self):
+        paths = sorted(self.files())
+        os.makedirs(os.path.join(self.root, "up"))
+        progress = list()
+
+        for workers in (1, 4):
+            with FTPTransferEngine(self.client, workers, block_size=512,
+                                   progress=lambda *args: progress.append(args)) as engine:
+                tasks = [(os.path.join(self.local, *path.split("/")), "/up/{}".format(path.replace("/", "_")),
+                          len(self.files()[path])) for path in paths]
+                report = engine.upload(tasks)
+                self.assertEqual(report["bytes"], sum(len(x) for x in self.files().values()))
+                self.assertEqual(sorted(x["path"] for x in report["files"]), sorted(x[0] for x in tasks))
+                self.assertEqual(progress[-1][1:], (report["bytes"], report["bytes"]))
+
+                download = os.path.join(self.local, "download{}".format(workers))
+                os.makedirs(download)
+                report = engine.download([(remote, os.path.join(download, os.path.basename(remote)), size)
+                                          for _, remote, size in tasks])
+                self.assertEqual(report["bytes"], sum(len(x) for x in self.files().values()))
+
+            self.assertEqual(self.tree(download), {k.replace("/", "_"): v for k, v in self.files().items()})
+
+    def testTransferEngineError(self):
+        with FTPTransferEngine(self.client, 4) as engine:
+            with self.assertRaises(FTPClientError):
+                engine.download([("/unknown{}".format(i), os.path.join(self.local, str(i)), 0) for i in range(8)])
+
+            # Failed session is closed, engine is still usable
+            engine.upload([(os.path.join(self.local, "x.txt"), "/x.txt", 100)])
+            self.assertEqual(self.tree(self.root), {"x.txt": b"x" * 100})
+
+    def testSyncUpload(self):
+        result = self.client.sync_upload(self.local, "/dst", exclude=["*.bmp"], workers=2)
+        self.assertEqual(sorted(result["transfer"]), ["a/y.txt", "c/d/v.bin", "c/w.txt", "x.txt"])
+        files = self.files()
+        files.pop("a/b/z.bmp")
+        self.assertEqual(self.tree(os.path.join(self.root, "dst")), files)
+
+        result = self.client.sync_upload(self.local, "/dst", exclude=["*.bmp"])
+        self.assertEqual((result["transfer"], len(result["skip"])), ([], 4))
+
+        # Dry run only reports
+        shutil.rmtree(os.path.join(self.local, "c"))
+        self.write(self.local, "x.txt", b"changed")
+        result = self.client.sync_upload(self.local, "/dst", exclude=["*.bmp"], delete=True, dry_run=True)
+        self.assertEqual((result["transfer"], result["delete"], result["report"]), (["x.txt"], ["c"], None))
+        self.assertEqual(self.tree(os.path.join(self.root, "dst")), files)
+
+        result = self.client.sync_upload(self.local, "/dst", exclude=["*.bmp"], delete=True)
+        self.assertEqual((result["transfer"], result["delete"]), (["x.txt"], ["c"]))
+        self.assertEqual(self.tree(os.path.join(self.root, "dst")), {"x.txt": b"changed", "a/y.txt": b"y" * 2000})
+        self.assertEqual(sorted(os.listdir(os.path.join(self.root, "dst"))), ["a", "x.txt"])
+
+    def testSyncUploadManifest(self):
+        manifest = self.local + ".json"
+        self.addCleanup(os.remove, manifest)
+        self.assertEqual(len(self.client.sync_upload(self.local, "/dst", manifest=manifest)["transfer"]), 5)
+        self.assertEqual(self.client.sync_upload(self.local, "/dst", manifest=manifest)["transfer"], [])
+
+        # Same size and older modify time, only detected by content md5
+        self.write(self.local, "a/y.txt", b"Y" * 2000)
+        os.utime(os.path.join(self.local, "a", "y.txt"), (0, 0))
+        self.assertEqual(self.client.sync_upload(self.local, "/dst")["transfer"], [])
+        self.assertEqual(self.client.sync_upload(self.local, "/dst", manifest=manifest)["transfer"], ["a/y.txt"])
+
+        # Remote changed outside
+        self.write(os.path.join(self.root, "dst"), "x.txt", b"X" * 100)
+        os.utime(os.path.join(self.root, "dst", "x.txt"), (0, 0))
+        self.assertEqual(self.client.sync_upload(self.local, "/dst", manifest=manifest)["transfer"], ["x.txt"])
+        self.assertEqual(self.tree(os.path.join(self.root, "dst")), self.tree(self.local))
+
+    def testSyncDownload(self):
+        remote = os.path.join(self.root, "src")
+        shutil.copytree(self.local, remote)
+        download = os.path.join(self.local, "download")
+        manifest = download + ".json"
+
+        result = self.client.sync_download("/src", download, manifest=manifest)
+        self.assertEqual(len(result["transfer"]), 5)
+        self.assertEqual(self.tree(download), self.files())
+        self.assertEqual(self.client.sync_download("/src", download, manifest=manifest)["transfer"], [])
+
+        shutil.rmtree(os.path.join(remote, "c"))
+        self.write(remote, "a/y.txt", b"Y" * 2000)
+        os.utime(os.path.join(remote, "a", "y.txt"), (0, 0))
+        self.write(download, "extra/e.txt", b"e")
+        result = self.client.sync_download("/src", download, delete=True, dry_run=True, manifest=manifest)
+        self.assertEqual((result["transfer"], sorted(result["delete"])), (["a/y.txt"], ["c", "extra"]))
+        self.assertEqual(len(self.tree(download)), 6)
+
+        result = self.client.sync_download("/src", download, delete=True, manifest=manifest)
+        self.assertEqual((result["transfer"], sorted(result["delete"])), (["a/y.txt"], ["c", "extra"]))
+        self.assertEqual(self.tree(download), self.tree(remote))
+        self.assertEqual(sorted(os.listdir(download)), ["a", "x.txt"])
+
+        # Local content changed, restored from remote
+        self.write(download, "x.txt", b"?" * 100)
+        self.assertEqual(self.client.sync_download("/src", download, manifest=manifest)["transfer"], ["x.txt"])
+        self.assertEqual(self.tree(download), self.tree(remote))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,227 @@
+# -*- coding: utf-8 -*-
+import os
+import re
+import time
+import shutil
+import hashlib
+import tempfile
+import unittest
+import threading
+import http.server
+import socketserver
+from framework.network.gogs_request import GogsRequest
+
+FILES = {"/a": os.urandom(3 * 1024 * 1024 + 123), "/b": os.urandom(3 * 1024 * 1024 + 123)}
+FILES["/oversize"] = FILES["/a"] + b"extra"
+
+
+class GogsHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Served requests: (path, Range, If-None-Match, status), file response delay and peak concurrent responses,
+    # Range request support and next drops file responses are dropped after half of the data sent
+    requests = list()
+    delay = 0.0
+    ranges = True
+    drops = 0
+    peak = active = 0
+    lock = threading.Lock()
+
+    def log_message(self, *args):
+        pass
+
+    def reply(self, status, headers=None, body=b""):
+        self.requests.append((self.path, self.headers.get("Range"), self.headers.get("If-None-Match"), status))
+        self.send_response(status)
+        for key, value in (headers or dict()).items():
+            self.send_header(key, value)
+
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        if self.path in ("/user/login", "/"):
+            return self.reply(200, body=b'<form><input name="_csrf" value="token"></form>')
+
+        data = FILES.get(self.path.split("?")[0])
+        if data is None:
+            return self.reply(404)
+
+        etag = '"{}"'.format(hashlib.md5(data).hexdigest())
+        if self.headers.get("If-None-Match") == etag:
+            return self.reply(304, {"ETag": etag})
+
+        with self.lock:
+            GogsHandler.active += 1
+            GogsHandler.peak = max(GogsHandler.peak, GogsHandler.active)
+
+        try:
+            time.sleep(self.delay)
+            self.send_file(data, etag)
+        finally:
+            with self.lock:
+                GogsHandler.active -= 1
+
+    def send_file(self, data, etag):
+        match = re.match(r"bytes=(\d+)-(\d*)", self.headers.get("Range", ""))
+        if self.drops:
+            GogsHandler.drops -= 1
+            self.requests.append((self.path, self.headers.get("Range"), None, 200))
+            self.send_response(200)
+            self.send_header("Content-Length", str(len(data)))
+            self.end_headers()
+            self.wfile.write(data[:len(data) // 2])
+            self.close_connection = True
+            return
+
+        if match and self.ranges:
+            start, end = int(match.group(1)), int(match.group(2) or len(data) - 1)
+            headers = {"Content-Range": "bytes {}-{}/{}".format(start, end, len(data)), "ETag": etag}
+            return self.reply(206, headers, data[start:end + 1])
+
+        self.reply(200, {"ETag": etag}, data)
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get("Content-Length", 0)))
+        self.reply(302, {"Location": "/"})
+
+
+class GogsRequestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), GogsHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.host = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.request = GogsRequest(self.host, "user", "password")
+        del GogsHandler.requests[:]
+        GogsHandler.delay, GogsHandler.peak = 0.0, 0
+        GogsHandler.ranges, GogsHandler.drops = True, 0
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def read(self, name):
+        with open(os.path.join(self.dir, name), "rb") as fp:
+            return fp.read()
+
+    def testStreamDownload(self):
+        data = FILES["/a"]
+        md5 = hashlib.md5(data).hexdigest()
+        for segments in (1, 3):
+            name = os.path.join(self.dir, "a{}".format(segments))
+            self.assertTrue(self.request.stream_download(name, self.host + "/a", len(data), segments=segments, md5=md5))
+            self.assertEqual(self.read(name), data)
+
+        self.assertEqual(sorted(os.listdir(self.dir)), ["a1", "a3"])
+        self.assertFalse(self.request.stream_download(os.path.join(self.dir, "md5"), self.host + "/a", len(data),
+                                                      md5="0" * 32))
+        self.assertEqual(sorted(os.listdir(self.dir)), ["a1", "a3"])
+
+    def testResume(self):
+        data, name = FILES["/a"], os.path.join(self.dir, "a")
+        for segments in (1, 3):
+            self.assertFalse(self.request.stream_download(name, self.host + "/a", len(data), segments=segments,
+                                                          callback=lambda percent, info: percent < 30))
+            self.assertEqual(sorted(os.listdir(self.dir)), ["a.part", "a.part.json"])
+
+            # Resume with range requests, downloaded data is not requested again
+            del GogsHandler.requests[:]
+            self.assertTrue(self.request.stream_download(name, self.host + "/a", len(data), segments=segments))
+            self.assertEqual(self.read("a"), data)
+
+            ranges = [[int(x) for x in re.match(r"bytes=(\d+)-(\d+)", x[1]).groups()] for x in GogsHandler.requests]
+            self.assertEqual(len(ranges), segments)
+            self.assertLess(sum(end - start + 1 for start, end in ranges), len(data) * 0.8)
+            self.assertEqual(os.listdir(self.dir), ["a"])
+            os.remove(name)
+
+    def testResumeOtherUrl(self):
+        name = os.path.join(self.dir, "a")
+        self.assertFalse(self.request.stream_download(name, self.host + "/a", len(FILES["/a"]),
+                                                      callback=lambda percent, info: percent < 30))
+
+        # Same size but other url, partial file is discarded
+        self.assertTrue(self.request.stream_download(name, self.host + "/b", len(FILES["/b"])))
+        self.assertEqual(self.read("a"), FILES["/b"])
+        self.assertIsNone(GogsHandler.requests[-1][1])
+
+        # Partial file without state is discarded too
+        with open(name + GogsRequest.PART_SUFFIX, "wb") as fp:
+            fp.write(FILES["/b"][:1024])
+        self.assertTrue(self.request.stream_download(name, self.host + "/a", len(FILES["/a"])))
+        self.assertEqual(self.read("a"), FILES["/a"])
+
+    def testSizeMismatch(self):
+        name = os.path.join(self.dir, "a")
+        self.assertFalse(self.request.stream_download(name, self.host + "/oversize", len(FILES["/a"])))
+        self.assertEqual(os.listdir(self.dir), [])
+
+    def testRangeNotSupported(self):
+        data, name = FILES["/a"], os.path.join(self.dir, "a")
+        GogsHandler.ranges = False
+
+        # Dropped, range retry is answered with whole file, fallback download from scratch without range
+        for segments in (1, 3):
+            GogsHandler.drops = 2
+            self.assertTrue(self.request.stream_download(name, self.host + "/a", len(data), segments=segments))
+            self.assertEqual(self.read("a"), data)
+            self.assertIsNone(GogsHandler.requests[-1][1])
+            os.remove(name)
+
+        # Retry exhausted
+        GogsHandler.drops = 10
+        self.assertFalse(self.request.stream_download(name, self.host + "/a", len(data), retry=1))
+        self.assertFalse(os.path.exists(name))
+
+    def testCachedDownload(self):
+        cache, name = os.path.join(self.dir, "cache"), os.path.join(self.dir, "a")
+        for _ in range(3):
+            self.assertTrue(self.request.download(name, self.host + "/a", cache_dir=cache))
+            self.assertEqual(self.read("a"), FILES["/a"])
+            os.remove(name)
+
+        self.assertEqual([x[3] for x in GogsHandler.requests if x[0] == "/a"], [200, 304, 304])
+        self.assertEqual(len(os.listdir(cache)), 2)
+
+        # Content changed, new content is cached
+        FILES["/a"], original = os.urandom(1024), FILES["/a"]
+        try:
+            self.assertTrue(self.request.download(name, self.host + "/a", cache_dir=cache))
+            self.assertEqual(self.read("a"), FILES["/a"])
+            self.assertEqual(GogsHandler.requests[-1][3], 200)
+            self.assertEqual(len(os.listdir(cache)), 3)
+        finally:
+            FILES["/a"] = original
+
+        self.assertFalse(self.request.download(name + "404", self.host + "/404", cache_dir=cache))
+        self.assertFalse(os.path.exists(name + "404"))
+
+    def testDownloadBudget(self):
+        GogsHandler.delay = 0.05
+        self.addCleanup(GogsRequest.set_download_budget, GogsRequest._download_budget.limit)
+        GogsRequest.set_download_budget(1)
+
+        def callback(name, progress):
+            # Enlarge budget while downloads are waiting
+            GogsRequest.set_download_budget(3)
+            return True
+
+        package = {"a{}".format(i): self.host + "/a" for i in range(8)}
+        result = self.request.download_package(package, self.dir, max_workers=8, callback=callback)
+        self.assertEqual(result, dict.fromkeys(package, True))
+        self.assertEqual(GogsHandler.peak, 3)
+        self.assertTrue(all(self.read(name) == FILES["/a"] for name in package))
+
+
+if __name__ == "__main__":
+    unittest.main()
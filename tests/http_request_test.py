@@ -0,0 +1,147 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+import threading
+import http.server
+import socketserver
+import concurrent.futures
+from framework.network.http_request import HttpRequest
+
+
+class HttpHandler(http.server.BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    # Request counter of each path, "/flaky" fails with 503 before count reaches flaky_failures
+    counter = dict()
+    flaky_failures = 2
+
+    def log_message(self, *args):
+        pass
+
+    def do_GET(self):
+        count = self.counter[self.path] = self.counter.get(self.path, 0) + 1
+        if self.path == "/token":
+            status, body = 200, '<form><input name="token" value="token{}"></form>'.format(count).encode()
+        elif self.path == "/flaky":
+            status, body = (503, b"busy") if count <= self.flaky_failures else (200, b"ok")
+        else:
+            status, body = 200, b"ok"
+
+        self.send_response(status)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+
+class HttpRequestTest(unittest.TestCase):
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.server = socketserver.ThreadingTCPServer(("127.0.0.1", 0), HttpHandler)
+        cls.server.daemon_threads = True
+        threading.Thread(target=cls.server.serve_forever, daemon=True).start()
+        cls.host = "http://127.0.0.1:{}".format(cls.server.server_address[1])
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.shutdown()
+        cls.server.server_close()
+
+    def setUp(self) -> None:
+        HttpHandler.counter.clear()
+
+    def testTokenCache(self):
+        url = self.host + "/token"
+        request = HttpRequest()
+        self.assertEqual(HttpRequest.TOKEN_TTL, 60.0)
+        self.assertEqual([request.get_token(url) for _ in range(3)], ["token1"] * 3)
+        self.assertEqual(request.get_token(url, force=True), "token2")
+        self.assertEqual(request.get_token(url), "token2")
+
+        request.invalidate_token(self.host + "/other")
+        self.assertEqual(request.get_token(url), "token2")
+        request.invalidate_token(url)
+        self.assertEqual(request.get_token(url), "token3")
+        request.invalidate_token()
+        self.assertEqual(request.get_token(url), "token4")
+
+        # Expired and disabled cache
+        request = HttpRequest(token_ttl=0.1)
+        self.assertEqual([request.get_token(url) for _ in range(2)], ["token5"] * 2)
+        time.sleep(0.15)
+        self.assertEqual(request.get_token(url), "token6")
+        self.assertEqual([HttpRequest(token_ttl=0).get_token(url) for _ in range(2)], ["token7", "token8"])
+
+    def testRetry(self):
+        self.assertEqual(HttpRequest().section_get(self.host + "/flaky").status_code, 503)
+
+        HttpHandler.counter.clear()
+        request = HttpRequest(retries=3, backoff_factor=0.01)
+        self.assertEqual(request.section_get(self.host + "/flaky").status_code, 200)
+        self.assertEqual(HttpHandler.counter["/flaky"], 3)
+
+        # Retry exhausted, last response is returned
+        HttpHandler.counter.clear()
+        request.configure_transport(retries=1)
+        self.assertEqual(request.section_get(self.host + "/flaky").status_code, 503)
+        self.assertEqual(HttpHandler.counter["/flaky"], 2)
+
+    def testLatencyHook(self):
+        calls = list()
+        request = HttpRequest()
+
+        def hook(*args):
+            calls.append(args)
+
+        def error_hook(*args):
+            raise RuntimeError("hook error")
+
+        request.add_latency_hook(error_hook)
+        request.add_latency_hook(hook)
+        request.add_latency_hook(hook)
+        for path in ("/a", "/flaky", "/flaky", "/flaky"):
+            request.section_get(self.host + path)
+
+        self.assertEqual([x[:3] for x in calls], [("GET", self.host + path, status) for path, status in
+                                                  (("/a", 200), ("/flaky", 503), ("/flaky", 503), ("/flaky", 200))])
+        statistics = request.get_latency_statistics()
+        self.assertEqual(statistics["count"], 4)
+        self.assertAlmostEqual(statistics["total"], sum(x[3] for x in calls))
+        self.assertEqual(statistics["max"], max(x[3] for x in calls))
+        self.assertAlmostEqual(statistics["average"], statistics["total"] / 4)
+
+        request.remove_latency_hook(hook)
+        request.reset_latency_statistics()
+        request.section_get(self.host + "/a")
+        self.assertEqual(len(calls), 4)
+        self.assertEqual(request.get_latency_statistics()["count"], 1)
+
+    def testConfigureTransport(self):
+        url = self.host + "/a"
+        request = HttpRequest(pool_size=2)
+        request.section_get(url)
+        adapter = request._section.get_adapter(url)
+        self.assertEqual(len(adapter.poolmanager.pools), 1)
+
+        # Old adapter is closed, pooled connections are released
+        request.ensure_pool_size(1)
+        self.assertIs(request._section.get_adapter(url), adapter)
+        request.ensure_pool_size(8)
+        self.assertEqual(request.pool_size, 8)
+        self.assertIsNot(request._section.get_adapter(url), adapter)
+        self.assertIs(request._section.get_adapter("https://localhost"), request._section.get_adapter(url))
+        self.assertEqual(len(adapter.poolmanager.pools), 0)
+
+        # Re-mount while requests are running
+        def get(i):
+            if i % 10 == 0:
+                request.configure_transport(pool_size=8 + i)
+            return request.section_get(url).status_code
+
+        with concurrent.futures.ThreadPoolExecutor(max_workers=8) as pool:
+            self.assertEqual(list(pool.map(get, range(100))), [200] * 100)
+
+        self.assertGreaterEqual(request.pool_size, 88)
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+import sys
+import time
+import socket
+import asyncio
+import tracemalloc
+from framework.network.utility import scan_lan_port, scan_lan_alive, async_scan_lan_port, async_scan_lan_alive
+
+PORTS = (18080, 18081)
+LISTEN_ADDRESS = ("127.0.1.5", "127.0.7.9", "127.0.15.200")
+
+
+def start_listeners():
+    listeners = list()
+    for address in LISTEN_ADDRESS:
+        for port in PORTS:
+            sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+            sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+            sock.bind((address, port))
+            sock.listen(128)
+            listeners.append(sock)
+
+    return listeners
+
+
+def report(name, found, first, elapsed, peak):
+    print("{:<48s} found {:4d} first {:8.3f}s total {:8.3f}s peak memory {:8.1f}KB".format(
+        name, found, first, elapsed, peak / 1024))
+
+
+def benchmark_threads(name, scan):
+    tracemalloc.start()
+    start = time.perf_counter()
+    found = scan()
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+
+    # Thread pool returns nothing until every host is done
+    report(name, len(found), elapsed, elapsed, peak)
+
+
+def benchmark_async(name, scan):
+    async def collect():
+        found, first = list(), 0.0
+        async for result in scan():
+            first = first or time.perf_counter() - start
+            found.append(result)
+        return found, first
+
+    tracemalloc.start()
+    start = time.perf_counter()
+    found, first = asyncio.run(collect())
+    elapsed = time.perf_counter() - start
+    peak = tracemalloc.get_traced_memory()[1]
+    tracemalloc.stop()
+    report(name, len(found), first, elapsed, peak)
+
+
+if __name__ == "__main__":
+    network = sys.argv[1] if len(sys.argv) > 1 else "127.0.0.0/20"
+    servers = start_listeners()
+
+    try:
+        benchmark_threads("scan_lan_port({}, {} ports)".format(network, len(PORTS)),
+                          lambda: [x for port in PORTS for x in scan_lan_port(port, network, timeout=0.2)])
+
+        for window in (256, 1024):
+            benchmark_async("async_scan_lan_port({}, {} ports, window={})".format(network, len(PORTS), window),
+                            lambda: async_scan_lan_port(network, PORTS, timeout=0.2, window=window))
+
+        benchmark_async("async_scan_lan_port({}, rate=20000/s)".format(network),
+                        lambda: async_scan_lan_port(network, PORTS, timeout=0.2, rate=20000))
+
+        benchmark_threads("scan_lan_alive(127.0.0.0/24)", lambda: scan_lan_alive("127.0.0.0/24", timeout=1))
+        benchmark_async("async_scan_lan_alive(127.0.0.0/24)", lambda: async_scan_lan_alive("127.0.0.0/24", timeout=1))
+    finally:
+        for server in servers:
+            server.close()
@@ -0,0 +1,137 @@
+# -*- coding: utf-8 -*-
+import time
+import unittest
+import requests
+import threading
+import unittest.mock
+from framework.network import luci_request
+from framework.network.luci_request import LuciFleet, LuciRequestException
+
+
+class FakeLuciRequest(object):
+    # Login hosts, hosts with expired session(return login page once), concurrent and peak concurrent requests
+    logins = list()
+    expired = set()
+    active = peak = 0
+    lock = threading.Lock()
+
+    def __init__(self, host, username, password, **kwargs):
+        self.logins.append(host)
+        self.host = host
+
+    def get_dynamic_status(self):
+        with self.lock:
+            FakeLuciRequest.active += 1
+            FakeLuciRequest.peak = max(FakeLuciRequest.peak, FakeLuciRequest.active)
+
+        try:
+            time.sleep(0.5 if self.host.endswith(".9") else 0.05)
+        finally:
+            with self.lock:
+                FakeLuciRequest.active -= 1
+
+        if self.host in self.expired:
+            self.expired.discard(self.host)
+            return dict()
+
+        if self.host.endswith(".5"):
+            raise requests.ConnectionError("{} down".format(self.host))
+
+        return {"uptime": 1}
+
+    def firmware_upgrade(self, firmware, output_msg=None, **kwargs):
+        output_msg("upgrade {}".format(firmware))
+        return not self.host.endswith(".4")
+
+
+class LuciFleetTest(unittest.TestCase):
+    def setUp(self) -> None:
+        patcher = unittest.mock.patch.object(luci_request, "LuciRequest", FakeLuciRequest)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+
+        del FakeLuciRequest.logins[:]
+        FakeLuciRequest.expired = {"http://10.0.0.3"}
+        FakeLuciRequest.active = FakeLuciRequest.peak = 0
+        self.fleet = LuciFleet("root", "password", max_workers=4)
+        for i in range(10):
+            self.fleet.add_host("http://10.0.0.{}".format(i))
+
+    def testPoll(self):
+        result = {host: (value, error) for host, value, error in self.fleet.poll(deadline=0.4)}
+        self.assertEqual(sorted(result), sorted(self.fleet.hosts))
+        self.assertEqual(FakeLuciRequest.peak, 4)
+        self.assertIsInstance(result["http://10.0.0.9"][1], TimeoutError)
+        self.assertIsInstance(result["http://10.0.0.5"][1], requests.ConnectionError)
+        for host in ("http://10.0.0.0", "http://10.0.0.3", "http://10.0.0.8"):
+            self.assertEqual(result[host], ({"uptime": 1}, None))
+
+        # Sessions are reused, failed host re-login
+        del FakeLuciRequest.logins[:]
+        self.assertEqual(len(list(self.fleet.poll(hosts=["http://10.0.0.0", "http://10.0.0.5"]))), 2)
+        self.assertEqual(FakeLuciRequest.logins, ["http://10.0.0.5"] * 2)
+
+        with self.assertRaises(LuciRequestException):
+            self.fleet.get_session("http://10.0.0.10")
+
+    def testMapDeadline(self):
+        hosts = self.fleet.hosts
+        event = threading.Event()
+
+        def func(host):
+            if host.endswith(".9"):
+                event.wait(1)
+            return host
+
+        # Every host is yielded once, finished hosts yield result
+        result = list(self.fleet.map(func, hosts, deadline=0.1))
+        event.set()
+        self.assertEqual(sorted(x[0] for x in result), sorted(hosts))
+        for host, value, error in result:
+            if host.endswith(".9"):
+                self.assertIsInstance(error, TimeoutError)
+            else:
+                self.assertEqual((value, error), (host, None))
+
+        self.assertEqual(list(self.fleet.map(func, [])), [])
+
+    def testRelogin(self):
+        # Expired session re-login and retry
+        self.assertEqual(self.fleet.call("http://10.0.0.3", "get_dynamic_status"), {"uptime": 1})
+        self.assertEqual(FakeLuciRequest.logins, ["http://10.0.0.3"] * 2)
+
+        # Retry exhausted, last error is raised
+        del FakeLuciRequest.logins[:]
+        with self.assertRaises(requests.ConnectionError):
+            self.fleet.call("http://10.0.0.5", "get_dynamic_status")
+        self.assertEqual(FakeLuciRequest.logins, ["http://10.0.0.5"] * 2)
+
+        # No re-login, expired session return empty result
+        FakeLuciRequest.expired.add("http://10.0.0.3")
+        fleet = LuciFleet("root", "password", relogin=0)
+        fleet.add_host("http://10.0.0.3")
+        self.assertEqual(fleet.call("http://10.0.0.3", "get_dynamic_status"), dict())
+
+    def testFirmwareUpgrade(self):
+        messages = list()
+        result = self.fleet.firmware_upgrade("firmware.bin", wave_size=3, output_msg=messages.append)
+        waves = [x for x in messages if x.startswith("Upgrade wave")]
+
+        # Canary wave, then stopped after the wave including failed ".4"
+        self.assertEqual(waves, ["Upgrade wave 1/4: http://10.0.0.0",
+                                 "Upgrade wave 2/4: http://10.0.0.1, http://10.0.0.2, http://10.0.0.3",
+                                 "Upgrade wave 3/4: http://10.0.0.4, http://10.0.0.5, http://10.0.0.6"])
+        self.assertEqual(sorted(result), ["http://10.0.0.{}".format(i) for i in range(7)])
+        self.assertEqual([host for host, success in result.items() if not success], ["http://10.0.0.4"])
+        self.assertIn("http://10.0.0.1: upgrade firmware.bin", messages)
+        self.assertEqual(messages[-1], "Upgrade stopped, 1 host(s) failed")
+
+        # Failures allowed, every host is upgraded without canary
+        result = self.fleet.firmware_upgrade("firmware.bin", wave_size=4, canary=0, max_failures=1,
+                                             output_msg=messages.append)
+        self.assertEqual(len(result), 10)
+        self.assertIn("Upgrade wave 3/3: http://10.0.0.8, http://10.0.0.9", messages)
+
+
+if __name__ == "__main__":
+    unittest.main()
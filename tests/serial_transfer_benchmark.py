@@ -0,0 +1,111 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import serial
+import threading
+from framework.protocol.serialport import SerialTransferProtocol, SerialTransferProtocolReadSimulate
+
+
+class VirtualSerialPort(object):
+    def __init__(self, baudrate, latency, timeout):
+        """One end of a virtual serial cable, data written arrives at peer after transmit time and latency
+
+        :param baudrate: line baudrate(10 bits per byte)
+        :param latency: one way latency(s), e.g. usb-serial converter and peer processing delay
+        :param timeout: read timeout(s)
+        """
+        self.peer = None
+        self.timeout = timeout
+        self.latency = latency
+        self.byte_rate = baudrate / 10.0
+        self.__line_free = 0.0
+        self.__pending = list()
+        self.__buffer = bytearray()
+        self.__condition = threading.Condition()
+
+    @staticmethod
+    def pair(baudrate, latency, timeout=1.0):
+        a, b = VirtualSerialPort(baudrate, latency, timeout), VirtualSerialPort(baudrate, latency, timeout)
+        a.peer, b.peer = b, a
+        return a, b
+
+    def write(self, data):
+        if not data:
+            return 0
+
+        now = time.perf_counter()
+        self.__line_free = max(now, self.__line_free) + len(data) / self.byte_rate
+        self.peer.deliver(bytes(data), self.__line_free + self.latency)
+        return len(data)
+
+    def deliver(self, data, arrive_time):
+        with self.__condition:
+            self.__pending.append((arrive_time, data))
+            self.__condition.notify_all()
+
+    def read_into(self, buffer, timeout=None):
+        data = self.read(len(buffer), timeout)
+        buffer[:len(data)] = data
+        return len(data)
+
+    def read(self, size, timeout=None):
+        deadline = time.perf_counter() + (timeout or self.timeout)
+        with self.__condition:
+            while True:
+                now = time.perf_counter()
+                arrived = [item for item in self.__pending if item[0] <= now]
+                self.__pending = [item for item in self.__pending if item[0] > now]
+                for _, data in arrived:
+                    self.__buffer.extend(data)
+
+                if len(self.__buffer) >= size or now >= deadline:
+                    data = bytes(self.__buffer[:size])
+                    del self.__buffer[:size]
+                    if not data:
+                        raise serial.SerialTimeoutException("Receive data timeout!")
+                    return data
+
+                wait = deadline - now
+                if self.__pending:
+                    wait = min(wait, min(item[0] for item in self.__pending) - now)
+                self.__condition.wait(max(wait, 0.0001))
+
+
+def benchmark(name, data, baudrate, latency, window=1, payload_size=128, peer_payload_size=None, error_rate=0.0,
+              recv_into=False):
+    client, server = VirtualSerialPort.pair(baudrate, latency)
+    simulate = SerialTransferProtocolReadSimulate(server.write, server.read, data, error_handle=None,
+                                                  payload_size=peer_payload_size, window=16, error_rate=error_rate)
+    simulate.start()
+
+    try:
+        protocol = SerialTransferProtocol(client.write, client.read, window=window, payload_size=payload_size,
+                                          recv_into=client.read_into if recv_into else None)
+        start = time.perf_counter()
+        global_data, package_data = protocol.recv()
+        elapsed = time.perf_counter() - start
+        if package_data != data[1]:
+            raise AssertionError("{}: received data mismatch".format(name))
+
+        print("{:<40s} window: {:2d} payload: {:3d} {:8.3f}s {:9.0f} B/s".format(
+            name, protocol.window, protocol.payload_size, elapsed, len(package_data) / elapsed))
+    finally:
+        simulate.stop()
+
+
+if __name__ == "__main__":
+    size = int(sys.argv[1]) if len(sys.argv) > 1 else 32 * 1024
+
+    # Stop-and-wait transfer zero pads the last package, windowed transfer with payload 240 has a partial tail
+    size = SerialTransferProtocol.calc_package_size(bytes(size)) * SerialTransferProtocol.PAYLOAD_SIZE
+    data = (os.urandom(128), os.urandom(size))
+    for baudrate, latency in ((115200, 0.005), (921600, 0.002)):
+        print("baudrate: {} latency: {}ms".format(baudrate, latency * 1000))
+        benchmark("stop-and-wait", data, baudrate, latency)
+        benchmark("windowed, legacy peer(fallback)", data, baudrate, latency, window=8, payload_size=240)
+        benchmark("windowed", data, baudrate, latency, window=8, payload_size=240, peer_payload_size=248)
+        benchmark("windowed, 1% crc error", data, baudrate, latency,
+                  window=8, payload_size=240, peer_payload_size=248, error_rate=0.01)
+        benchmark("windowed, recv_into", data, baudrate, latency,
+                  window=8, payload_size=240, peer_payload_size=248, recv_into=True)
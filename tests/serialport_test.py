@@ -0,0 +1,266 @@
+# -*- coding: utf-8 -*-
+import os
+import time
+import collections
+import concurrent.futures
+import serial
+import struct
+import unittest
+import platform
+import threading
+from framework.protocol.serialport import SerialTransferProtocol, SerialTransferProtocolReadSimulate, \
+    ReadReqMsg, ReadAckMsg, SerialFrameParser, DelimiterFrameParser, LengthPrefixedFrameParser, MessageFrameParser, \
+    SerialRingBuffer, SerialPort, SerialPortReader, SerialPortDiscovery
+
+
+class LoopbackPort(object):
+    def __init__(self, timeout=0.2):
+        self.peer = None
+        self.drop = None
+        self.timeout = timeout
+        self.__buffer = bytearray()
+        self.__condition = threading.Condition()
+
+    @staticmethod
+    def pair(timeout=0.2):
+        a, b = LoopbackPort(timeout), LoopbackPort(timeout)
+        a.peer, b.peer = b, a
+        return a, b
+
+    def write(self, data):
+        # drop(data) return True means data is lost on the line
+        if hasattr(self.drop, "__call__") and self.drop(data):
+            return len(data)
+
+        with self.peer.__condition:
+            self.peer.__buffer.extend(data)
+            self.peer.__condition.notify_all()
+
+        return len(data)
+
+    def read(self, size):
+        with self.__condition:
+            self.__condition.wait_for(lambda: len(self.__buffer) >= size, self.timeout)
+            data = bytes(self.__buffer[:size])
+            del self.__buffer[:size]
+            if not data:
+                raise serial.SerialTimeoutException("Receive data timeout!")
+            return data
+
+    def pending(self):
+        with self.__condition:
+            return len(self.__buffer)
+
+
+class SerialTransferProtocolTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.data = (os.urandom(128), os.urandom(32768))
+        self.client, self.server = LoopbackPort.pair()
+
+    def transfer(self, window=1, payload_size=128, peer_payload_size=None, error_rate=0.0):
+        simulate = SerialTransferProtocolReadSimulate(self.server.write, self.server.read, self.data,
+                                                      error_handle=None, payload_size=peer_payload_size,
+                                                      window=16, error_rate=error_rate)
+        simulate.start()
+        try:
+            protocol = SerialTransferProtocol(self.client.write, self.client.read,
+                                              window=window, payload_size=payload_size)
+            return protocol.recv()
+        finally:
+            simulate.stop()
+
+    def testPackageSize(self):
+        self.assertEqual(SerialTransferProtocol.calc_package_size(bytes(32768), 240), 137)
+        self.assertEqual(SerialTransferProtocol.calc_package_size(bytes(32768), 128), 256)
+        self.assertEqual(SerialTransferProtocol.calc_package_size(bytes(0), 128), 0)
+        self.assertEqual(len(SerialTransferProtocol.get_package_data(136, bytes(32768), 240)), 128)
+        self.assertEqual(SerialTransferProtocol.get_package_data(137, bytes(32768), 240), "")
+
+    def testStopAndWait(self):
+        self.data = (self.data[0], self.data[1][:300])
+        global_data, package_data = self.transfer()
+        self.assertEqual(global_data, self.data[0])
+
+        # Peer length is unknown, last package is zero padded
+        self.assertEqual(package_data, self.data[1] + bytes(84))
+
+    def testWindowed(self):
+        global_data, package_data = self.transfer(window=8, payload_size=240, peer_payload_size=248)
+        self.assertEqual(global_data, self.data[0])
+        self.assertEqual(package_data, self.data[1])
+
+        # Legacy peer, fallback to stop-and-wait
+        self.assertEqual(self.transfer(window=8, payload_size=240)[1], self.data[1])
+
+    def testWindowedCrcError(self):
+        _, package_data = self.transfer(window=8, payload_size=240, peer_payload_size=248, error_rate=0.05)
+        self.assertEqual(package_data, self.data[1])
+        self.assertEqual(self.client.pending(), 0)
+
+    def testWindowedLostAck(self):
+        lost = set()
+
+        def drop(data):
+            # Lose the first ack of every 10th data package
+            index = int.from_bytes(data[2:4], "little")
+            if len(data) > 200 and index % 10 == 0 and index not in lost:
+                lost.add(index)
+                return True
+            return False
+
+        self.server.drop = drop
+        _, package_data = self.transfer(window=8, payload_size=240, peer_payload_size=248)
+        self.assertEqual(package_data, self.data[1])
+        self.assertEqual(len(lost), 14)
+        self.assertEqual(self.client.pending(), 0)
+
+
+class SerialFrameParserTest(unittest.TestCase):
+    @staticmethod
+    def parse(parser, data, chunk=1):
+        # Feed data chunk by chunk as a serial port do
+        buffer, frames, errors = SerialRingBuffer(1024), list(), 0
+        for i in range(0, len(data), chunk):
+            buffer.write(data[i:i + chunk])
+            result, position, error = parser.parse(buffer.buffer, buffer.start, buffer.end)
+            buffer.consume(position)
+            frames.extend(result)
+            errors += error
+
+        return frames, errors, len(buffer)
+
+    def testAbstract(self):
+        with self.assertRaises(TypeError):
+            SerialFrameParser()
+
+    def testDelimiter(self):
+        data = b"hello\r\nworld\r\n" + b"x" * 20 + b"\r\nok\r\npartial"
+        for chunk in (1, 3, len(data)):
+            frames, errors, remain = self.parse(DelimiterFrameParser(b"\r\n", max_size=16), data, chunk)
+            self.assertEqual(frames, [b"hello", b"world", b"ok"])
+            self.assertEqual(errors, 1)
+            self.assertEqual(remain, len(b"partial"))
+
+        frames, _, _ = self.parse(DelimiterFrameParser(keep_delimiter=True), b"a\nb\n", 2)
+        self.assertEqual(frames, [b"a\n", b"b\n"])
+
+        with self.assertRaises(ValueError):
+            DelimiterFrameParser(b"")
+
+    def testLengthPrefixed(self):
+        frames = [struct.pack("<H", len(payload) + 2) + payload for payload in (b"", b"abc", b"0123456789")]
+        data = b"".join(frames) + struct.pack("<H", 100) + frames[1] + frames[1][:3]
+        for chunk in (1, 4, len(data)):
+            result, errors, remain = self.parse(LengthPrefixedFrameParser(max_size=16), data, chunk)
+            self.assertEqual(result, frames + frames[1:2])
+            self.assertEqual(errors, 1)
+            self.assertEqual(remain, 3)
+
+        # Length field after a header, counting payload only
+        parser = LengthPrefixedFrameParser(">B", length_offset=1, length_adjust=2)
+        self.assertEqual(self.parse(parser, b"\xaa\x03abc\xaa\x00", 2)[0], [b"\xaa\x03abc", b"\xaa\x00"])
+
+    def testMessage(self):
+        frames = [ReadAckMsg.create(ReadReqMsg.DATA_REQ, i, bytes([i]) * 10).cdata() for i in range(3)]
+        corrupted = bytearray(frames[1])
+        corrupted[10] ^= 0xff
+        data = frames[0] + b"\x00\x01" + bytes(corrupted) + frames[2]
+        result, errors, remain = self.parse(MessageFrameParser(ReadAckMsg), data, 7)
+        self.assertEqual(result, [frames[0], frames[2]])
+        self.assertEqual(errors, 1)
+        self.assertEqual(remain, 0)
+
+
+class SerialRingBufferTest(unittest.TestCase):
+    def testWriteConsume(self):
+        buffer = SerialRingBuffer(8)
+        self.assertEqual(buffer.write(b"abcdef"), 0)
+        buffer.consume(buffer.start + 4)
+        self.assertEqual(len(buffer), 2)
+
+        # Unparsed data is moved to head and kept contiguous
+        self.assertEqual(buffer.write(b"ghijkl"), 0)
+        self.assertEqual(bytes(buffer.buffer[buffer.start:buffer.end]), b"efghijkl")
+
+        # Overflow, oldest data is discarded
+        self.assertEqual(buffer.write(b"mn"), 2)
+        self.assertEqual(bytes(buffer.buffer[buffer.start:buffer.end]), b"ghijklmn")
+        self.assertEqual(buffer.write(b"0123456789"), 10)
+        self.assertEqual(bytes(buffer.buffer[buffer.start:buffer.end]), b"23456789")
+
+        buffer.consume(buffer.end + 100)
+        self.assertEqual((len(buffer), buffer.start, buffer.end), (0, 0, 0))
+
+
+@unittest.skipIf(platform.system().lower() == "windows", "pseudo terminal is not supported")
+class SerialPortReaderTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.master, slave = os.openpty()
+        self.port = SerialPort(os.ttyname(slave), 115200)
+        os.close(slave)
+
+    def tearDown(self) -> None:
+        self.port.close()
+        os.close(self.master)
+
+    def testErrorRecovery(self):
+        class FaultyParser(DelimiterFrameParser):
+            def parse(self, buffer, start, end):
+                if buffer.find(b"parser", start, end) >= 0:
+                    raise RuntimeError("parser error")
+                return super(FaultyParser, self).parse(buffer, start, end)
+
+        def callback(frame):
+            if frame == b"callback":
+                raise RuntimeError("callback error")
+
+        reader = SerialPortReader(self.port, FaultyParser(), callback=callback, poll_interval=0.05)
+        reader.start()
+        try:
+            for data in (b"first\n", b"parser\n", b"callback\n", b"last\n"):
+                os.write(self.master, data)
+                time.sleep(0.1)
+
+            self.assertEqual([reader.get(timeout=1) for _ in range(3)], [b"first", b"callback", b"last"])
+            self.assertTrue(reader.is_running())
+            self.assertEqual(reader.statistics()["errors"], 1)
+        finally:
+            reader.stop()
+
+
+class SerialPortDiscoveryTest(unittest.TestCase):
+    def testConcurrentRefresh(self):
+        class Discovery(SerialPortDiscovery):
+            scans = 0
+
+            def scan_remote(self, timeout):
+                Discovery.scans += 1
+                time.sleep(0.01)
+                name = "192.168.1.2/ttyS{}".format(self.scans)
+                return collections.OrderedDict([(name, ("192.168.1.2", "/dev/ttyS0"))])
+
+        changes = list()
+        discovery = Discovery(max_workers=2)
+        discovery.add_listener(lambda added, removed: changes.append((added, removed)))
+
+        # More background refreshes than scan workers, together with foreground refreshes
+        futures = [discovery.refresh_async(force=True) for _ in range(8)]
+        threads = [threading.Thread(target=discovery.refresh, kwargs=dict(force=True)) for _ in range(4)]
+        for thread in threads:
+            thread.start()
+
+        for thread in threads:
+            thread.join(5)
+            self.assertFalse(thread.is_alive())
+
+        for future in concurrent.futures.as_completed(futures, timeout=5):
+            self.assertEqual(len([port for port in future.result() if port.startswith("192.168.1.2/")]), 1)
+
+        self.assertEqual(Discovery.scans, 12)
+        self.assertIn("192.168.1.2/ttyS12", discovery.ports())
+        self.assertEqual(len(changes), 12)
+        self.assertEqual(list(discovery.ports()), list(discovery.refresh().keys()))
+
+
+if __name__ == "__main__":
+    unittest.main()
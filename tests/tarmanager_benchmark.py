@@ -0,0 +1,60 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import random
+import shutil
+import tempfile
+from framework.misc.tarmanager import TarManager
+
+
+def create_tree(path, size):
+    # Mixed compressible text and random binary files
+    random.seed(0)
+    words = [bytes("word{}".format(i), "ascii") for i in range(256)]
+    total, index = 0, 0
+    while total < size:
+        directory = os.path.join(path, "dir{}".format(index % 16))
+        os.makedirs(directory, exist_ok=True)
+        if index % 4:
+            data = b" ".join(random.choice(words) for _ in range(random.randint(1000, 50000)))
+        else:
+            data = os.urandom(random.randint(1024, 512 * 1024))
+
+        with open(os.path.join(directory, "file{}.dat".format(index)), "wb") as fp:
+            fp.write(data)
+
+        total += len(data)
+        index += 1
+
+    return total
+
+
+def benchmark(name, size, pack, package):
+    start = time.perf_counter()
+    pack()
+    elapsed = time.perf_counter() - start
+    ratio = os.path.getsize(package) / size
+    print("{:<40s} {:8.3f}s {:8.1f}MB/s ratio {:6.3f}".format(name, elapsed, size / elapsed / 1024 / 1024, ratio))
+
+
+if __name__ == "__main__":
+    tree_size = (int(sys.argv[1]) if len(sys.argv) > 1 else 64) * 1024 * 1024
+    threads = max(os.cpu_count(), 2)
+
+    src, dst = tempfile.mkdtemp(), tempfile.mkdtemp()
+    try:
+        tree_size = create_tree(src, tree_size)
+        for fmt in ("gz", "bz2", "xz", "zip"):
+            package = os.path.join(dst, "package.{}".format(fmt))
+            benchmark("TarManager.pack({})".format(fmt), tree_size, lambda: TarManager.pack(src, package, fmt), package)
+
+            if fmt == "zip":
+                continue
+
+            for level in (1, 6):
+                benchmark("TarPackEngine({}, level={}, threads={})".format(fmt, level, threads), tree_size,
+                          lambda: TarManager.pack(src, package, fmt, threads=threads, level=level), package)
+    finally:
+        shutil.rmtree(src, ignore_errors=True)
+        shutil.rmtree(dst, ignore_errors=True)
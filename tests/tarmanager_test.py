@@ -0,0 +1,207 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import bz2
+import gzip
+import lzma
+import time
+import shutil
+import tarfile
+import platform
+import tempfile
+import unittest
+from framework.misc.tarmanager import TarManager, TarManagerError, TarMemberIndex, TarPackEngine, \
+    ParallelCompressWriter
+
+
+class TarManagerTest(unittest.TestCase):
+    FORMATS = ("tar", "gz", "bz2", "xz", "zip")
+
+    def setUp(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.src = os.path.join(self.dir, "src")
+        for i in range(20):
+            self.write(self.src, "d{}/f{}.txt".format(i % 4, i), os.urandom(500 * i + 1))
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    @staticmethod
+    def write(root, path, data):
+        path = os.path.join(root, *path.split("/"))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        with open(path, "wb") as fp:
+            fp.write(data)
+
+    @staticmethod
+    def read(root, path):
+        with open(os.path.join(root, *path.split("/")), "rb") as fp:
+            return fp.read()
+
+    def package(self, fmt, src=None, name="package"):
+        path = os.path.join(self.dir, "{}.{}".format(name, fmt))
+        TarManager.pack(src or self.src, path, fmt)
+        return path
+
+    def testMemberIndex(self):
+        for fmt in self.FORMATS:
+            # Tar member names are relative to "."
+            prefix = "" if fmt == "zip" else "./"
+            package = self.package(fmt)
+            index = TarMemberIndex(package)
+            self.assertEqual(index.members, TarManager.get_members(package))
+            self.assertEqual(index.seekable, fmt in ("tar", "zip"))
+            self.assertIn(prefix + "d1/f5.txt", index)
+            self.assertEqual(index.get(prefix + "d1/f5.txt")["size"], 2501)
+            self.assertEqual(index.read(prefix + "d1/f5.txt"), self.read(self.src, "d1/f5.txt"))
+
+            with self.assertRaises(TarManagerError):
+                index.read("unknown")
+
+            # Extract single member and extract all in parallel
+            extract = os.path.join(self.dir, fmt)
+            TarManager.extract_member(package, prefix + "d3/f19.txt", extract)
+            self.assertEqual(os.listdir(extract), ["d3"])
+            self.assertEqual(self.read(extract, "d3/f19.txt"), self.read(self.src, "d3/f19.txt"))
+
+            extracted = list()
+            index.extractall(extract, workers=4, callback=extracted.append)
+            self.assertEqual(sorted(extracted), sorted(index.members))
+            for name in index.members:
+                if os.path.isfile(os.path.join(self.src, name)):
+                    self.assertEqual(self.read(extract, name), self.read(self.src, name))
+
+    def testSidecar(self):
+        package = self.package("gz")
+        index = TarManager.get_member_index(package)
+        self.assertTrue(os.path.isfile(index.sidecar))
+
+        # Valid sidecar(same package size and modify time) is used without scan package
+        stat = os.stat(package)
+        with open(package, "r+b") as fp:
+            fp.write(bytes(stat.st_size))
+        os.utime(package, ns=(stat.st_atime_ns, stat.st_mtime_ns))
+        self.assertEqual(TarManager.get_members(package, index=True), index.members)
+
+        # Package replaced, sidecar is rebuilt
+        self.write(self.src, "new.txt", b"new")
+        time.sleep(0.01)
+        package = self.package("gz")
+        self.assertIn("./new.txt", TarManager.get_members(package, index=True))
+        TarManager.extract_member(package, "./new.txt", os.path.join(self.dir, "new"))
+        self.assertEqual(self.read(os.path.join(self.dir, "new"), "new.txt"), b"new")
+
+        with self.assertRaises(TarManagerError):
+            TarManager.extract_member(package, "unknown", self.dir)
+
+    def testPackBatch(self):
+        jobs, progress = list(), list()
+        for i, fmt in enumerate(self.FORMATS):
+            src = os.path.join(self.dir, "batch", str(i))
+            shutil.copytree(self.src, src)
+            self.write(src, "job.txt", str(i).encode())
+            jobs.append((src, os.path.join(self.dir, "batch{}.{}".format(i, fmt))))
+
+        packages = TarManager.pack_batch(jobs, workers=3, progress=lambda *args: progress.append(args))
+        self.assertEqual(packages, [name for _, name in jobs])
+        self.assertEqual(sorted(x[1] for x in progress), list(range(1, 21 * len(jobs) + 1)))
+        self.assertEqual({x[2] for x in progress}, {21 * len(jobs)})
+
+        for i, package in enumerate(packages):
+            extract = os.path.join(self.dir, "extract", str(i))
+            TarManager.unpack(package, extract)
+            self.assertEqual(self.read(extract, "job.txt"), str(i).encode())
+            self.assertEqual(self.read(extract, "d2/f14.txt"), self.read(self.src, "d2/f14.txt"))
+
+        # One job failed, other jobs are finished
+        jobs.append((self.src, os.path.join(self.dir, "failed.rar")))
+        jobs[0] = (jobs[0][0], os.path.join(self.dir, "rebuild.tar"))
+        with self.assertRaises(TarManagerError):
+            TarManager.pack_batch(jobs, filters=lambda x: x.endswith(".txt"))
+        self.assertTrue(os.path.isfile(os.path.join(self.dir, "rebuild.tar")))
+
+        with self.assertRaises(TarManagerError):
+            TarManager.pack_batch([(os.path.join(self.dir, "unknown"), "unknown.tar")])
+
+    def testParallelCompressWriter(self):
+        data = os.urandom(10000) + bytes(100000)
+        for fmt, decompress in (("gz", gzip.decompress), ("bz2", bz2.decompress), ("xz", lzma.decompress)):
+            output = io.BytesIO()
+            writer = ParallelCompressWriter(output, fmt, threads=4, block_size=4096)
+            for i in range(0, len(data), 1000):
+                writer.write(data[i:i + 1000])
+            writer.close()
+
+            # Concatenated members
+            self.assertEqual(decompress(output.getvalue()), data)
+            self.assertEqual((writer.bytes_in, writer.bytes_out), (len(data), len(output.getvalue())))
+
+            # Empty data is still a valid compressed file
+            output = io.BytesIO()
+            ParallelCompressWriter(output, fmt).close()
+            self.assertEqual(decompress(output.getvalue()), b"")
+
+        with self.assertRaises(ValueError):
+            ParallelCompressWriter(io.BytesIO(), "zip")
+
+    def testPackStream(self):
+        # Large file is streamed from disk, small files are prefetched
+        self.write(self.src, "large.bin", os.urandom(TarPackEngine.PREFETCH_SIZE + 1))
+        files = sorted(os.path.relpath(os.path.join(root, name), self.src).replace(os.sep, "/")
+                       for root, _, names in os.walk(self.src) for name in names)
+
+        for fmt in ("tar", "gz", "bz2", "xz"):
+            output, packed = io.BytesIO(), list()
+            statistics = TarManager.pack_stream(self.src, output, fmt, callback=packed.append, threads=4)
+            self.assertEqual(statistics["files"], len(files))
+            self.assertEqual(sorted(packed), ["./" + x for x in files])
+
+            with tarfile.open(fileobj=io.BytesIO(output.getvalue()), mode="r:*") as tar:
+                self.assertEqual(sorted(tar.getnames()), ["./" + x for x in files])
+                for name in files:
+                    self.assertEqual(tar.extractfile("./" + name).read(), self.read(self.src, name))
+
+            if fmt == "tar":
+                self.assertEqual((statistics["bytes_in"], statistics["bytes_out"]), (None, None))
+            else:
+                uncompressed = dict(gz=gzip, bz2=bz2, xz=lzma)[fmt].decompress(output.getvalue())
+                self.assertEqual(statistics["bytes_in"], len(uncompressed))
+                self.assertEqual(statistics["bytes_out"], len(output.getvalue()))
+                self.assertLess(statistics["bytes_out"], statistics["bytes_in"])
+
+        # Empty directory, a valid empty package
+        empty = os.path.join(self.dir, "empty")
+        os.makedirs(os.path.join(empty, "sub"))
+        output = io.BytesIO()
+        self.assertEqual(TarManager.pack_stream(empty, output, "xz")["files"], 0)
+        with tarfile.open(fileobj=io.BytesIO(output.getvalue()), mode="r:xz") as tar:
+            self.assertEqual(tar.getnames(), [])
+
+        with self.assertRaises(TarManagerError):
+            TarPackEngine("rar")
+
+        with self.assertRaises(TarManagerError):
+            TarManager.pack_stream(os.path.join(self.dir, "unknown"), io.BytesIO())
+
+    @unittest.skipIf(platform.system().lower() == "windows", "symlink is not supported")
+    def testParallelPack(self):
+        os.symlink("f5.txt", os.path.join(self.src, "d1", "link.txt"))
+        for fmt in ("tar", "gz", "bz2", "xz"):
+            package = os.path.join(self.dir, "parallel.{}".format(fmt))
+            TarManager.pack(self.src, package, threads=4)
+
+            extract = os.path.join(self.dir, "parallel", fmt)
+            TarManager.unpack(package, extract)
+            self.assertEqual(os.readlink(os.path.join(extract, "d1", "link.txt")), "f5.txt")
+            self.assertEqual(self.read(extract, "d1/link.txt"), self.read(self.src, "d1/f5.txt"))
+            for i in range(20):
+                name = "d{}/f{}.txt".format(i % 4, i)
+                self.assertEqual(self.read(extract, name), self.read(self.src, name))
+
+            # Same content as single thread pack
+            self.assertEqual(sorted(TarManager.get_members(package)),
+                             sorted(TarManager.get_members(self.package(fmt, name="single"))))
+
+
+if __name__ == "__main__":
+    unittest.main()
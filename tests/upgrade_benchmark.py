@@ -0,0 +1,87 @@
+# -*- coding: utf-8 -*-
+import os
+import sys
+import time
+import shutil
+import socket
+import asyncio
+import tempfile
+import threading
+import urllib.parse
+from framework.protocol.upgrade import UpgradeServer, AsyncUpgradeServer, NEW_VERSION_DURL_CMD
+
+SOFTWARE = "benchmark"
+
+
+async def client(inquire_address, semaphore, timeout=60):
+    # One boot storm client: inquire newest version download url then download the package
+    async with semaphore:
+        reader, writer = await asyncio.open_connection(*inquire_address)
+        writer.write("{}:{}".format(NEW_VERSION_DURL_CMD, SOFTWARE).encode())
+        await writer.drain()
+        url, md5, size = (await asyncio.wait_for(reader.read(1024), timeout)).decode().split("#")
+        writer.close()
+
+        url = urllib.parse.urlsplit(url)
+        reader, writer = await asyncio.open_connection(url.hostname, url.port)
+        writer.write("GET {} HTTP/1.1\r\nHost: {}\r\nConnection: close\r\n\r\n".format(url.path, url.netloc).encode())
+        await writer.drain()
+        await asyncio.wait_for(reader.readuntil(b"\r\n\r\n"), timeout)
+
+        received = 0
+        while received < int(size):
+            data = await asyncio.wait_for(reader.read(1024 * 1024), timeout)
+            if not data:
+                break
+            received += len(data)
+
+        writer.close()
+        return received == int(size)
+
+
+async def storm(inquire_address, clients, concurrency):
+    semaphore = asyncio.Semaphore(concurrency)
+    return await asyncio.gather(*[client(inquire_address, semaphore) for _ in range(clients)], return_exceptions=True)
+
+
+def get_free_port():
+    with socket.socket(socket.AF_INET, socket.SOCK_STREAM) as sock:
+        sock.bind(("", 0))
+        return sock.getsockname()[1]
+
+
+def benchmark(name, inquire_address, clients, concurrency, size):
+    start = time.perf_counter()
+    result = asyncio.run(storm(inquire_address, clients, concurrency))
+    elapsed = time.perf_counter() - start
+    success = result.count(True)
+    print("{:<24s} clients {:5d} success {:5d} {:8.3f}s {:8.1f}req/s {:8.1f}MB/s".format(
+        name, clients, success, elapsed, success / elapsed, success * size / elapsed / 1024 / 1024))
+
+
+if __name__ == "__main__":
+    total_clients = int(sys.argv[1]) if len(sys.argv) > 1 else 1000
+    package_size = (int(sys.argv[2]) if len(sys.argv) > 2 else 1) * 1024 * 1024
+    max_concurrency = 500
+
+    root = tempfile.mkdtemp()
+    os.makedirs(os.path.join(root, SOFTWARE))
+    with open(os.path.join(root, SOFTWARE, "1.0{}".format(UpgradeServer.UPGRADE_PACKAGE_SUFFIX)), "wb") as fp:
+        fp.write(os.urandom(package_size))
+
+    try:
+        # UpgradeServer download url using file_server_port as is, can't using port 0
+        server = UpgradeServer(get_free_port(), get_free_port(), root)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        benchmark("UpgradeServer", ("127.0.0.1", server.server_address[1]),
+                  total_clients, max_concurrency, package_size)
+        server.shutdown()
+
+        server = AsyncUpgradeServer(0, 0, root)
+        server.start()
+        benchmark("AsyncUpgradeServer", ("127.0.0.1", server.server_address[1]),
+                  total_clients, max_concurrency, package_size)
+        server.stop()
+    finally:
+        shutil.rmtree(root, ignore_errors=True)
@@ -0,0 +1,506 @@
+# -*- coding: utf-8 -*-
+import io
+import os
+import time
+import shutil
+import json
+import socket
+import hashlib
+import tarfile
+import platform
+import tempfile
+import unittest
+import threading
+import http.client
+from framework.protocol.upgrade import UpgradeVersionCatalog, UpgradeDeltaPackage, UpgradeDeltaPackageError, \
+    AsyncUpgradeServer, UpgradeServer, UpgradeClient, FramedUpgradeClient
+
+
+class UpgradeVersionCatalogTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.root = tempfile.mkdtemp()
+        self.catalog = UpgradeVersionCatalog(self.root, ".tbz2", check_interval=0.05)
+        for version in ("1.0", "1.2", "1.1"):
+            self.write("software", "{}.tbz2".format(version), version.encode())
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.root, ignore_errors=True)
+
+    def write(self, software, name, data):
+        os.makedirs(os.path.join(self.root, software), exist_ok=True)
+        with open(os.path.join(self.root, software, name), "wb") as fp:
+            fp.write(data)
+
+    def expire(self):
+        time.sleep(0.06)
+
+    def testVersions(self):
+        self.assertEqual(self.catalog.get_versions("software"),
+                         [(1.2, "1.2.tbz2"), (1.1, "1.1.tbz2"), (1.0, "1.0.tbz2")])
+        self.assertEqual(self.catalog.get_newest("software"), (1.2, "1.2.tbz2", hashlib.md5(b"1.2").hexdigest(), 3))
+
+        # Unknown software do not create index lock
+        for i in range(100):
+            self.assertEqual(self.catalog.get_newest("unknown{}".format(i)), (0.0, "", "", 0))
+        self.assertEqual(list(self.catalog._UpgradeVersionCatalog__locks), ["software"])
+
+        # Software removed, index and lock are dropped
+        shutil.rmtree(os.path.join(self.root, "software"))
+        self.expire()
+        self.assertEqual(self.catalog.get_versions("software"), [])
+        self.assertEqual(self.catalog._UpgradeVersionCatalog__locks, dict())
+
+    def testMtimeInvalidation(self):
+        self.assertEqual(self.catalog.get_newest("software")[0], 1.2)
+
+        # Cached until check interval expired
+        self.write("software", "2.0.tbz2", b"2.0")
+        self.assertEqual(self.catalog.get_newest("software")[0], 1.2)
+        self.expire()
+        self.assertEqual(self.catalog.get_newest("software")[:2], (2.0, "2.0.tbz2"))
+
+        os.remove(os.path.join(self.root, "software", "2.0.tbz2"))
+        self.expire()
+        self.assertEqual(self.catalog.get_newest("software")[0], 1.2)
+
+        # Explicit invalidate
+        self.write("software", "3.0.tbz2", b"3.0")
+        self.catalog.invalidate("software")
+        self.assertEqual(self.catalog.get_newest("software")[0], 3.0)
+
+    def testReplaceInPlace(self):
+        self.assertEqual(self.catalog.get_newest("software")[2:], (hashlib.md5(b"1.2").hexdigest(), 3))
+
+        # Directory mtime is not changed, newest package md5 is re-calculated
+        path = os.path.join(self.root, "software", "1.2.tbz2")
+        dir_stat = os.stat(os.path.dirname(path))
+        self.write("software", "1.2.tbz2", b"replaced")
+        os.utime(path, ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        os.utime(os.path.dirname(path), ns=(dir_stat.st_atime_ns, dir_stat.st_mtime_ns))
+        self.expire()
+        self.assertEqual(self.catalog.get_newest("software"),
+                         (1.2, "1.2.tbz2", hashlib.md5(b"replaced").hexdigest(), 8))
+
+        # Delta package md5 follows content
+        name = UpgradeDeltaPackage.get_name(1.0, 1.2)
+        self.write("software", name, b"delta")
+        self.expire()
+        self.assertEqual(self.catalog.get_delta("software", 1.0), (name, hashlib.md5(b"delta").hexdigest(), 5))
+        self.write("software", name, b"new delta")
+        os.utime(os.path.join(self.root, "software", name), ns=(time.time_ns(), time.time_ns() + 10 ** 9))
+        self.assertEqual(self.catalog.get_delta("software", 1.0)[1:], (hashlib.md5(b"new delta").hexdigest(), 9))
+        self.assertIsNone(self.catalog.get_delta("software", 1.1))
+
+
+@unittest.skipIf(platform.system().lower() == "windows", "symlink is not supported")
+class UpgradeDeltaPackageTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.dir = tempfile.mkdtemp()
+        self.base = self.pack("base", {"a.txt": b"a" * 1000, "lib/b.bin": os.urandom(4096), "c.txt": b"c",
+                                       "empty.txt": b""}, "tbz2")
+
+    def tearDown(self) -> None:
+        shutil.rmtree(self.dir, ignore_errors=True)
+
+    def pack(self, name, files, fmt, links=None, hardlinks=None):
+        root = os.path.join(self.dir, name)
+        for path, data in files.items():
+            os.makedirs(os.path.dirname(os.path.join(root, path)), exist_ok=True)
+            with open(os.path.join(root, path), "wb") as fp:
+                fp.write(data)
+
+        for path, target in (links or dict()).items():
+            os.symlink(target, os.path.join(root, path))
+
+        for path, target in (hardlinks or dict()).items():
+            os.link(os.path.join(root, target), os.path.join(root, path))
+
+        package = os.path.join(self.dir, "{}.{}".format(name, fmt))
+        with tarfile.open(package, "w:{}".format(UpgradeDeltaPackage.get_format(package))) as tar:
+            tar.add(root, ".")
+
+        return package
+
+    @staticmethod
+    def members(package):
+        with tarfile.open(package) as tar:
+            return {member.name: (member.type, member.linkname, tar.extractfile(member).read()
+                                  if member.isfile() else b"") for member in tar.getmembers()}
+
+    def delta(self, target):
+        delta = os.path.join(self.dir, UpgradeDeltaPackage.get_name(1.0, 2.0))
+        return delta, UpgradeDeltaPackage.generate(self.base, target, delta)
+
+    def testRoundTrip(self):
+        # Renamed, symlink, hardlink, empty and new files
+        files = {"renamed.txt": b"a" * 1000, "lib/b.bin": self.members(self.base)["./lib/b.bin"][2],
+                 "new.bin": os.urandom(2048), "empty.txt": b"", "lib/empty": b""}
+        target = self.pack("target", files, "txz", links={"link.txt": "renamed.txt", "lib/dir": "."},
+                           hardlinks={"hard.bin": "new.bin"})
+        delta, result = self.delta(target)
+        self.assertEqual(result["blobs"], 1)
+        self.assertLess(result["delta_size"], result["target_size"])
+
+        for fmt in ("tar", "gz", "bz2", "xz"):
+            output = os.path.join(self.dir, "output.{}".format(fmt))
+            manifest = UpgradeDeltaPackage.apply(self.base, delta, output, UpgradeDeltaPackage.get_format(output))
+            self.assertEqual(manifest["target"], UpgradeVersionCatalog.calc_file_md5(target))
+            self.assertEqual(manifest["base"], UpgradeVersionCatalog.calc_file_md5(self.base))
+            self.assertEqual(self.members(output), self.members(target))
+            self.assertIn({self.members(output)[x][:2] for x in ("./hard.bin", "./new.bin")},
+                          ({(tarfile.LNKTYPE, "./new.bin"), (tarfile.REGTYPE, "")},
+                           {(tarfile.LNKTYPE, "./hard.bin"), (tarfile.REGTYPE, "")}))
+            self.assertEqual(self.members(output)["./link.txt"][:2], (tarfile.SYMTYPE, "renamed.txt"))
+
+        # Rebuilt package(md5 differs from target) could be the base of next delta
+        self.base = os.path.join(self.dir, "output.bz2")
+        delta, _ = self.delta(self.pack("next", {"renamed.txt": b"a" * 1000, "next.txt": b"next"}, "gz"))
+        UpgradeDeltaPackage.apply(self.base, delta, os.path.join(self.dir, "next.tbz2"))
+        self.assertEqual(self.members(os.path.join(self.dir, "next.tbz2"))["./next.txt"][2], b"next")
+
+        with self.assertRaises(UpgradeDeltaPackageError):
+            UpgradeDeltaPackage.get_format("target.zip")
+
+    def testMismatch(self):
+        target = self.pack("target", {"a.txt": b"a" * 1000, "new.txt": b"new"}, "tbz2")
+        delta, _ = self.delta(target)
+        output = os.path.join(self.dir, "output.tbz2")
+
+        # Same files with other layout is a mismatched base
+        other = self.pack("other", {"x/a.txt": b"a" * 1000, "lib/b.bin": b"b", "c.txt": b"c", "empty.txt": b""}, "gz")
+        for base in (other, target):
+            with self.assertRaisesRegex(UpgradeDeltaPackageError, "Base package mismatch"):
+                UpgradeDeltaPackage.apply(base, delta, output)
+            self.assertEqual(os.listdir(self.dir).count("output.tbz2.part"), 0)
+            self.assertFalse(os.path.exists(output))
+
+        # Invalid sha256 in manifest
+        for sha256 in ("../../etc/passwd", "A" * 64, None):
+            tampered = os.path.join(self.dir, "tampered.tdelta")
+            with tarfile.open(delta) as src, tarfile.open(tampered, "w:xz") as dst:
+                for member in src.getmembers():
+                    data = src.extractfile(member).read()
+                    if member.name == UpgradeDeltaPackage.MANIFEST:
+                        manifest = json.loads(data.decode())
+                        for header in manifest["members"]:
+                            if header["name"] == "./new.txt":
+                                header["sha256"] = sha256
+                        data = json.dumps(manifest).encode()
+                        member.size = len(data)
+                    dst.addfile(member, io.BytesIO(data))
+
+            with self.assertRaisesRegex(UpgradeDeltaPackageError, "invalid sha256"):
+                UpgradeDeltaPackage.apply(self.base, tampered, output)
+            self.assertFalse(os.path.exists(output))
+
+
+class AsyncUpgradeServerTest(unittest.TestCase):
+    DATA = os.urandom(100)
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.dir = tempfile.mkdtemp()
+        cls.root = os.path.join(cls.dir, "root")
+        os.makedirs(os.path.join(cls.root, "software"))
+        for name, data in (("1.0.tbz2", b"old"), ("1.1.tbz2", cls.DATA), ("empty.bin", b"")):
+            with open(os.path.join(cls.root, "software", name), "wb") as fp:
+                fp.write(data)
+
+        # File outside root must not be served
+        with open(os.path.join(cls.dir, "secret"), "wb") as fp:
+            fp.write(b"secret")
+
+        cls.server = AsyncUpgradeServer(0, 0, cls.root, host="127.0.0.1")
+        assert cls.server.start()
+        cls.http_port = int(cls.server.get_file_server_address().split(":")[-1])
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.server.stop()
+        shutil.rmtree(cls.dir, ignore_errors=True)
+
+    def request(self, target, method="GET", headers=None, connection=None):
+        connection = connection or http.client.HTTPConnection("127.0.0.1", self.http_port, timeout=5)
+        connection.request(method, target, headers=headers or dict())
+        response = connection.getresponse()
+        return response, response.read()
+
+    def testInquire(self):
+        port = self.server.server_address[1]
+        client = UpgradeClient("software", "127.0.0.1", port)
+        self.assertTrue(client.has_new_version("1.0"))
+
+        # Same connection serves several requests
+        self.assertFalse(client.has_new_version("1.1"))
+        self.assertEqual(client.get_new_version_info(),
+                         (True, "{}/software/1.1.tbz2".format(self.server.get_file_server_address()), "1.1.tbz2",
+                          hashlib.md5(self.DATA).hexdigest(), len(self.DATA)))
+
+        self.assertFalse(UpgradeClient("unknown", "127.0.0.1", port).get_new_version_info()[0])
+        self.assertFalse(UpgradeClient("unknown", "127.0.0.1", port).has_new_version("0.1"))
+
+    def testHttp(self):
+        response, body = self.request("/software/1.1.tbz2")
+        self.assertEqual((response.status, body), (200, self.DATA))
+        self.assertEqual(response.getheader("Content-Length"), "100")
+        self.assertEqual(response.getheader("Accept-Ranges"), "bytes")
+
+        for header, content_range, data in (("bytes=10-19", "bytes 10-19/100", self.DATA[10:20]),
+                                            ("bytes=90-", "bytes 90-99/100", self.DATA[90:]),
+                                            ("bytes=-5", "bytes 95-99/100", self.DATA[95:])):
+            response, body = self.request("/software/1.1.tbz2", headers={"Range": header})
+            self.assertEqual((response.status, body), (206, data))
+            self.assertEqual(response.getheader("Content-Range"), content_range)
+            self.assertEqual(response.getheader("Content-Length"), str(len(data)))
+
+        for target, header, size in (("/software/1.1.tbz2", "bytes=100-", 100), ("/software/empty.bin", "bytes=-5", 0)):
+            response, body = self.request(target, headers={"Range": header})
+            self.assertEqual((response.status, body), (416, b""))
+            self.assertEqual(response.getheader("Content-Range"), "bytes */{}".format(size))
+            self.assertEqual(response.getheader("Content-Length"), "0")
+
+        response, body = self.request("/software/empty.bin")
+        self.assertEqual((response.status, body, response.getheader("Content-Length")), (200, b"", "0"))
+
+        for target in ("/../secret", "/software/../../secret", "/%2e%2e/secret", "/software/%2E%2E/%2e%2e/secret",
+                       "/software", "/software/unknown"):
+            response, body = self.request(target)
+            self.assertEqual((response.status, body), (404, b""), target)
+
+        self.assertEqual(self.request("/software/1.1.tbz2", "POST")[0].status, 501)
+
+    def testKeepAlive(self):
+        connection = http.client.HTTPConnection("127.0.0.1", self.http_port, timeout=5)
+        try:
+            # HEAD has no body, next response on same connection is not broken
+            response, body = self.request("/software/1.1.tbz2", "HEAD", connection=connection)
+            self.assertEqual((response.status, body, response.getheader("Content-Length")), (200, b"", "100"))
+
+            for _ in range(2):
+                response, body = self.request("/software/1.1.tbz2", connection=connection)
+                self.assertEqual((response.status, body), (200, self.DATA))
+                self.assertEqual(response.getheader("Connection"), "keep-alive")
+
+            response, body = self.request("/unknown", connection=connection)
+            self.assertEqual(response.status, 404)
+            response, body = self.request("/software/1.0.tbz2", headers={"Connection": "close"}, connection=connection)
+            self.assertEqual((body, response.getheader("Connection")), (b"old", "close"))
+        finally:
+            connection.close()
+
+    def testStop(self):
+        server = AsyncUpgradeServer(0, 0, self.root, host="127.0.0.1")
+        self.assertTrue(server.start())
+        port = server.server_address[1]
+
+        # Alive connection do not block stop
+        connection = http.client.HTTPConnection("127.0.0.1", int(server.get_file_server_address().split(":")[-1]))
+        self.assertEqual(self.request("/software/1.0.tbz2", connection=connection)[1], b"old")
+        start = time.perf_counter()
+        server.stop()
+        connection.close()
+
+        self.assertLess(time.perf_counter() - start, 2)
+        self.assertFalse(server._AsyncUpgradeServer__thread.is_alive())
+        self.assertEqual(server.server_address, ("127.0.0.1", 0))
+        self.assertFalse(UpgradeClient("software", "127.0.0.1", port).is_connected())
+
+    def testParseRange(self):
+        for header, size, expected in (("bytes=0-9", 100, (0, 9)), ("bytes=90-", 100, (90, 99)),
+                                       ("bytes=90-200", 100, (90, 99)), ("bytes=-5", 100, (95, 99)),
+                                       ("bytes=-200", 100, (0, 99)), (" bytes=99-99 ", 100, (99, 99)),
+                                       ("bytes=-", 100, None), ("bytes=0-1,5-6", 100, None),
+                                       ("items=0-9", 100, None), ("", 100, None)):
+            self.assertEqual(AsyncUpgradeServer.parse_range(header, size), expected, header)
+
+        for header, size in (("bytes=100-", 100), ("bytes=10-5", 100), ("bytes=-0", 100),
+                             ("bytes=-5", 0), ("bytes=0-", 0), ("bytes=0-0", 0)):
+            with self.assertRaises(ValueError, msg=header):
+                AsyncUpgradeServer.parse_range(header, size)
+
+
+class RecordUpgradeServer(UpgradeServer):
+    # Record accepted connections, so test could close them from server side
+    connections = list()
+
+    def process_request(self, request, client_address):
+        self.connections.append(request)
+        super(RecordUpgradeServer, self).process_request(request, client_address)
+
+
+class FramedProtocolTest(object):
+    DATA = os.urandom(100)
+    DELTA = b"delta"
+
+    @classmethod
+    def setUpClass(cls) -> None:
+        cls.root = tempfile.mkdtemp()
+        for software, name, data in (("software", "1.0.tbz2", b"old"), ("software", "1.1.tbz2", cls.DATA),
+                                     ("software", UpgradeDeltaPackage.get_name(1.0, 1.1), cls.DELTA),
+                                     ("other", "2.0.tbz2", b"other")):
+            os.makedirs(os.path.join(cls.root, software), exist_ok=True)
+            with open(os.path.join(cls.root, software, name), "wb") as fp:
+                fp.write(data)
+
+        cls.server, cls.port = cls.start_server(0)
+        cls.file_server = cls.server.get_file_server_address()
+
+    @classmethod
+    def tearDownClass(cls) -> None:
+        cls.stop_server(cls.server)
+        shutil.rmtree(cls.root, ignore_errors=True)
+
+    @classmethod
+    def start_server(cls, port):
+        raise NotImplementedError
+
+    @classmethod
+    def stop_server(cls, server):
+        raise NotImplementedError
+
+    def close_connections(self):
+        raise NotImplementedError
+
+    def setUp(self) -> None:
+        self.client = FramedUpgradeClient("127.0.0.1", self.port, backoff=0.1)
+
+    def tearDown(self) -> None:
+        self.client.close()
+
+    def info(self, software, name, data):
+        return dict(version=float(os.path.splitext(name)[0]), url="{}/{}/{}".format(self.file_server, software, name),
+                    md5=hashlib.md5(data).hexdigest(), size=len(data))
+
+    def transact(self, data, replies):
+        with socket.create_connection(("127.0.0.1", self.port), timeout=5) as sock:
+            sock.sendall(data)
+            buffer = b""
+            while buffer.count(b"\n") < replies:
+                buffer += sock.recv(4096)
+
+        return [json.loads(frame.decode()) for frame in buffer.splitlines()]
+
+    def testQuery(self):
+        self.assertEqual(self.client.query(["software", "other", "unknown"]),
+                         {"software": self.info("software", "1.1.tbz2", self.DATA),
+                          "other": self.info("other", "2.0.tbz2", b"other"),
+                          "unknown": dict(version=0.0, url="", md5="", size=0)})
+
+        self.assertTrue(self.client.has_new_version("software", "1.0"))
+        self.assertFalse(self.client.has_new_version("software", "1.1"))
+        self.assertEqual(self.client.get_new_version_info("other"),
+                         (True, "{}/other/2.0.tbz2".format(self.file_server), "2.0.tbz2",
+                          hashlib.md5(b"other").hexdigest(), 5))
+        self.assertEqual(self.client.get_new_version_info("unknown"), (False, "", "", "", 0))
+
+    def testPipelined(self):
+        # Each reply is matched to its request, failed request do not break others
+        result = self.client.query_pipelined([["other"], ["software", "unknown"], [1], ["software"]])
+        self.assertEqual([sorted(x) for x in result], [["other"], ["software", "unknown"], [], ["software"]])
+        self.assertEqual(result[0]["other"], self.info("other", "2.0.tbz2", b"other"))
+        self.assertEqual(result[3]["software"], self.info("software", "1.1.tbz2", self.DATA))
+        self.assertEqual(self.client.query_pipelined([]), [])
+
+        # Replies are sent in request order, no matter how requests are split into segments
+        requests = [b'{"id":%d,"cmd":"QUERY","software":["other"]}\n' % i for i in (7, 3, 5)]
+        self.assertEqual([x["id"] for x in self.transact(b"".join(requests), 3)], [7, 3, 5])
+
+    def testError(self):
+        for request, error in ((b'{"id":1,"cmd":"LIST","software":["software"]}', "unknown request: LIST"),
+                               (b'{"id":2,"cmd":"QUERY","software":"software"}', "software require a list of str"),
+                               (b'{"id":3,"cmd":"QUERY","software":["software", 1]}', "software require a list of str"),
+                               (b'{"id":4,"cmd":"QUERY","software":["software"],"current":[1.0]}',
+                                "current require a dict of software version")):
+            self.assertEqual(self.transact(request + b"\n", 1), [dict(id=json.loads(request.decode())["id"],
+                                                                        error=error)])
+
+        # Invalid frame do not close connection
+        replies = self.transact(b'{"id":5\n{"id":6,"cmd":"QUERY","software":["other"]}\n', 2)
+        self.assertEqual(replies[0]["id"], None)
+        self.assertIn("error", replies[0])
+        self.assertEqual(replies[1], dict(id=6, result={"other": self.info("other", "2.0.tbz2", b"other")}))
+
+    def testDelta(self):
+        delta = dict(base=1.0, url="{}/software/{}".format(self.file_server, UpgradeDeltaPackage.get_name(1.0, 1.1)),
+                     md5=hashlib.md5(self.DELTA).hexdigest(), size=len(self.DELTA))
+        result = self.client.query(["software", "other"], current={"software": "1.0", "other": 1.0})
+        self.assertEqual(result["software"], dict(self.info("software", "1.1.tbz2", self.DATA), delta=delta))
+        self.assertNotIn("delta", result["other"])
+
+        # No delta package from current version
+        self.assertNotIn("delta", self.client.query(["software"], current={"software": 0.9})["software"])
+        self.assertNotIn("delta", self.client.query(["software"])["software"])
+
+    def testLegacyClient(self):
+        # Legacy and framed clients share the same port
+        self.assertTrue(self.client.has_new_version("software", "1.0"))
+        client = UpgradeClient("software", "127.0.0.1", self.port)
+        self.assertTrue(client.has_new_version("1.0"))
+        self.assertEqual(client.get_new_version_info(),
+                         (True, "{}/software/1.1.tbz2".format(self.file_server), "1.1.tbz2",
+                          hashlib.md5(self.DATA).hexdigest(), len(self.DATA)))
+        self.assertEqual(self.client.query(["other"])["other"]["version"], 2.0)
+
+    def testReconnect(self):
+        self.assertEqual(self.client.query(["other"])["other"]["version"], 2.0)
+        self.assertTrue(self.client.is_connected())
+
+        # Server closed the connection, client reconnect and resend
+        self.close_connections()
+        self.assertEqual(self.client.query(["software"])["software"]["version"], 1.1)
+        self.assertTrue(self.client.is_connected())
+
+        # Retry exhausted
+        client = FramedUpgradeClient("127.0.0.1", self.unused_port(), retries=1, backoff=0.01)
+        self.assertEqual(client.query_pipelined([["software"], ["other"]]), [dict(), dict()])
+        self.assertFalse(client.is_connected())
+
+    @staticmethod
+    def unused_port():
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            return sock.getsockname()[1]
+
+
+class UpgradeServerFramedTest(FramedProtocolTest, unittest.TestCase):
+    @classmethod
+    def start_server(cls, port):
+        server = RecordUpgradeServer(port, 0, cls.root)
+        server.daemon_threads = True
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server, server.server_address[1]
+
+    @classmethod
+    def stop_server(cls, server):
+        server.shutdown()
+        server.server_close()
+
+    def setUp(self) -> None:
+        super(UpgradeServerFramedTest, self).setUp()
+        del self.server.connections[:]
+
+    def close_connections(self):
+        for connection in self.server.connections:
+            connection.shutdown(socket.SHUT_RDWR)
+        del self.server.connections[:]
+
+
+class AsyncUpgradeServerFramedTest(FramedProtocolTest, unittest.TestCase):
+    @classmethod
+    def start_server(cls, port):
+        server = AsyncUpgradeServer(port, 0, cls.root, host="127.0.0.1")
+        assert server.start()
+        return server, server.server_address[1]
+
+    @classmethod
+    def stop_server(cls, server):
+        server.stop()
+
+    def close_connections(self):
+        # Restart server on the same port, alive connections are closed
+        self.stop_server(self.server)
+        type(self).server = self.start_server(self.port)[0]
+
+
+if __name__ == "__main__":
+    unittest.main()
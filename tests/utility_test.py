@@ -0,0 +1,171 @@
+# -*- coding: utf-8 -*-
+import time
+import socket
+import asyncio
+import threading
+import unittest
+import unittest.mock
+from framework.network import utility
+from framework.network.utility import async_connect_device, async_scan, async_scan_lan_port, async_scan_lan_alive
+
+
+class AsyncScanTest(unittest.TestCase):
+    LISTEN_ADDRESS = ("127.0.0.2", "127.0.0.5")
+
+    def setUp(self) -> None:
+        # Two listen ports on each address, a closed port
+        self.listeners = list()
+        for _ in range(2):
+            port = 0
+            for address in self.LISTEN_ADDRESS:
+                sock = socket.socket(socket.AF_INET, socket.SOCK_STREAM)
+                sock.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+                sock.bind((address, port))
+                sock.listen(128)
+                port = sock.getsockname()[1]
+                self.listeners.append(sock)
+
+        self.ports = sorted({sock.getsockname()[1] for sock in self.listeners})
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            self.closed_port = sock.getsockname()[1]
+
+    def tearDown(self) -> None:
+        for sock in self.listeners:
+            sock.close()
+
+    @staticmethod
+    def collect(scan):
+        async def run():
+            return [x async for x in scan()]
+
+        return asyncio.run(run())
+
+    def testConnectDevice(self):
+        async def run():
+            return [await async_connect_device(address, port, timeout=1) for address, port in targets]
+
+        targets = [(address, port) for address in self.LISTEN_ADDRESS for port in self.ports]
+        self.assertEqual(asyncio.run(run()), [x[0] for x in targets])
+
+        targets = [("127.0.0.2", self.closed_port), ("127.0.0.3", self.ports[0]), ("127.0.0.1", 0)]
+        self.assertEqual(asyncio.run(run()), [None] * len(targets))
+
+    def testScanLanPort(self):
+        result = self.collect(lambda: async_scan_lan_port("127.0.0.0/29", self.ports + [self.closed_port], timeout=1))
+        self.assertEqual(sorted(result), [(address, port) for address in self.LISTEN_ADDRESS for port in self.ports])
+
+        self.assertEqual(self.collect(lambda: async_scan_lan_port("127.0.0.2/29", self.ports[0])), [])
+        self.assertEqual(sorted(self.collect(lambda: async_scan_lan_port("127.0.0.5/32", self.ports, window=1))),
+                         [("127.0.0.5", port) for port in self.ports])
+
+    def testScanWindow(self):
+        active, peak = [0], [0]
+
+        async def probe(target):
+            active[0] += 1
+            peak[0] = max(peak[0], active[0])
+            try:
+                await asyncio.sleep(0.01)
+                return target if target % 2 else None
+            finally:
+                active[0] -= 1
+
+        for window, expected in ((4, 4), (1, 1), (0, 1), (100, 30)):
+            peak[0] = 0
+            result = self.collect(lambda: async_scan(range(30), probe, window))
+            self.assertEqual(sorted(result), list(range(1, 30, 2)))
+            self.assertEqual((peak[0], active[0]), (expected, 0))
+
+    def testScanRate(self):
+        async def probe(target):
+            return target
+
+        start = time.monotonic()
+        self.assertEqual(sorted(self.collect(lambda: async_scan(range(11), probe, rate=50))), list(range(11)))
+        self.assertGreaterEqual(time.monotonic() - start, 0.19)
+
+        start = time.monotonic()
+        self.assertEqual(len(self.collect(lambda: async_scan(range(1000), probe))), 1000)
+        self.assertLess(time.monotonic() - start, 0.5)
+
+    def testScanCancel(self):
+        started, cancelled = list(), list()
+
+        async def probe(target):
+            started.append(target)
+            try:
+                await asyncio.sleep(0 if target == 0 else 10)
+                return target
+            except asyncio.CancelledError:
+                cancelled.append(target)
+                raise
+
+        async def run():
+            scan = async_scan(iter(range(100)), probe, window=10)
+            async for result in scan:
+                await scan.aclose()
+                return result
+
+        # Consumer stop early, pending probes are cancelled and no more probe started
+        start = time.monotonic()
+        self.assertEqual(asyncio.run(run()), 0)
+        self.assertLess(time.monotonic() - start, 1)
+        self.assertLessEqual(len(started), 11)
+        self.assertEqual(sorted(cancelled), sorted(x for x in started if x))
+
+    def testScanError(self):
+        async def probe(target):
+            if target % 3 == 0:
+                raise OSError("probe {} failed".format(target))
+            return target
+
+        self.assertEqual(sorted(self.collect(lambda: async_scan(range(10), probe, window=2))), [1, 2, 4, 5, 7, 8])
+
+    def testPinger(self):
+        async def run():
+            pinger = utility._AsyncPinger()
+            try:
+                return await asyncio.gather(*[pinger.ping("127.0.0.{}".format(i), 1, i) for i in (1, 2, 3)])
+            finally:
+                pinger.close()
+
+        try:
+            delays = asyncio.run(run())
+        except OSError as e:
+            self.skipTest("icmp socket is not permitted: {}".format(e))
+
+        self.assertTrue(all(isinstance(x, float) and 0 <= x < 1 for x in delays), delays)
+        self.assertEqual(sorted(self.collect(lambda: async_scan_lan_alive("127.0.0.0/30", timeout=1))),
+                         ["127.0.0.1", "127.0.0.2"])
+        self.assertEqual(self.collect(lambda: async_scan_lan_alive("invalid")), [])
+
+    def testPing3Fallback(self):
+        lock = threading.Lock()
+        active, peak = [0], [0]
+
+        def ping(dest_addr, timeout):
+            with lock:
+                active[0] += 1
+                peak[0] = max(peak[0], active[0])
+
+            time.sleep(0.01)
+            with lock:
+                active[0] -= 1
+
+            # ping3 return False on error, None on timeout
+            return {"10.0.0.1": 0.001, "10.0.0.2": None, "10.0.0.3": False}.get(dest_addr, 0.002)
+
+        # Icmp socket is not permitted, thread pool size is not up to in-flight window
+        with unittest.mock.patch.object(utility, "_AsyncPinger", side_effect=PermissionError), \
+                unittest.mock.patch.object(utility.ping3, "ping", ping):
+            result = self.collect(lambda: async_scan_lan_alive("10.0.0.0/24", window=1024))
+
+        self.assertEqual(len(result), 252)
+        self.assertNotIn("10.0.0.2", result)
+        self.assertNotIn("10.0.0.3", result)
+        self.assertLessEqual(peak[0], utility._PING3_MAX_WORKERS)
+
+
+if __name__ == "__main__":
+    unittest.main()